@@ -163,3 +163,42 @@ if USE_CLOUDINARY:
             "API_KEY": os.getenv("CLOUDINARY_API_KEY"),
             "API_SECRET": os.getenv("CLOUDINARY_API_SECRET"),
         }
+
+# Scraping de tiendas
+# Páginas de catálogo que se descargan en paralelo por categoría.
+SCRAPE_PAGES_IN_FLIGHT = int(os.getenv("SCRAPE_PAGES_IN_FLIGHT", "3"))
+# Páginas que pueden esperar entre etapas del pipeline (descarga -> normalización -> persistencia).
+SCRAPE_PIPELINE_QUEUE_SIZE = int(os.getenv("SCRAPE_PIPELINE_QUEUE_SIZE", "4"))
+# Cache de GET condicional para páginas de catálogo (ETag / Last-Modified / hash).
+# Una página sin cambios no se vuelve a procesar hasta que pase el TTL (0 desactiva el cache).
+SCRAPE_PAGE_CACHE_DIR = os.getenv("SCRAPE_PAGE_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "paginas"))
+SCRAPE_PAGE_CACHE_TTL = int(os.getenv("SCRAPE_PAGE_CACHE_TTL", str(24 * 60 * 60)))
+SCRAPE_PAGE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_PAGE_CACHE_MAX_BYTES", str(5 * 1024 * 1024)))
+# Recarga incremental de las tiendas Shopify por sitemap.xml (lastmod por producto): el recorrido
+# completo de colecciones se hace cada SCRAPE_FULL_CRAWL_HOURS (0 desactiva el modo incremental).
+SCRAPE_FULL_CRAWL_HOURS = float(os.getenv("SCRAPE_FULL_CRAWL_HOURS", "24"))
+SCRAPE_SITEMAP_STATE_DIR = os.getenv("SCRAPE_SITEMAP_STATE_DIR", os.path.join(BASE_DIR, ".cache", "sitemaps"))
+# Procesos para parsear páginas de catálogo fuera del GIL: "auto" los activa si hay 3 o más núcleos, 0 los desactiva.
+SCRAPE_PARSE_PROCESSES = os.getenv("SCRAPE_PARSE_PROCESSES", "auto")
+# Silk y Yauras son tiendas Shopify: leer /collections/<handle>/products.json antes que el HTML.
+SCRAPE_SHOPIFY_JSON = os.getenv("SCRAPE_SHOPIFY_JSON", "True").lower() == "true"
+# Descarga de imágenes en segundo plano (hilos, tamaño máximo de la cola y reintentos por URL).
+SCRAPE_IMAGE_WORKERS = int(os.getenv("SCRAPE_IMAGE_WORKERS", "4"))
+SCRAPE_IMAGE_QUEUE_SIZE = int(os.getenv("SCRAPE_IMAGE_QUEUE_SIZE", "1000"))
+SCRAPE_IMAGE_RETRIES = int(os.getenv("SCRAPE_IMAGE_RETRIES", "2"))
+# Tamaño máximo de una imagen descargada y bytes que se mantienen en memoria antes de pasarla a un archivo temporal.
+SCRAPE_IMAGE_MAX_BYTES = int(os.getenv("SCRAPE_IMAGE_MAX_BYTES", "3000000"))
+SCRAPE_IMAGE_SPOOL_BYTES = int(os.getenv("SCRAPE_IMAGE_SPOOL_BYTES", str(256 * 1024)))
+# Navegadores headless (botasaurus) para Fragrantica: cuántos a la vez, páginas antes de reciclar
+# cada uno y MB de RSS para todo el pool (0 sin límite).
+SCRAPE_BROWSER_POOL_SIZE = int(os.getenv("SCRAPE_BROWSER_POOL_SIZE", "2"))
+SCRAPE_BROWSER_MAX_PAGES = int(os.getenv("SCRAPE_BROWSER_MAX_PAGES", "50"))
+SCRAPE_BROWSER_MEMORY_MB = int(os.getenv("SCRAPE_BROWSER_MEMORY_MB", "1500"))
+# Segundos sin latido tras los cuales una corrida de scraping "en curso" se da por interrumpida y se puede reanudar.
+SCRAPE_JOB_STALE_SECONDS = int(os.getenv("SCRAPE_JOB_STALE_SECONDS", "60"))
+# Reintentos con backoff exponencial (segundos base) para timeouts, 429 y 5xx.
+SCRAPE_HTTP_RETRIES = int(os.getenv("SCRAPE_HTTP_RETRIES", "2"))
+SCRAPE_HTTP_BACKOFF = float(os.getenv("SCRAPE_HTTP_BACKOFF", "1.0"))
+# Fallos seguidos que abren el circuito de un host, y segundos que queda abierto.
+SCRAPE_CIRCUIT_FAILURES = int(os.getenv("SCRAPE_CIRCUIT_FAILURES", "5"))
+SCRAPE_CIRCUIT_COOLDOWN = int(os.getenv("SCRAPE_CIRCUIT_COOLDOWN", "300"))
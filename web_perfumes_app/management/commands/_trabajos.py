@@ -0,0 +1,71 @@
+import signal
+import threading
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from web_perfumes_app import views
+from web_perfumes_app.models import TrabajoScraping
+
+
+@contextmanager
+def detener_con_senales():
+    """
+    Mientras dura el bloque, SIGTERM/SIGINT no matan el proceso: marcan la
+    cancelación del trabajo en curso para que termine en la próxima página y
+    activan el Event que se entrega, así el trabajo puede volver a la cola.
+    """
+    detenido = threading.Event()
+
+    def _detener(signum, frame):
+        print(f"[TRABAJOS] Señal {signum} recibida, se detiene el trabajo en curso.")
+        detenido.set()
+        for etapa in views.ETAPA_POR_TIPO.values():
+            views._set_refresh_cancel(etapa, True)
+
+    anteriores = {senal: signal.signal(senal, _detener) for senal in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        yield detenido
+    finally:
+        for senal, manejador in anteriores.items():
+            signal.signal(senal, manejador)
+
+
+def ejecutar_reclamado(trabajo, detenido):
+    estado = views._ejecutar_trabajo(trabajo)
+    if detenido.is_set():
+        views._devolver_a_la_cola(trabajo.pk)
+    return estado
+
+
+class ComandoTrabajo(BaseCommand):
+    """
+    Base de los comandos que corren un tipo de trabajo: lo encola y lo ejecuta
+    en este proceso, o con --enqueue solo lo deja en cola para scraping_worker.
+    """
+
+    tipo = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--enqueue",
+            action="store_true",
+            help="Solo deja el trabajo en cola para que lo tome scraping_worker.",
+        )
+
+    def handle(self, *args, **options):
+        trabajo = views._encolar_trabajo(self.tipo)
+        if options["enqueue"]:
+            self.stdout.write(self.style.SUCCESS(f"Trabajo {trabajo.pk} en cola ({trabajo.estado})."))
+            return
+
+        reclamado = views._reclamar_siguiente_trabajo([self.tipo])
+        if reclamado is None:
+            raise CommandError(f"Ya hay un trabajo de este tipo en curso: #{trabajo.pk} en {trabajo.worker or 'otro worker'}.")
+        with detener_con_senales() as detenido:
+            estado = ejecutar_reclamado(reclamado, detenido)
+        reclamado.refresh_from_db()
+        mensaje = f"Trabajo {reclamado.pk} {estado}: {reclamado.resultados or reclamado.error}"
+        if estado == TrabajoScraping.ESTADO_ERROR:
+            raise CommandError(mensaje)
+        self.stdout.write(self.style.SUCCESS(mensaje))
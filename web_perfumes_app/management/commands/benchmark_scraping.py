@@ -0,0 +1,662 @@
+import json
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.db.models import Q
+from django.test.utils import override_settings
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from web_perfumes_app import views
+from web_perfumes_app.models import Perfume
+
+# Páginas de catálogo de cada tienda guardadas para los tests (<clave>_*.html)
+PAGINAS_TIENDAS = os.path.join(os.path.dirname(views.__file__), "test_data", "tiendas")
+
+
+class _ServidorFixtures(ThreadingHTTPServer):
+    """
+    Sirve por HTTP local las respuestas grabadas de FixturesHttp con la latencia
+    de una tienda real: cada respuesta tarda un RTT y cada conexión nueva dos más
+    (handshake TCP y TLS). La URL original viaja en la ruta (/<esquema>/<host>/...).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures, rtt):
+        super().__init__(("127.0.0.1", 0), _ManejadorFixtures)
+        self.fixtures = fixtures
+        self.rtt = rtt
+        self.conexiones = 0
+        self._lock = threading.Lock()
+
+    def url_local(self, url):
+        partes = urllib.parse.urlsplit(url)
+        local = f"http://127.0.0.1:{self.server_port}/{partes.scheme}/{partes.netloc}{partes.path or '/'}"
+        return f"{local}?{partes.query}" if partes.query else local
+
+
+class _ManejadorFixtures(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers y cuerpo salen en escrituras separadas: con Nagle, cada respuesta por
+    # una conexión reusada esperaría el ACK diferido del cliente (~40 ms)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.conexiones += 1
+        time.sleep(2 * self.server.rtt)
+
+    def do_GET(self):
+        _, esquema, resto = self.path.split("/", 2)
+        time.sleep(self.server.rtt)
+        response = self.server.fixtures.responder("GET", f"{esquema}://{resto}", headers=dict(self.headers))
+        self.send_response(response.status_code)
+        for header in ("Content-Type", "ETag", "Last-Modified"):
+            if response.headers.get(header):
+                self.send_header(header, response.headers[header])
+        self.send_header("Content-Length", str(len(response.content)))
+        self.end_headers()
+        self.wfile.write(response.content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _AdaptadorServidorLocal(HTTPAdapter):
+    """HTTPAdapter que manda cada petición a _ServidorFixtures en vez de a la tienda."""
+
+    def __init__(self, servidor, **kwargs):
+        self.servidor = servidor
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request.url = self.servidor.url_local(request.url)
+        return super().send(request, **kwargs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide una recarga completa de las tiendas contra respuestas grabadas, "
+        "sobre una base de datos desechable y sin salir a la red."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fixtures",
+            default=os.path.join(settings.BASE_DIR, ".cache", "fixtures"),
+            help="Directorio de respuestas grabadas (por defecto .cache/fixtures).",
+        )
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Graba las respuestas reales de las tiendas en --fixtures en vez de reproducirlas.",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=2,
+            help="Corridas seguidas sobre la misma base: la primera en frío, las demás con el cache de páginas (si está activo).",
+        )
+        parser.add_argument(
+            "--tracemalloc",
+            action="store_true",
+            help="Mide también el pico de memoria de Python con tracemalloc (más lento).",
+        )
+        parser.add_argument(
+            "--parse",
+            action="store_true",
+            help="Solo mide el parseo de las páginas de catálogo grabadas: en hilos contra el pool de procesos.",
+        )
+        parser.add_argument(
+            "--parse-processes",
+            type=int,
+            default=views.PARSEO_PROCESOS or os.cpu_count() or 1,
+            help="Procesos del pool para --parse (por defecto SCRAPE_PARSE_PROCESSES o los núcleos disponibles).",
+        )
+        parser.add_argument(
+            "--parse-repeat",
+            type=int,
+            default=5,
+            help="Veces que se parsea cada página en --parse y --parsers.",
+        )
+        parser.add_argument(
+            "--parsers",
+            action="store_true",
+            help=(
+                "Solo mide en ms por página el parser de cards anterior (árbol completo de html.parser) "
+                "contra el actual (lxml + SoupStrainer) sobre las páginas de test_data/tiendas."
+            ),
+        )
+        parser.add_argument(
+            "--fragrantica",
+            action="store_true",
+            help=(
+                "Tras cada recarga de las tiendas busca las URLs de Fragrantica y descarga acordes y notas, "
+                "como los trabajos que siguen al scraping (al grabar se usan los navegadores reales)."
+            ),
+        )
+        parser.add_argument(
+            "--shopify",
+            action="store_true",
+            help=(
+                "Solo lee las colecciones Shopify grabadas dos veces, por products.json y por el HTML, "
+                "y compara peticiones y CPU por cada mil productos (con --record graba ambos formatos)."
+            ),
+        )
+        parser.add_argument(
+            "--fetch",
+            action="store_true",
+            help=(
+                "Solo recorre las categorías grabadas servidas por HTTP local dos veces: una página a la vez "
+                "con una conexión nueva por página, y con las sesiones keep-alive y SCRAPE_PAGES_IN_FLIGHT "
+                "páginas en vuelo; compara páginas por segundo."
+            ),
+        )
+        parser.add_argument(
+            "--rtt-ms",
+            type=float,
+            default=50,
+            help="Latencia simulada en --fetch: un RTT por respuesta y dos más por conexión nueva (por defecto 50 ms).",
+        )
+        parser.add_argument("--json", action="store_true", help="Imprime el resultado como JSON.")
+
+    def handle(self, *args, **options):
+        directorio = options["fixtures"]
+        if options["parsers"]:
+            resultado = self._medir_parsers(max(1, options["parse_repeat"]))
+            if options["json"]:
+                self.stdout.write(json.dumps(resultado, indent=2))
+                return
+            for pagina, medicion in resultado.items():
+                self.stdout.write(
+                    f"{pagina} ({medicion['bytes']} bytes): {medicion['cards']} cards | html.parser {medicion['html_parser_ms']} ms | "
+                    f"lxml + SoupStrainer {medicion['lxml_ms']} ms | aceleración x{medicion['speedup']}"
+                )
+            return
+        if options["parse"]:
+            if not os.path.isdir(directorio):
+                raise CommandError(f"No hay respuestas grabadas en {directorio}. Grábalas primero con --record.")
+            resultado = self._medir_parseo(directorio, max(1, options["parse_processes"]), max(1, options["parse_repeat"]))
+            if options["json"]:
+                self.stdout.write(json.dumps(resultado, indent=2))
+                return
+            self.stdout.write(
+                f"{resultado['pages']} páginas x {resultado['repeat']} ({resultado['cards']} cards por pasada), "
+                f"{resultado['threads']} hilos, {resultado['cpus']} núcleos"
+            )
+            self.stdout.write(f"  En hilos: {resultado['threads_seconds']}s ({resultado['threads_pages_per_second']} páginas/s)")
+            self.stdout.write(
+                f"  En {resultado['processes']} procesos: {resultado['processes_seconds']}s "
+                f"({resultado['processes_pages_per_second']} páginas/s) | aceleración x{resultado['speedup']}"
+            )
+            return
+        if options["fetch"]:
+            if not os.path.isdir(directorio):
+                raise CommandError(f"No hay respuestas grabadas en {directorio}. Grábalas primero con --record.")
+            resultado = self._medir_descargas(directorio, max(0.0, options["rtt_ms"]) / 1000)
+            if options["json"]:
+                self.stdout.write(json.dumps(resultado, indent=2))
+                return
+            for titulo, clave in (
+                ("Secuencial, conexión nueva por página", "sequential"),
+                ("Sesiones keep-alive", "pooled"),
+            ):
+                medicion = resultado[clave]
+                self.stdout.write(
+                    f"{titulo} ({medicion['in_flight']} en vuelo): {medicion['pages']} páginas en "
+                    f"{medicion['seconds']}s ({medicion['pages_per_second']} páginas/s) | "
+                    f"{medicion['connections']} conexiones"
+                    + (f" | {medicion['errors']} errores" if medicion["errors"] else "")
+                )
+            self.stdout.write(f"  RTT simulado {resultado['rtt_ms']} ms | aceleración x{resultado['speedup']}")
+            return
+        modo = "grabar" if options["record"] else "reproducir"
+        corridas = 1 if options["record"] else max(1, options["runs"])
+        if modo == "reproducir" and not os.path.isdir(directorio):
+            raise CommandError(f"No hay respuestas grabadas en {directorio}. Grábalas primero con --record.")
+        if options["shopify"]:
+            with views.fixtures_http(directorio, modo) as fixtures:
+                resultado = self._medir_shopify(fixtures)
+            if options["json"]:
+                self.stdout.write(json.dumps(resultado, indent=2))
+                return
+            for formato, medicion in resultado.items():
+                self.stdout.write(
+                    f"{formato}: {medicion['collections']} colecciones, {medicion['pages']} páginas, "
+                    f"{medicion['products']} productos en {medicion['seconds']}s | "
+                    f"{medicion['requests_per_1k_products']} peticiones/1k productos | "
+                    f"{medicion['cpu_seconds_per_1k_products']}s de CPU/1k productos"
+                    + (f" | {medicion['html_fallbacks']} colecciones cayeron al HTML" if medicion.get("html_fallbacks") else "")
+                    + (f" | {medicion['errors']} errores" if medicion["errors"] else "")
+                )
+            return
+
+        temporal = tempfile.mkdtemp(prefix="benchmark_scraping_")
+        transaccion_sqlite = SQLiteDatabaseWrapper._start_transaction_under_autocommit
+        if connection.vendor == "sqlite":
+            # La base en memoria compartida no soporta bien los hilos de las tiendas
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(temporal, "benchmark.sqlite3")
+            # Con transacciones diferidas, dos tiendas que leen y luego escriben se bloquean
+            # al subir de lock ("database is locked"); en Postgres no pasa.
+            SQLiteDatabaseWrapper._start_transaction_under_autocommit = (
+                lambda wrapper: wrapper.cursor().execute("BEGIN IMMEDIATE")
+            )
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cache_original = views._cache_paginas
+        views._cache_paginas = views._CachePaginas(
+            os.path.join(temporal, "paginas"),
+            ttl=cache_original.ttl,
+            max_bytes=cache_original.max_bytes,
+        )
+        sitemaps_original = views._estado_sitemaps
+        views._estado_sitemaps = views.EstadoSitemaps(os.path.join(temporal, "sitemaps"))
+        resultados = []
+        try:
+            with override_settings(MEDIA_ROOT=os.path.join(temporal, "media")):
+                with views.fixtures_http(directorio, modo) as fixtures:
+                    for numero in range(1, corridas + 1):
+                        resultados.append(self._medir(numero, fixtures, options["tracemalloc"], options["fragrantica"]))
+        finally:
+            views._cache_paginas = cache_original
+            views._estado_sitemaps = sitemaps_original
+            SQLiteDatabaseWrapper._start_transaction_under_autocommit = transaccion_sqlite
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            shutil.rmtree(temporal, ignore_errors=True)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for resultado in resultados:
+            self.stdout.write(
+                f"Corrida {resultado['run']}: {resultado['seconds']}s | "
+                f"{resultado['pages']} páginas ({resultado['pages_per_second']}/s) | "
+                f"{resultado['products']} productos ({resultado['products_per_second']}/s) | "
+                f"{resultado['db_queries_per_product']} consultas/producto | "
+                f"pico RSS {resultado['peak_rss_mb']} MB"
+                + (f" | pico Python {resultado['peak_python_mb']} MB" if "peak_python_mb" in resultado else "")
+            )
+            self.stdout.write(f"  Respuestas: {resultado['fixtures']} | Imágenes: {resultado['images']}")
+            if "fragrantica" in resultado:
+                fragrantica = resultado["fragrantica"]
+                self.stdout.write(
+                    f"  Fragrantica: {fragrantica['urls_searched']} URLs buscadas ({fragrantica['urls_found']} encontradas) "
+                    f"en {fragrantica['urls_seconds']}s | {fragrantica['accords_updated']} fichas en "
+                    f"{fragrantica['accords_seconds']}s ({fragrantica['accords_per_second']}/s) | "
+                    f"Respuestas: {fragrantica['fixtures']}"
+                )
+            for tienda, etapas in resultado["pipeline"].items():
+                self.stdout.write(
+                    f"  Pipeline {tienda}: "
+                    + " | ".join(
+                        f"{etapa} {m['items']} en {m['seconds']}s"
+                        + (f" (cola máx. {m['queue_max']}, bloqueado {m['blocked_seconds']}s)" if "queue_max" in m else "")
+                        for etapa, m in etapas.items()
+                    )
+                )
+        if modo == "grabar":
+            self.stdout.write(self.style.SUCCESS(f"Respuestas grabadas en {directorio}."))
+
+    def _medir(self, numero, fixtures, con_tracemalloc, con_fragrantica=False):
+        views._set_refresh_cancel("scraping", False)
+        views._reset_refresh_status("scraping")
+        metricas_fixtures = dict(fixtures.metricas)
+        if con_tracemalloc:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            resultado = views.scrapping_tiendas_perfumes()
+        finally:
+            segundos = time.perf_counter() - inicio
+            pico_python = tracemalloc.get_traced_memory()[1] if con_tracemalloc else None
+            if con_tracemalloc:
+                tracemalloc.stop()
+
+        paginas = resultado.get("paginas_procesadas", 0) + resultado.get("paginas_omitidas", 0)
+        productos = resultado.get("productos", 0)
+        consultas = sum(d.get("consultas_bd", 0) for d in resultado.get("detalle", {}).values())
+        medicion = {
+            "run": numero,
+            "seconds": round(segundos, 2),
+            "pages": paginas,
+            "pages_processed": resultado.get("paginas_procesadas", 0),
+            "pages_per_second": round(paginas / segundos, 1) if segundos else None,
+            "products": productos,
+            "products_per_second": round(productos / segundos, 1) if segundos else None,
+            "db_queries": consultas,
+            "db_queries_per_product": round(consultas / productos, 2) if productos else None,
+            # ru_maxrss viene en KB en Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "errors": resultado.get("errores", 0),
+            "images": resultado.get("imagenes", {}),
+            "fixtures": {clave: valor - metricas_fixtures[clave] for clave, valor in fixtures.metricas.items()},
+            "pipeline": {tienda: d["pipeline"] for tienda, d in resultado.get("detalle", {}).items() if "pipeline" in d},
+        }
+        if pico_python is not None:
+            medicion["peak_python_mb"] = round(pico_python / (1024 * 1024), 1)
+        if con_fragrantica:
+            medicion["fragrantica"] = self._medir_fragrantica(fixtures)
+        return medicion
+
+    def _medir_fragrantica(self, fixtures):
+        """Búsqueda de URLs y descarga de fichas de Fragrantica sobre los perfumes recién guardados."""
+        for etapa in ("urls", "acordes"):
+            views._set_refresh_cancel(etapa, False)
+            views._reset_refresh_status(etapa)
+        metricas_fixtures = dict(fixtures.metricas)
+        por_buscar = Perfume.objects.filter(
+            Q(fragrantica_url__isnull=True) | Q(fragrantica_url=""), disponible=True
+        ).count()
+        inicio = time.perf_counter()
+        encontradas = views.actualizar_urls_fragrantica()
+        segundos_urls = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        fichas = views.actualizar_acordes_todos()
+        segundos_acordes = time.perf_counter() - inicio
+        return {
+            "urls_searched": por_buscar,
+            "urls_found": encontradas,
+            "urls_seconds": round(segundos_urls, 2),
+            "accords_updated": fichas,
+            "accords_seconds": round(segundos_acordes, 2),
+            "accords_per_second": round(fichas / segundos_acordes, 1) if segundos_acordes else None,
+            "fixtures": {clave: valor - metricas_fixtures[clave] for clave, valor in fixtures.metricas.items()},
+        }
+
+    def _medir_shopify(self, fixtures):
+        """
+        Recorre las colecciones Shopify de TIENDAS por products.json y luego por el
+        HTML, sin cache de páginas y parseando en este proceso, para que las
+        peticiones y el tiempo de CPU de cada formato sean comparables.
+        """
+        cache_original, parseo_original = views._cache_paginas, views._parseo_paginas
+        json_original = views.SHOPIFY_JSON_ACTIVO
+        views._cache_paginas = views._CachePaginas(None, ttl=0, max_bytes=0)
+        views._parseo_paginas = views.ParseoEnProcesos(0)
+        resultado = {}
+        try:
+            for formato, usar_json in (("json", True), ("html", False)):
+                views.SHOPIFY_JSON_ACTIVO = usar_json
+                views._circuitos_hosts.reiniciar()
+                metricas_fixtures = dict(fixtures.metricas)
+                colecciones, paginas, productos, errores, caidas_html = 0, 0, 0, 0, 0
+                inicio, inicio_cpu = time.perf_counter(), time.process_time()
+                for adaptador in views.TIENDAS:
+                    for categoria in adaptador.categorias:
+                        if not categoria.coleccion:
+                            continue
+                        colecciones += 1
+                        etiqueta = f"{adaptador.tienda} {categoria.etiqueta}"
+                        cayo_al_html = False
+                        for pagina in views._iterar_paginas_shopify(
+                            adaptador.base_url,
+                            categoria.coleccion,
+                            categoria.url_template,
+                            adaptador.parsear_cards,
+                            etiqueta=etiqueta,
+                            timeout=adaptador.timeout,
+                        ):
+                            if pagina.error:
+                                errores += 1
+                                continue
+                            # Sin products.json la colección se lee por HTML aunque se haya pedido JSON
+                            cayo_al_html = cayo_al_html or "products.json" not in pagina.url
+                            paginas += 1
+                            productos += len(pagina.cards)
+                        if usar_json and cayo_al_html:
+                            caidas_html += 1
+                segundos, segundos_cpu = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+                # Al grabar cuentan las grabadas; al reproducir, las reproducidas y las faltantes (404)
+                peticiones = sum(valor - metricas_fixtures[clave] for clave, valor in fixtures.metricas.items())
+                resultado[formato] = {
+                    "collections": colecciones,
+                    "pages": paginas,
+                    "products": productos,
+                    "requests": peticiones,
+                    "errors": errores,
+                    "seconds": round(segundos, 2),
+                    "cpu_seconds": round(segundos_cpu, 3),
+                    "requests_per_1k_products": round(1000 * peticiones / productos, 1) if productos else None,
+                    "cpu_seconds_per_1k_products": round(1000 * segundos_cpu / productos, 3) if productos else None,
+                }
+                if usar_json:
+                    resultado[formato]["html_fallbacks"] = caidas_html
+        finally:
+            views._cache_paginas, views._parseo_paginas = cache_original, parseo_original
+            views.SHOPIFY_JSON_ACTIVO = json_original
+        return resultado
+
+    def _medir_descargas(self, directorio, rtt):
+        """
+        Recorre las categorías de TIENDAS contra _ServidorFixtures dos veces, sin
+        cache de páginas y parseando en este proceso: como antes del pool, con una
+        página en vuelo y una sesión (y conexión) nueva por petición, y con las
+        sesiones por host de _obtener_sesion_http y PAGINAS_EN_VUELO páginas en vuelo.
+        """
+        originales = (
+            views.HTTPAdapter,
+            views._obtener_sesion_http,
+            views._limitador_hosts,
+            views._cache_paginas,
+            views._parseo_paginas,
+            views.PAGINAS_EN_VUELO,
+        )
+        sesiones_originales = dict(views._sesiones_http)
+        servidor = _ServidorFixtures(views.FixturesHttp(directorio, "reproducir"), rtt)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        adaptador_http = partial(_AdaptadorServidorLocal, servidor)
+
+        def sesion_por_peticion(host):
+            sesion = requests.Session()
+            sesion.mount("https://", adaptador_http())
+            sesion.mount("http://", adaptador_http())
+            return sesion
+
+        resultado = {"rtt_ms": round(rtt * 1000, 1)}
+        try:
+            views.HTTPAdapter = adaptador_http
+            # Sin tope por host: el limitador pondría el mismo techo a las dos pasadas
+            views._limitador_hosts = views.LimitadorHosts({}, (1e6, 1e6))
+            views._cache_paginas = views._CachePaginas(None, ttl=0, max_bytes=0)
+            views._parseo_paginas = views.ParseoEnProcesos(0)
+            for clave, en_vuelo, obtener_sesion in (
+                ("sequential", 1, sesion_por_peticion),
+                ("pooled", originales[5], originales[1]),
+            ):
+                views.PAGINAS_EN_VUELO = en_vuelo
+                views._obtener_sesion_http = obtener_sesion
+                views._sesiones_http.clear()
+                views._circuitos_hosts.reiniciar()
+                conexiones = servidor.conexiones
+                paginas, errores = 0, 0
+                inicio = time.perf_counter()
+                for adaptador in views.TIENDAS:
+                    for categoria in adaptador.categorias:
+                        etiqueta = f"{adaptador.tienda} {categoria.etiqueta}"
+                        if categoria.coleccion:
+                            recorrido = views._iterar_paginas_shopify(
+                                adaptador.base_url,
+                                categoria.coleccion,
+                                categoria.url_template,
+                                adaptador.parsear_cards,
+                                etiqueta=etiqueta,
+                                timeout=adaptador.timeout,
+                            )
+                        else:
+                            recorrido = views._iterar_paginas_catalogo(
+                                categoria.url_template, adaptador.parsear_cards, etiqueta, timeout=adaptador.timeout
+                            )
+                        for pagina in recorrido:
+                            if pagina.error:
+                                errores += 1
+                            else:
+                                paginas += 1
+                segundos = time.perf_counter() - inicio
+                for sesion in views._sesiones_http.values():
+                    sesion.close()
+                resultado[clave] = {
+                    "in_flight": en_vuelo,
+                    "pages": paginas,
+                    "errors": errores,
+                    "connections": servidor.conexiones - conexiones,
+                    "seconds": round(segundos, 2),
+                    "pages_per_second": round(paginas / segundos, 1) if segundos else None,
+                }
+        finally:
+            (
+                views.HTTPAdapter,
+                views._obtener_sesion_http,
+                views._limitador_hosts,
+                views._cache_paginas,
+                views._parseo_paginas,
+                views.PAGINAS_EN_VUELO,
+            ) = originales
+            views._sesiones_http.clear()
+            views._sesiones_http.update(sesiones_originales)
+            servidor.shutdown()
+            servidor.server_close()
+        if not resultado["sequential"]["pages"]:
+            raise CommandError(f"No hay páginas de catálogo grabadas en {directorio}.")
+        resultado["speedup"] = round(resultado["sequential"]["seconds"] / resultado["pooled"]["seconds"], 2)
+        return resultado
+
+    def _medir_parsers(self, repeticiones):
+        """
+        Parsea cada página de PAGINAS_TIENDAS con el parser de su tienda dos veces:
+        sobre el árbol completo de html.parser, como antes, y sobre el de
+        _sopa_cards. Las tarjetas de ambas pasadas deben ser las mismas.
+        """
+        parsers = {adaptador.clave: adaptador.parsear_cards for adaptador in views.TIENDAS}
+        sopa_original = views._sopa_cards
+        resultado = {}
+        try:
+            for nombre in sorted(os.listdir(PAGINAS_TIENDAS)):
+                parsear_cards = parsers.get(nombre.split("_")[0])
+                if parsear_cards is None or not nombre.endswith(".html"):
+                    continue
+                with open(os.path.join(PAGINAS_TIENDAS, nombre), encoding="utf-8") as archivo:
+                    html = archivo.read()
+                tarjetas, segundos = {}, {}
+                for parser, sopa in (
+                    ("html_parser", lambda html, tag, clase: BeautifulSoup(html, "html.parser")),
+                    ("lxml", sopa_original),
+                ):
+                    views._sopa_cards = sopa
+                    # Los avisos del parser (cards sin título) se repetirían en cada pasada
+                    with open(os.devnull, "w") as nulo, redirect_stdout(nulo):
+                        inicio = time.perf_counter()
+                        for _ in range(repeticiones):
+                            tarjetas[parser] = parsear_cards(html)
+                        segundos[parser] = time.perf_counter() - inicio
+                if tarjetas["html_parser"] != tarjetas["lxml"]:
+                    raise CommandError(f"{nombre}: las cards con lxml no coinciden con las de html.parser.")
+                resultado[nombre] = {
+                    "bytes": len(html.encode("utf-8")),
+                    "cards": len(tarjetas["lxml"]),
+                    "repeat": repeticiones,
+                    "html_parser_ms": round(1000 * segundos["html_parser"] / repeticiones, 2),
+                    "lxml_ms": round(1000 * segundos["lxml"] / repeticiones, 2),
+                    "speedup": round(segundos["html_parser"] / segundos["lxml"], 2),
+                }
+        finally:
+            views._sopa_cards = sopa_original
+        if not resultado:
+            raise CommandError(f"No hay páginas de tiendas en {PAGINAS_TIENDAS}.")
+        return resultado
+
+    def _paginas_grabadas(self, directorio):
+        """(parser, contenido, encoding) de cada página de catálogo grabada con status 200."""
+        parsers = []
+        for adaptador in views.TIENDAS:
+            for categoria in adaptador.categorias:
+                parsers.append((categoria.url_template.split("{page}")[0], adaptador.parsear_cards))
+                if categoria.coleccion:
+                    parsers.append((
+                        f"{adaptador.base_url}/collections/{categoria.coleccion}/products.json",
+                        partial(views._parsear_productos_shopify, base_url=adaptador.base_url),
+                    ))
+        paginas = []
+        for host in sorted(os.listdir(directorio)):
+            carpeta = os.path.join(directorio, host)
+            if not os.path.isdir(carpeta):
+                continue
+            for nombre in sorted(os.listdir(carpeta)):
+                if not nombre.endswith(".json"):
+                    continue
+                ruta = os.path.join(carpeta, nombre[: -len(".json")])
+                with open(ruta + ".json", encoding="utf-8") as archivo:
+                    meta = json.load(archivo)
+                parser = next((p for prefijo, p in parsers if meta["url"].startswith(prefijo)), None)
+                if parser is None or meta["method"] != "GET" or meta["status"] != 200:
+                    continue
+                with open(ruta + ".body", "rb") as archivo:
+                    contenido = archivo.read()
+                encoding = get_encoding_from_headers(CaseInsensitiveDict(meta["headers"])) or "utf-8"
+                paginas.append((parser, contenido, encoding))
+        return paginas
+
+    def _medir_parseo(self, directorio, procesos, repeticiones):
+        paginas = self._paginas_grabadas(directorio)
+        if not paginas:
+            raise CommandError(f"No hay páginas de catálogo grabadas en {directorio}.")
+        trabajo = paginas * repeticiones
+        # Tantos hilos como descargas simultáneas hay en una corrida real
+        hilos = len(views.TIENDAS) * views.PAGINAS_EN_VUELO
+
+        def pasada(parseo, lista):
+            with ThreadPoolExecutor(max_workers=hilos) as executor:
+                return list(executor.map(lambda pagina: parseo.parsear(*pagina), lista))
+
+        en_hilo = views.ParseoEnProcesos(0)
+        inicio = time.perf_counter()
+        cards_hilo = pasada(en_hilo, trabajo)
+        segundos_hilo = time.perf_counter() - inicio
+
+        en_procesos = views.ParseoEnProcesos(procesos)
+        try:
+            # Arranque de los procesos (importan Django y los scrapers) fuera de la medición
+            pasada(en_procesos, paginas)
+            inicio = time.perf_counter()
+            cards_procesos = pasada(en_procesos, trabajo)
+            segundos_procesos = time.perf_counter() - inicio
+        finally:
+            en_procesos.cerrar()
+
+        if [views._hash_cards(c) for c in cards_hilo] != [views._hash_cards(c) for c in cards_procesos]:
+            raise CommandError("El parseo en procesos no coincide con el parseo en el hilo.")
+        try:
+            nucleos = len(os.sched_getaffinity(0))
+        except AttributeError:
+            nucleos = os.cpu_count() or 1
+        return {
+            "pages": len(paginas),
+            "repeat": repeticiones,
+            "cards": sum(len(c) for c in cards_hilo[: len(paginas)]),
+            "threads": hilos,
+            "cpus": nucleos,
+            "threads_seconds": round(segundos_hilo, 2),
+            "threads_pages_per_second": round(len(trabajo) / segundos_hilo, 1),
+            "processes": procesos,
+            "processes_seconds": round(segundos_procesos, 2),
+            "processes_pages_per_second": round(len(trabajo) / segundos_procesos, 1),
+            "speedup": round(segundos_hilo / segundos_procesos, 2),
+        }
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from web_perfumes_app.views import compactar_historial_precios
+
+
+class Command(BaseCommand):
+    help = "Reduce el historial de precios antiguo a un punto por perfume y día."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=90,
+            help="Solo se compactan observaciones con más de esta cantidad de días (por defecto 90).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        eliminadas = compactar_historial_precios(dias=options["days"], tam_lote=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Historial de precios compactado: {eliminadas} observaciones eliminadas."))
@@ -0,0 +1,8 @@
+from web_perfumes_app.models import TrabajoScraping
+
+from ._trabajos import ComandoTrabajo
+
+
+class Command(ComandoTrabajo):
+    help = "Busca la URL de Fragrantica de los perfumes que todavía no la tienen."
+    tipo = TrabajoScraping.TIPO_URLS_FRAGRANTICA
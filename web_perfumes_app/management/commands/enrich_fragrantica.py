@@ -0,0 +1,8 @@
+from web_perfumes_app.models import TrabajoScraping
+
+from ._trabajos import ComandoTrabajo
+
+
+class Command(ComandoTrabajo):
+    help = "Descarga acordes, notas y estaciones desde Fragrantica para los perfumes con URL."
+    tipo = TrabajoScraping.TIPO_ACORDES_FRAGRANTICA
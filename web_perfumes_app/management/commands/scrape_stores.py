@@ -0,0 +1,25 @@
+from web_perfumes_app import views
+from web_perfumes_app.models import TrabajoScraping
+
+from ._trabajos import ComandoTrabajo
+
+
+class Command(ComandoTrabajo):
+    help = "Recarga los perfumes de todas las tiendas (Silk, Yauras, Joy)."
+    tipo = TrabajoScraping.TIPO_TIENDAS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help=(
+                "Recorre las colecciones completas aunque no toque según SCRAPE_FULL_CRAWL_HOURS. "
+                "Borra el estado local de los sitemaps, así que con --enqueue solo sirve si el worker corre en esta máquina."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            views._estado_sitemaps.olvidar()
+        super().handle(*args, **options)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from web_perfumes_app import views
+from web_perfumes_app.models import TrabajoScraping
+
+from ._trabajos import detener_con_senales, ejecutar_reclamado
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de larga duración: toma de la cola los trabajos de scraping y de "
+        "Fragrantica que encolan las vistas y los ejecuta de a uno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--types",
+            nargs="+",
+            choices=[tipo for tipo, _ in TrabajoScraping.TIPO_CHOICES],
+            help="Tipos de trabajo que atiende este worker (por defecto todos).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Segundos entre revisiones de la cola cuando no hay trabajos (por defecto 5).",
+        )
+        parser.add_argument("--once", action="store_true", help="Termina cuando la cola queda vacía.")
+
+    def handle(self, *args, **options):
+        with detener_con_senales() as detenido:
+            self.stdout.write(f"Worker {views.WORKER_ID} esperando trabajos...")
+            while not detenido.is_set():
+                trabajo = views._reclamar_siguiente_trabajo(options["types"])
+                if trabajo is None:
+                    connection.close()
+                    if options["once"]:
+                        break
+                    detenido.wait(options["poll_interval"])
+                    continue
+                self.stdout.write(f"Trabajo {trabajo.pk} ({trabajo.tipo}) tomado.")
+                estado = ejecutar_reclamado(trabajo, detenido)
+                self.stdout.write(f"Trabajo {trabajo.pk} terminado: {estado}.")
+        self.stdout.write("Worker detenido.")
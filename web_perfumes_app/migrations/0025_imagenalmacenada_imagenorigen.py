@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web_perfumes_app", "0024_alter_perfume_imagen_length"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImagenAlmacenada",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("hash", models.CharField(max_length=64, unique=True)),
+                ("archivo", models.CharField(max_length=255)),
+                ("tamano", models.PositiveIntegerField(default=0)),
+                ("creado_en", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ImagenOrigen",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("url", models.URLField(max_length=1000, unique=True)),
+                (
+                    "imagen",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="origenes",
+                        to="web_perfumes_app.imagenalmacenada",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web_perfumes_app", "0025_imagenalmacenada_imagenorigen"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistorialPrecio",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "tienda",
+                    models.CharField(
+                        choices=[("SILK", "Silk Perfumes"), ("YAURAS", "Yauras Perfumes"), ("JOY", "Joy Perfumes")],
+                        max_length=250,
+                    ),
+                ),
+                ("precio", models.IntegerField()),
+                ("precio_ant", models.IntegerField(blank=True, null=True)),
+                ("observado_en", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "perfume",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="historial_precios",
+                        to="web_perfumes_app.perfume",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["perfume", "-observado_en"], name="historial_perfume_fecha_idx"),
+                    models.Index(fields=["observado_en"], name="historial_fecha_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web_perfumes_app", "0026_historialprecio"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrabajoScraping",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("running", "En curso"),
+                            ("done", "Terminado"),
+                            ("cancelled", "Cancelado"),
+                            ("error", "Error"),
+                            ("interrupted", "Interrumpido"),
+                        ],
+                        default="running",
+                        max_length=20,
+                    ),
+                ),
+                ("cancelado", models.BooleanField(default=False)),
+                ("worker", models.CharField(blank=True, default="", max_length=250)),
+                ("intentos", models.PositiveIntegerField(default=1)),
+                ("checkpoints", models.JSONField(blank=True, default=dict)),
+                ("progreso", models.JSONField(blank=True, default=dict)),
+                ("resultados", models.JSONField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, default="")),
+                ("iniciado_en", models.DateTimeField(auto_now_add=True)),
+                ("latido_en", models.DateTimeField(default=django.utils.timezone.now)),
+                ("terminado_en", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-id"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("estado", "running")),
+                        fields=("estado",),
+                        name="trabajo_scraping_unico_activo",
+                    )
+                ],
+            },
+        ),
+    ]
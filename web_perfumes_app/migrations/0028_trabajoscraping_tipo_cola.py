@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web_perfumes_app", "0027_trabajoscraping"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="trabajoscraping",
+            name="trabajo_scraping_unico_activo",
+        ),
+        migrations.AddField(
+            model_name="trabajoscraping",
+            name="tipo",
+            field=models.CharField(
+                choices=[
+                    ("stores", "Scraping de tiendas"),
+                    ("fragrantica_urls", "Búsqueda de URLs de Fragrantica"),
+                    ("fragrantica_enrich", "Acordes y notas de Fragrantica"),
+                ],
+                default="stores",
+                max_length=30,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="trabajoscraping",
+            name="estado",
+            field=models.CharField(
+                choices=[
+                    ("pending", "En cola"),
+                    ("running", "En curso"),
+                    ("done", "Terminado"),
+                    ("cancelled", "Cancelado"),
+                    ("error", "Error"),
+                    ("interrupted", "Interrumpido"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trabajoscraping",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("estado", "running")),
+                fields=("tipo",),
+                name="trabajo_scraping_unico_activo",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trabajoscraping",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("estado", "pending")),
+                fields=("tipo",),
+                name="trabajo_scraping_unico_en_cola",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web_perfumes_app", "0028_trabajoscraping_tipo_cola"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="perfume",
+            name="disponible",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name="perfume",
+            name="ultima_vez_visto",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="perfume",
+            index=models.Index(fields=["disponible", "nombre"], name="perfume_disponible_nombre_idx"),
+        ),
+    ]
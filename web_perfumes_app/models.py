@@ -69,6 +69,15 @@ class Perfume(models.Model):
     notas_general = models.ManyToManyField(Nota, related_name='perfumes_general', blank=True, null=True)
     estaciones = models.ManyToManyField(Estacion, related_name='perfumes', blank=True) #related_name sirve para hacer consultas inversas, para hacer consultas desde la tabla relacionada hacia la original
     fragrantica_url = models.URLField(blank=True, null=True)
+    # Los agotados no se borran: quedan ocultos y conservan imagen, URL de Fragrantica, acordes y notas
+    disponible = models.BooleanField(default=True)
+    ultima_vez_visto = models.DateTimeField(null=True, blank=True) # última corrida de scraping que lo vio en stock
+
+    class Meta:
+        indexes = [
+            # Grilla del home y estadísticas: solo disponibles, ordenados por nombre
+            models.Index(fields=["disponible", "nombre"], name="perfume_disponible_nombre_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         try:
@@ -89,6 +98,47 @@ class Perfume(models.Model):
         return self.nombre
 
 
+# HISTORIAL DE PRECIOS (solo se agrega una fila cuando el precio de un perfume cambia)
+class HistorialPrecio(models.Model):
+    # Sin índice propio para perfume: lo cubre el índice (perfume, -observado_en)
+    perfume = models.ForeignKey(Perfume, on_delete=models.CASCADE, related_name='historial_precios', db_index=False)
+    tienda = models.CharField(max_length=250, choices=Perfume.TIENDA_CHOICES)
+    precio = models.IntegerField()
+    precio_ant = models.IntegerField(null=True, blank=True)
+    observado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Último precio de un perfume y serie de un perfume en un rango de fechas
+            models.Index(fields=["perfume", "-observado_en"], name="historial_perfume_fecha_idx"),
+            # Compactación de observaciones antiguas
+            models.Index(fields=["observado_en"], name="historial_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.perfume_id} {self.precio} ({self.observado_en:%Y-%m-%d})"
+
+
+# IMÁGENES GUARDADAS POR CONTENIDO (perfumes/ab/abcdef....jpg), compartidas entre perfumes
+class ImagenAlmacenada(models.Model):
+    hash = models.CharField(max_length=64, unique=True) # sha256 del contenido
+    archivo = models.CharField(max_length=255) # nombre del archivo en el storage
+    tamano = models.PositiveIntegerField(default=0)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.archivo
+
+
+# URL de origen (tienda/CDN) -> imagen ya guardada, para no volver a descargarla
+class ImagenOrigen(models.Model):
+    url = models.URLField(max_length=1000, unique=True)
+    imagen = models.ForeignKey(ImagenAlmacenada, on_delete=models.CASCADE, related_name='origenes')
+
+    def __str__(self):
+        return self.url
+
+
 class VentaRegistro(models.Model):
     TIPO_PERFUME = "PERFUME"
     TIPO_DECANT = "DECANT"
@@ -114,3 +164,64 @@ class VentaRegistro(models.Model):
 
     def __str__(self):
         return f"{self.nombre} ({self.get_tipo_display()})"
+
+
+# CORRIDAS DE SCRAPING: estado compartido entre workers, cancelación y checkpoints para reanudar
+class TrabajoScraping(models.Model):
+    TIPO_TIENDAS = "stores"
+    TIPO_URLS_FRAGRANTICA = "fragrantica_urls"
+    TIPO_ACORDES_FRAGRANTICA = "fragrantica_enrich"
+    TIPO_CHOICES = [
+        (TIPO_TIENDAS, "Scraping de tiendas"),
+        (TIPO_URLS_FRAGRANTICA, "Búsqueda de URLs de Fragrantica"),
+        (TIPO_ACORDES_FRAGRANTICA, "Acordes y notas de Fragrantica"),
+    ]
+
+    ESTADO_PENDIENTE = "pending"
+    ESTADO_EN_CURSO = "running"
+    ESTADO_TERMINADO = "done"
+    ESTADO_CANCELADO = "cancelled"
+    ESTADO_ERROR = "error"
+    ESTADO_INTERRUMPIDO = "interrupted"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "En cola"),
+        (ESTADO_EN_CURSO, "En curso"),
+        (ESTADO_TERMINADO, "Terminado"),
+        (ESTADO_CANCELADO, "Cancelado"),
+        (ESTADO_ERROR, "Error"),
+        (ESTADO_INTERRUMPIDO, "Interrumpido"),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES, default=TIPO_TIENDAS)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    cancelado = models.BooleanField(default=False)
+    worker = models.CharField(max_length=250, blank=True, default="") # host:pid que lo está corriendo
+    intentos = models.PositiveIntegerField(default=1)
+    # {tienda: {categoria: {"pagina": n, "url": ..., "completa": bool}}}
+    checkpoints = models.JSONField(default=dict, blank=True)
+    progreso = models.JSONField(default=dict, blank=True) # copia de REFRESH_STATUS de la etapa del trabajo
+    resultados = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    iniciado_en = models.DateTimeField(auto_now_add=True)
+    latido_en = models.DateTimeField(default=timezone.now)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        constraints = [
+            # Nunca dos corridas activas del mismo tipo a la vez, aunque las tomen workers distintos
+            models.UniqueConstraint(
+                fields=["tipo"],
+                condition=models.Q(estado="running"),
+                name="trabajo_scraping_unico_activo",
+            ),
+            # Pedir una recarga que ya está en cola no agrega otra
+            models.UniqueConstraint(
+                fields=["tipo"],
+                condition=models.Q(estado="pending"),
+                name="trabajo_scraping_unico_en_cola",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.estado})"
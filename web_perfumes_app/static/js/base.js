@@ -923,6 +923,36 @@
       if (status.state === "error") {
         return status.error || "Error en scraping.";
       }
+      if (status.state === "pending") {
+        return status.message || "En cola.";
+      }
+      if (status.stores && typeof status.stores === "object") {
+        const storeParts = Object.values(status.stores)
+          .filter((store) => store && store.label)
+          .map((store) => {
+            if (store.state === "done") {
+              return `${store.label}: listo`;
+            }
+            if (store.state === "error") {
+              return `${store.label}: error`;
+            }
+            if (store.state === "cancelled") {
+              return `${store.label}: cancelado`;
+            }
+            if (store.state === "pending" || !store.page) {
+              return `${store.label}: en espera`;
+            }
+            const detail = [store.category_label, `Página ${store.page}`].filter(Boolean).join(" ");
+            return `${store.label}: ${detail}`;
+          });
+        const images = status.images || {};
+        if (images.pending) {
+          storeParts.push(`Imágenes: ${images.pending} en cola`);
+        }
+        if (storeParts.length) {
+          return storeParts.join(" · ");
+        }
+      }
       const parts = [];
       if (status.category_label) {
         parts.push(status.category_label);
@@ -945,6 +975,9 @@
       if (status.state === "error") {
         return status.error || "Error al normalizar URLs.";
       }
+      if (status.state === "pending") {
+        return status.message || "En cola.";
+      }
       const total = Number(status.total) || 0;
       const currentRaw = Number(status.current) || 0;
       const current = total ? Math.min(currentRaw, total) : currentRaw;
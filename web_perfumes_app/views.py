@@ -1,24 +1,43 @@
 import atexit
+import hashlib
+import io
+import multiprocessing
+import os
+import queue
 import random
 import re
+import socket
+import tempfile
 import threading
 import time
 import unicodedata
 import urllib.parse
 from collections import defaultdict
-from datetime import datetime
-
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from copy import deepcopy
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+import django
+import lxml.etree
+import lxml.html
+import psutil
 import requests
 import json
+from requests.adapters import HTTPAdapter
 from botasaurus.browser import Driver, Wait
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from django import forms
 from django.contrib import messages
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
 from django.db.models import Case, Count, IntegerField, Min, Q, Sum, Value, When, F, ExpressionWrapper, Avg
 from django.db.models.functions import ExtractYear
 from django.http import HttpResponse, JsonResponse
@@ -32,8 +51,102 @@ from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, sync_pla
 
 from .models import *
 
+IMAGENES_MAX_BYTES = max(1, int(getattr(settings, "SCRAPE_IMAGE_MAX_BYTES", 3_000_000)))
+# Hasta este tamaño la imagen en curso queda en memoria; por encima pasa a un archivo temporal
+IMAGENES_EN_MEMORIA = max(0, int(getattr(settings, "SCRAPE_IMAGE_SPOOL_BYTES", 256 * 1024)))
+
+
+def _formato_imagen(cabecera):
+    """Extensión según los primeros bytes del archivo, o None si no es un formato conocido."""
+    if cabecera.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if cabecera.startswith(b"\x89PNG"):
+        return ".png"
+    if cabecera.startswith(b"RIFF") and cabecera[8:12] == b"WEBP":
+        return ".webp"
+    if cabecera.startswith(b"GIF8"):
+        return ".gif"
+    if cabecera[4:12] in (b"ftypavif", b"ftypavis"):
+        return ".avif"
+    return None
+
+
+class ImagenTemporal:
+    """
+    Imagen escrita por partes en un SpooledTemporaryFile a medida que llega.
+
+    Calcula el sha256 y guarda los primeros bytes (para detectar el formato)
+    sin juntar nunca el contenido completo en memoria: pasados
+    IMAGENES_EN_MEMORIA bytes el archivo se vuelca a disco. Así el pico de
+    memoria no depende del tamaño de las imágenes ni de cuántas se bajan a la vez.
+    """
+
+    TAM_CABECERA = 16
+
+    def __init__(self, max_bytes=None, en_memoria=IMAGENES_EN_MEMORIA):
+        self.max_bytes = max_bytes
+        self.archivo = tempfile.SpooledTemporaryFile(max_size=en_memoria)
+        self.tamano = 0
+        self.cabecera = b""
+        self._sha256 = hashlib.sha256()
+
+    @classmethod
+    def desde_chunks(cls, chunks, **kwargs):
+        imagen = cls(**kwargs)
+        for chunk in chunks:
+            imagen.escribir(chunk)
+        return imagen
+
+    def escribir(self, chunk):
+        """Agrega un trozo. Devuelve False (sin escribirlo) si con él se supera max_bytes."""
+        if self.max_bytes is not None and self.tamano + len(chunk) > self.max_bytes:
+            return False
+        if len(self.cabecera) < self.TAM_CABECERA:
+            self.cabecera += chunk[: self.TAM_CABECERA - len(self.cabecera)]
+        self._sha256.update(chunk)
+        self.archivo.write(chunk)
+        self.tamano += len(chunk)
+        return True
+
+    @property
+    def cabecera_completa(self):
+        return len(self.cabecera) >= self.TAM_CABECERA
+
+    @property
+    def formato(self):
+        return _formato_imagen(self.cabecera)
+
+    @property
+    def extension(self):
+        # Igual que antes: lo que no se reconoce se guarda como jpg
+        return self.formato or ".jpg"
+
+    @property
+    def hash(self):
+        return self._sha256.hexdigest()
+
+    def como_file(self):
+        """File de Django listo para Storage.save, leído desde el principio."""
+        self.archivo.seek(0)
+        return File(self.archivo)
+
+    def cerrar(self):
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
 # Create your views here.
-def _descargar_imagen(url, timeout=(4, 8), max_bytes=3_000_000):
+def _descargar_imagen(url, timeout=(4, 8), max_bytes=IMAGENES_MAX_BYTES):
+    """
+    Descarga la imagen en streaming a una ImagenTemporal (hash y formato calculados
+    al vuelo). Devuelve None si falla, si supera max_bytes o si lo que llega no es
+    una imagen (p. ej. una página de error HTML). Quien la recibe debe cerrarla.
+    """
     if not url:
         return None
     print(f"[IMG] Descargando: {url}")
@@ -41,24 +154,103 @@ def _descargar_imagen(url, timeout=(4, 8), max_bytes=3_000_000):
         "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "Accept": "image/avif,image/webp,image/*,*/*;q=0.8",
     }
+    # Los reintentos de imágenes los maneja ColaImagenes
+    resultado = _fetch(url, headers=headers, timeout=timeout, stream=True, reintentos=0)
+    if resultado.response is None:
+        print(f"[IMG] Error descargando {url}: {resultado.error}")
+        return None
+    imagen = ImagenTemporal(max_bytes=max_bytes)
     try:
-        with requests.get(url, headers=headers, timeout=timeout, stream=True) as resp:
+        with resultado.response as resp:
             resp.raise_for_status()
-            total = 0
-            chunks = []
+            tipo = (resp.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            try:
+                declarado = int(resp.headers.get("Content-Length") or 0)
+            except ValueError:
+                declarado = 0
+            if declarado > max_bytes:
+                print(f"[IMG] Imagen demasiado grande ({declarado} bytes), se omite: {url}")
+                imagen.cerrar()
+                return None
+            revisada = False
             for chunk in resp.iter_content(chunk_size=64 * 1024):
                 if not chunk:
                     continue
-                total += len(chunk)
-                if total > max_bytes:
+                if not imagen.escribir(chunk):
                     print(f"[IMG] Imagen demasiado grande, se omite: {url}")
+                    imagen.cerrar()
                     return None
-                chunks.append(chunk)
-            return b"".join(chunks)
+                if not revisada and imagen.cabecera_completa:
+                    revisada = True
+                    if imagen.formato is None and not tipo.startswith("image/"):
+                        print(f"[IMG] El contenido no es una imagen ({tipo or 'sin Content-Type'}), se omite: {url}")
+                        imagen.cerrar()
+                        return None
+            if not imagen.tamano or (imagen.formato is None and not tipo.startswith("image/")):
+                print(f"[IMG] Respuesta vacía o que no es una imagen, se omite: {url}")
+                imagen.cerrar()
+                return None
+            return imagen
     except Exception as e:
         print(f"[IMG] Error descargando {url}: {e}")
+        imagen.cerrar()
         return None
 
+
+def _almacenar_imagen(imagen, url_origen=None):
+    """
+    Guarda la imagen (una ImagenTemporal) bajo su hash (perfumes/ab/abcdef....jpg)
+    y devuelve el nombre del archivo en el storage. Si ese contenido ya estaba
+    guardado (otra tienda, un perfume recreado o uno personalizado) reutiliza el
+    archivo. El archivo temporal se pasa tal cual al storage, sin leerlo entero.
+    Solo usa la API de Storage, así que sirve igual para MEDIA_ROOT y Cloudinary.
+    """
+    digest = imagen.hash
+    registro = ImagenAlmacenada.objects.filter(hash=digest).first()
+    if registro is None:
+        nombre = f"perfumes/{digest[:2]}/{digest}{imagen.extension}"
+        guardado = nombre if default_storage.exists(nombre) else default_storage.save(nombre, imagen.como_file())
+        registro, creado = ImagenAlmacenada.objects.get_or_create(
+            hash=digest,
+            defaults={"archivo": guardado, "tamano": imagen.tamano},
+        )
+        # Otro hilo guardó el mismo contenido al mismo tiempo: queda su archivo
+        if not creado and guardado != registro.archivo:
+            default_storage.delete(guardado)
+    if url_origen:
+        ImagenOrigen.objects.update_or_create(url=url_origen[:1000], defaults={"imagen": registro})
+    return registro.archivo
+
+
+def _almacenar_imagen_subida(archivo_subido):
+    """Guarda por contenido una imagen subida desde el formulario, leyéndola por partes."""
+    with ImagenTemporal.desde_chunks(archivo_subido.chunks()) as imagen:
+        return _almacenar_imagen(imagen)
+
+
+def _imagen_por_url(url):
+    """Archivo ya guardado para esa URL de origen, o None si nunca se descargó."""
+    origen = ImagenOrigen.objects.filter(url=url[:1000]).select_related("imagen").first()
+    return origen.imagen.archivo if origen else None
+
+
+def _liberar_imagenes(nombres_archivo):
+    """
+    Borra del storage las imágenes de perfumes ya eliminados, salvo las guardadas
+    por contenido (se reutilizan si el perfume vuelve) o las que usa otro perfume.
+    """
+    nombres = {nombre for nombre in nombres_archivo if nombre}
+    if not nombres:
+        return
+    nombres -= set(ImagenAlmacenada.objects.filter(archivo__in=nombres).values_list("archivo", flat=True))
+    nombres -= set(Perfume.objects.filter(imagen__in=nombres).values_list("imagen", flat=True))
+    for nombre in nombres:
+        try:
+            default_storage.delete(nombre)
+        except Exception as e:
+            print(f"[IMG] No se pudo borrar {nombre}: {e}")
+
+
 def _parsear_clp(texto):
     dig = re.sub(r'[^\d]', '', texto or '')
     if not dig:
@@ -154,26 +346,28 @@ def _obtener_marca_normalizada(nombre):
     fusiona marcas duplicadas que coincidan en la equivalencia.
     """
     canon = _normalizar_marca_nombre(nombre)
-    marca_obj, _ = Marca.objects.get_or_create(marca=canon)
+    marca_obj, creada = Marca.objects.get_or_create(marca=canon)
 
+    fusionadas = False
     variantes = [k for k, v in MARCA_EQUIVALENCIAS.items() if v == canon]
     for variante in variantes:
         for dup in Marca.objects.filter(marca__iexact=variante).exclude(id=marca_obj.id):
             Perfume.objects.filter(marca=dup).update(marca=marca_obj)
             if not dup.perfumes.exists():
                 dup.delete()
+            fusionadas = True
 
-    global _marcas_cache
-    _marcas_cache = None  # refrescar en siguiente consulta
+    if creada or fusionadas:
+        global _marcas_cache
+        _marcas_cache = None  # refrescar en siguiente consulta
 
     return marca_obj
 
 def _refrescar_cache_marcas():
     global _marcas_cache
-    _marcas_cache = []
-    for m in Marca.objects.all():
-        norm = _normalizar_texto(m.marca)
-        _marcas_cache.append((norm, m))
+    # Se arma en una lista local: otros hilos de scraping pueden leer o invalidar el cache mientras tanto.
+    _marcas_cache = [(_normalizar_texto(m.marca), m) for m in Marca.objects.all()]
+    return _marcas_cache
 
 def _normalizar_marcas_existentes():
     """
@@ -229,13 +423,14 @@ def _inferir_marca_por_nombre(nombre):
         if clave in nombre_norm:
             return _obtener_marca_normalizada(canon)
 
-    if _marcas_cache is None:
-        _refrescar_cache_marcas()
+    marcas_cache = _marcas_cache
+    if marcas_cache is None:
+        marcas_cache = _refrescar_cache_marcas()
 
     best = None
     best_len = 0
     best_idx = None
-    for norm, marca in _marcas_cache:
+    for norm, marca in marcas_cache:
         if not norm:
             continue
         idx = nombre_norm.find(norm)
@@ -256,6 +451,79 @@ def _inferir_marca_por_nombre(nombre):
     return None
 
 
+class ResolutorMarcas:
+    """
+    Resuelve marcas durante una corrida de scraping. Memoriza texto del vendor → Marca
+    y mantiene caliente el índice normalizado que usa la inferencia por nombre.
+    La fusión de marcas duplicadas se hace una sola vez, al crear el resolutor.
+    Es seguro compartirlo entre los hilos de las tiendas.
+    """
+
+    def __init__(self, fusionar_duplicadas=True):
+        if fusionar_duplicadas:
+            _normalizar_marcas_existentes()
+        self._lock = threading.Lock()
+        self._por_texto = {}
+        self._por_clave = {}
+        self._indice = []
+        for marca in Marca.objects.all().order_by("id"):
+            self._registrar(marca)
+
+    def _registrar(self, marca):
+        clave = _normalizar_texto(marca.marca)
+        if clave and clave not in self._por_clave:
+            self._por_clave[clave] = marca
+            self._indice.append((clave, marca))
+
+    def resolver(self, nombre):
+        texto = (nombre or "").strip()
+        with self._lock:
+            marca = self._por_texto.get(texto)
+            if marca is not None:
+                return marca
+            canon = _normalizar_marca_nombre(texto)
+            marca = self._por_clave.get(_normalizar_texto(canon))
+        if marca is None:
+            marca, _ = Marca.objects.get_or_create(marca=canon)
+        with self._lock:
+            self._registrar(marca)
+            self._por_texto[texto] = marca
+        return marca
+
+    def inferir(self, nombre_perfume):
+        """Equivalente a _inferir_marca_por_nombre, usando el índice del resolutor."""
+        nombre_norm = _normalizar_texto(nombre_perfume)
+        if not nombre_norm:
+            return None
+
+        for clave, canon in MARCA_EQUIVALENCIAS.items():
+            if clave in nombre_norm:
+                return self.resolver(canon)
+
+        with self._lock:
+            indice = list(self._indice)
+
+        best = None
+        best_len = 0
+        best_idx = None
+        for norm, marca in indice:
+            idx = nombre_norm.find(norm)
+            if idx == -1:
+                continue
+            if len(norm) > best_len or (len(norm) == best_len and (best_idx is None or idx < best_idx)):
+                best = marca
+                best_len = len(norm)
+                best_idx = idx
+
+        if best:
+            return best
+
+        primera = (nombre_perfume.split() or [""])[0]
+        if primera:
+            return self.resolver(primera)
+        return None
+
+
 def _slugify_fragrantica_path(texto):
     """
     Fragrantica usa palabras con inicial mayúscula separadas por guiones.
@@ -319,7 +587,7 @@ def crear_perfume_custom(request):
             perfume_obj.tienda_personalizada = tienda_nombre
             perfume_obj.url_producto = url_producto
             if imagen_subida:
-                perfume_obj.imagen = imagen_subida
+                perfume_obj.imagen = _almacenar_imagen_subida(imagen_subida)
             elif imagen_existente_id not in (None, "", "0"):
                 try:
                     base_perfume = Perfume.objects.get(pk=int(imagen_existente_id))
@@ -340,7 +608,7 @@ def crear_perfume_custom(request):
                 url_producto=url_producto,
             )
             if imagen_subida:
-                perfume.imagen = imagen_subida
+                perfume.imagen = _almacenar_imagen_subida(imagen_subida)
                 perfume.save(update_fields=["imagen"])
             elif imagen_existente_id not in (None, "", "0"):
                 try:
@@ -378,13 +646,12 @@ def _probar_slug_fragrantica(nombre_perfume):
     if not brand_slug or not perfume_slug:
         return None
     url = f"https://www.fragrantica.es/perfume/{brand_slug}/{perfume_slug}.html"
-    try:
-        r = requests.head(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=6, allow_redirects=True)
-        if r.status_code == 200:
-            print(f"[Fragrantica] URL válida por slug: {url}")
-            return url
-    except Exception as e:
-        print(f"[Fragrantica] HEAD fallo para slug {url}: {e}")
+    resultado = _fetch(url, method="HEAD", headers={"User-Agent": "Mozilla/5.0"}, timeout=6, allow_redirects=True)
+    if resultado.ok and resultado.response.status_code == 200:
+        print(f"[Fragrantica] URL válida por slug: {url}")
+        return url
+    if resultado.error:
+        print(f"[Fragrantica] HEAD fallo para slug {url}: {resultado.error}")
     return None
 
 ESTACIONES_VALIDAS = {"invierno", "primavera", "verano", "otono"}
@@ -393,110 +660,556 @@ ESTACION_MIN_PORCENTAJE = 60
 REFRESH_STATUS = {
     "scraping": {"state": "idle", "updated_at": None},
     "urls": {"state": "idle", "updated_at": None},
+    "acordes": {"state": "idle", "updated_at": None},
 }
 REFRESH_CANCEL = {
     "scraping": False,
+    "urls": False,
+    "acordes": False,
+}
+# Los scrapers de cada tienda corren en hilos distintos y escriben su progreso a la vez.
+_refresh_status_lock = threading.Lock()
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+TRABAJO_LATIDO_SEGUNDOS = 2
+# Un trabajo "running" sin latido por más de esto se considera interrumpido (worker caído)
+TRABAJO_VENCIDO_SEGUNDOS = max(10, int(getattr(settings, "SCRAPE_JOB_STALE_SECONDS", 60)))
+# Veces que un trabajo se reencola tras caerse su worker antes de darlo por perdido
+TRABAJO_MAX_INTENTOS = 3
+
+# Etapa de REFRESH_STATUS / REFRESH_CANCEL en la que reporta cada tipo de trabajo
+ETAPA_POR_TIPO = {
+    TrabajoScraping.TIPO_TIENDAS: "scraping",
+    TrabajoScraping.TIPO_URLS_FRAGRANTICA: "urls",
+    TrabajoScraping.TIPO_ACORDES_FRAGRANTICA: "acordes",
 }
 
-_driver_lock = threading.Lock()
-_shared_driver = None
-_driver_instances_created = 0
-_driver_use_lock = threading.Lock()
-_driver_idle_timer = None
-_scrape_thread = None
-_scrape_lock = threading.Lock()
 
+class _TrabajoEnCurso:
+    """
+    TrabajoScraping que corre en este proceso. Guarda en memoria los checkpoints
+    de cada tienda/categoría y un hilo de latido los vuelca a la BD junto con
+    REFRESH_STATUS de la etapa, y trae la marca de cancelación que puede haber
+    puesto la vista desde otro proceso.
+    """
 
-def _run_scrape_async():
-    try:
-        resultados = scrapping_tiendas_perfumes()
-        state_final = "cancelled" if _is_refresh_cancelled("scraping") else "done"
-        _set_refresh_status("scraping", state=state_final, resultados=resultados, item=None)
-    except Exception as e:
-        _set_refresh_status("scraping", state="error", error=str(e))
+    def __init__(self, trabajo):
+        self.id = trabajo.pk
+        self.etapa = ETAPA_POR_TIPO[trabajo.tipo]
+        self.checkpoints = deepcopy(trabajo.checkpoints or {})
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def checkpoints_tienda(self, tienda):
+        with self._lock:
+            return deepcopy(self.checkpoints.get(tienda, {}))
+
+    def registrar(self, tienda, categoria, **datos):
+        with self._lock:
+            self.checkpoints.setdefault(tienda, {}).setdefault(categoria, {}).update(datos)
+
+    def sincronizar(self, **campos):
+        with self._lock:
+            checkpoints = deepcopy(self.checkpoints)
+        progreso = _snapshot_refresh_status(self.etapa)
+        progreso["hosts"] = _metricas_hosts()
+        TrabajoScraping.objects.filter(pk=self.id).update(
+            checkpoints=checkpoints,
+            progreso=progreso,
+            latido_en=timezone.now(),
+            **campos,
+        )
+        if TrabajoScraping.objects.filter(pk=self.id, cancelado=True).exists():
+            _set_refresh_cancel(self.etapa, True)
+
+    def _latir(self):
+        try:
+            while not self._detener.wait(TRABAJO_LATIDO_SEGUNDOS):
+                try:
+                    self.sincronizar()
+                except Exception as e:
+                    print(f"[TRABAJOS] No se pudo guardar el progreso del trabajo {self.id}: {e}")
+        finally:
+            connection.close()
 
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._latir, name="trabajo-latido", daemon=True)
+        self._hilo.start()
 
-def _start_scrape_async():
-    global _scrape_thread
-    with _scrape_lock:
-        if _scrape_thread and _scrape_thread.is_alive():
-            return False
-        _scrape_thread = threading.Thread(target=_run_scrape_async, daemon=True)
-        _scrape_thread.start()
-        return True
+    def terminar(self, estado, resultados=None, error=""):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=TRABAJO_LATIDO_SEGUNDOS * 2)
+        self.sincronizar(estado=estado, resultados=resultados, error=error, terminado_en=timezone.now())
+
+
+_trabajo_en_curso = None
+
+
+def _checkpoints_tienda(tienda):
+    """Checkpoints de la corrida actual para la tienda ({} si no se está reanudando)."""
+    trabajo = _trabajo_en_curso
+    return trabajo.checkpoints_tienda(tienda) if trabajo else {}
+
+
+def _registrar_checkpoint(tienda, categoria, **datos):
+    trabajo = _trabajo_en_curso
+    if trabajo:
+        trabajo.registrar(tienda, categoria, **datos)
+
+
+def _reencolar_trabajo(trabajo):
+    """Devuelve a la cola un trabajo que no terminó, conservando sus checkpoints."""
+    trabajo.estado = TrabajoScraping.ESTADO_PENDIENTE
+    trabajo.cancelado = False
+    trabajo.worker = ""
+    trabajo.intentos += 1
+    trabajo.error = ""
+    trabajo.terminado_en = None
+    trabajo.save()
 
 
-def _get_shared_driver():
+def _encolar_trabajo(tipo):
     """
-    Devuelve un único navegador compartido. Registra en consola si
-    se reutiliza o si se tuvo que crear uno nuevo.
+    Deja en cola un trabajo del tipo pedido para que lo tome el worker
+    (manage.py scraping_worker) y lo devuelve; si ya hay uno en cola o en curso
+    devuelve ese. Un trabajo interrumpido o con error que dejó checkpoints se
+    reencola para que siga desde donde quedó.
     """
-    global _shared_driver, _driver_instances_created
-    with _driver_lock:
-        driver_cerrado = False
-        if _shared_driver:
-            try:
-                driver_cerrado = _shared_driver.is_closed()
-            except Exception:
-                driver_cerrado = False
+    vencido = timezone.now() - timedelta(seconds=TRABAJO_VENCIDO_SEGUNDOS)
+    activos = (TrabajoScraping.ESTADO_PENDIENTE, TrabajoScraping.ESTADO_EN_CURSO)
+    try:
+        with transaction.atomic():
+            for trabajo in TrabajoScraping.objects.select_for_update().filter(tipo=tipo, estado__in=activos):
+                if trabajo.estado == TrabajoScraping.ESTADO_PENDIENTE or trabajo.latido_en >= vencido:
+                    return trabajo
+                print(f"[TRABAJOS] Trabajo {trabajo.pk} de {trabajo.worker} sin latido, queda interrumpido.")
+                trabajo.estado = TrabajoScraping.ESTADO_INTERRUMPIDO
+                trabajo.save(update_fields=["estado"])
+
+            ultimo = TrabajoScraping.objects.select_for_update().filter(tipo=tipo).first()
+            reanudables = (TrabajoScraping.ESTADO_INTERRUMPIDO, TrabajoScraping.ESTADO_ERROR)
+            if ultimo and ultimo.estado in reanudables and ultimo.checkpoints:
+                print(f"[TRABAJOS] Trabajo {ultimo.pk} vuelve a la cola para reanudarse desde sus checkpoints.")
+                _reencolar_trabajo(ultimo)
+                return ultimo
+            return TrabajoScraping.objects.create(tipo=tipo)
+    except IntegrityError:
+        # Otro proceso lo encoló al mismo tiempo
+        return TrabajoScraping.objects.filter(tipo=tipo, estado__in=activos).first()
+
+
+def _reclamar_siguiente_trabajo(tipos=None):
+    """
+    Toma el trabajo en cola más antiguo de los tipos pedidos cuyo tipo no esté ya
+    corriendo y lo marca en curso para este worker. Antes reencola los trabajos en
+    curso que se quedaron sin latido (su worker se cayó), hasta TRABAJO_MAX_INTENTOS.
+    Devuelve None si no hay nada que hacer.
+    """
+    tipos = list(tipos or ETAPA_POR_TIPO)
+    vencido = timezone.now() - timedelta(seconds=TRABAJO_VENCIDO_SEGUNDOS)
+    try:
+        with transaction.atomic():
+            caidos = TrabajoScraping.objects.select_for_update(skip_locked=True).filter(
+                tipo__in=tipos, estado=TrabajoScraping.ESTADO_EN_CURSO, latido_en__lt=vencido
+            )
+            for trabajo in caidos:
+                print(f"[TRABAJOS] Trabajo {trabajo.pk} de {trabajo.worker} sin latido, queda interrumpido.")
+                trabajo.estado = TrabajoScraping.ESTADO_INTERRUMPIDO
+                trabajo.save(update_fields=["estado"])
+                en_cola = TrabajoScraping.objects.filter(tipo=trabajo.tipo, estado=TrabajoScraping.ESTADO_PENDIENTE)
+                if trabajo.intentos < TRABAJO_MAX_INTENTOS and not en_cola.exists():
+                    _reencolar_trabajo(trabajo)
+
+            ocupados = list(
+                TrabajoScraping.objects.filter(tipo__in=tipos, estado=TrabajoScraping.ESTADO_EN_CURSO).values_list("tipo", flat=True)
+            )
+            trabajo = (
+                TrabajoScraping.objects.select_for_update(skip_locked=True)
+                .filter(tipo__in=tipos, estado=TrabajoScraping.ESTADO_PENDIENTE)
+                .exclude(tipo__in=ocupados)
+                .order_by("id")
+                .first()
+            )
+            if trabajo is None:
+                return None
+            trabajo.estado = TrabajoScraping.ESTADO_EN_CURSO
+            trabajo.worker = WORKER_ID
+            trabajo.latido_en = timezone.now()
+            trabajo.save(update_fields=["estado", "worker", "latido_en"])
+            return trabajo
+    except IntegrityError:
+        # Otro worker tomó un trabajo del mismo tipo al mismo tiempo
+        return None
 
-        if _shared_driver is None or driver_cerrado:
-            _shared_driver = Driver(headless=True, block_images=True)
-            _driver_instances_created += 1
-            if _driver_instances_created == 1:
-                print("[Botasaurus] Se creó la instancia de navegador compartido #1.")
-            else:
-                print(f"[Botasaurus] Se creó una NUEVA instancia de navegador #{_driver_instances_created} (la previa no estaba disponible).")
+
+def _devolver_a_la_cola(trabajo_id):
+    """
+    Para un worker que se apaga a mitad de un trabajo: si no lo canceló el
+    usuario, el trabajo vuelve a la cola y otro worker lo reanuda.
+    """
+    with transaction.atomic():
+        trabajo = TrabajoScraping.objects.select_for_update().filter(pk=trabajo_id).first()
+        if not trabajo or trabajo.cancelado or trabajo.estado == TrabajoScraping.ESTADO_TERMINADO:
+            return
+        en_cola = TrabajoScraping.objects.filter(tipo=trabajo.tipo, estado=TrabajoScraping.ESTADO_PENDIENTE)
+        if en_cola.exists():
+            trabajo.estado = TrabajoScraping.ESTADO_INTERRUMPIDO
+            trabajo.save(update_fields=["estado"])
         else:
-            print(f"[Botasaurus] Reutilizando navegador compartido existente (instancia #{_driver_instances_created}).")
+            _reencolar_trabajo(trabajo)
 
-        return _shared_driver
 
-def _close_shared_driver():
-    """Cierra el navegador compartido al terminar el proceso."""
-    global _shared_driver
-    with _driver_lock:
-        if _shared_driver:
+def _ejecutar_trabajo(trabajo):
+    """
+    Corre en este proceso un trabajo ya reclamado, con latido en la BD y
+    cancelación compartida. Devuelve el estado final.
+    """
+    global _trabajo_en_curso
+    etapa = ETAPA_POR_TIPO[trabajo.tipo]
+    en_curso = _TrabajoEnCurso(trabajo)
+    _trabajo_en_curso = en_curso
+    _set_refresh_cancel(etapa, False)
+    _reset_refresh_status(etapa)
+    _set_refresh_status(etapa, state="running", job_id=trabajo.pk, resumed=trabajo.intentos > 1)
+    en_curso.iniciar()
+    estado, resultados, error = TrabajoScraping.ESTADO_ERROR, None, ""
+    try:
+        if trabajo.tipo == TrabajoScraping.TIPO_TIENDAS:
+            resultados = scrapping_tiendas_perfumes()
+        elif trabajo.tipo == TrabajoScraping.TIPO_URLS_FRAGRANTICA:
+            resultados = {"urls_encontradas": actualizar_urls_fragrantica()}
+        else:
+            resultados = {"perfumes_actualizados": actualizar_acordes_todos()}
+        estado = TrabajoScraping.ESTADO_CANCELADO if _is_refresh_cancelled(etapa) else TrabajoScraping.ESTADO_TERMINADO
+        _set_refresh_status(etapa, state=estado, resultados=resultados, item=None)
+    except Exception as e:
+        error = str(e)
+        _set_refresh_status(etapa, state="error", error=error)
+    finally:
+        _trabajo_en_curso = None
+        try:
+            en_curso.terminar(estado, resultados=resultados, error=error)
+        except Exception as e:
+            print(f"[TRABAJOS] No se pudo cerrar el trabajo {en_curso.id}: {e}")
+        connection.close()
+    return estado
+
+
+def _estado_trabajo(tipo):
+    """
+    Estado del último trabajo del tipo, con el formato de REFRESH_STATUS: el de
+    memoria si corre en este proceso, si no el último progreso que el worker
+    guardó en la BD.
+    """
+    etapa = ETAPA_POR_TIPO[tipo]
+    trabajo = TrabajoScraping.objects.filter(tipo=tipo).first()
+    en_curso = _trabajo_en_curso
+    if not trabajo or (en_curso and en_curso.id == trabajo.pk):
+        return _snapshot_refresh_status(etapa)
+
+    data = dict(trabajo.progreso or {})
+    data["job_id"] = trabajo.pk
+    vencido = timezone.now() - timedelta(seconds=TRABAJO_VENCIDO_SEGUNDOS)
+    if trabajo.estado == TrabajoScraping.ESTADO_PENDIENTE:
+        data["state"] = "pending"
+        data["message"] = "En cola, esperando al worker."
+    elif trabajo.estado == TrabajoScraping.ESTADO_EN_CURSO and trabajo.latido_en >= vencido:
+        data["state"] = "cancelled" if trabajo.cancelado else data.get("state") or "running"
+    elif trabajo.estado == TrabajoScraping.ESTADO_EN_CURSO:
+        data["state"] = "error"
+        data["error"] = "El worker dejó de responder. La corrida se retomará desde donde quedó cuando vuelva."
+    elif trabajo.estado == TrabajoScraping.ESTADO_INTERRUMPIDO:
+        data["state"] = "error"
+        data["error"] = "La corrida se interrumpió. Vuelve a recargar para continuar donde quedó."
+    else:
+        data["state"] = trabajo.estado
+        if trabajo.resultados is not None:
+            data["resultados"] = trabajo.resultados
+        if trabajo.error:
+            data["error"] = trabajo.error
+    return data
+
+
+def _cancelar_trabajo(tipo):
+    """Cancela el trabajo en cola del tipo y marca la cancelación del que está corriendo, esté en el worker que esté."""
+    _set_refresh_cancel(ETAPA_POR_TIPO[tipo], True)
+    TrabajoScraping.objects.filter(tipo=tipo, estado=TrabajoScraping.ESTADO_PENDIENTE).update(
+        estado=TrabajoScraping.ESTADO_CANCELADO,
+        cancelado=True,
+        terminado_en=timezone.now(),
+    )
+    TrabajoScraping.objects.filter(tipo=tipo, estado=TrabajoScraping.ESTADO_EN_CURSO).update(cancelado=True)
+
+
+NAVEGADORES_POOL = max(1, int(getattr(settings, "SCRAPE_BROWSER_POOL_SIZE", 2)))
+# Páginas que visita un navegador antes de cerrarlo y abrir uno limpio (Chrome acumula memoria)
+NAVEGADORES_MAX_PAGINAS = max(1, int(getattr(settings, "SCRAPE_BROWSER_MAX_PAGES", 50)))
+# MB de RSS (Chrome y sus procesos hijos) para todo el pool; 0 desactiva el control
+NAVEGADORES_MEMORIA_MB = max(0, int(getattr(settings, "SCRAPE_BROWSER_MEMORY_MB", 1500)))
+# Segundos que se espera un navegador libre, y segundos sin uso tras los que se cierran los libres
+NAVEGADORES_ESPERA = 120
+NAVEGADORES_OCIOSO = 30
+
+
+class NavegadorPool:
+    """Un Driver de botasaurus prestado por PoolNavegadores, con las páginas que lleva visitadas."""
+
+    def __init__(self, driver, numero):
+        self.driver = driver
+        self.numero = numero
+        self.paginas = 0
+
+    def visitar(self, url):
+        self.paginas += 1
+        _visitar_con_navegador(self.driver, url)
+
+    def sano(self):
+        """El proceso de Chrome sigue vivo y la pestaña responde a un script."""
+        try:
+            navegador = getattr(self.driver, "_browser", None)
+            if navegador is not None and navegador.stopped:
+                return False
+            return self.driver.run_js("return 1") == 1
+        except Exception:
+            return False
+
+    def memoria_mb(self):
+        """RSS del proceso de Chrome y sus hijos (renderers, GPU), en MB."""
+        pid = getattr(getattr(self.driver, "_browser", None), "_process_pid", None)
+        if not pid:
+            return 0
+        try:
+            proceso = psutil.Process(pid)
+            procesos = [proceso] + proceso.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for p in procesos:
             try:
-                print("[Botasaurus] Cerrando navegador compartido al finalizar el proceso.")
-                _shared_driver.close()
-            except Exception as e:
-                print(f"[Botasaurus] Error al cerrar navegador compartido: {e}")
-            finally:
-                _shared_driver = None
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
 
-atexit.register(_close_shared_driver)
+    def cerrar(self):
+        try:
+            self.driver.close()
+        except Exception as e:
+            print(f"[Botasaurus] Error al cerrar el navegador #{self.numero}: {e}")
 
 
-def _schedule_driver_close(delay_seconds=30):
+class PoolNavegadores:
     """
-    Programa el cierre del navegador tras un periodo de inactividad.
-    Si delay_seconds es 0, solo cancela un cierre previo.
+    Hasta `tamano` navegadores headless para Fragrantica, prestados de a uno.
+
+    Cada búsqueda o descarga de acordes pide un navegador con `navegador()`
+    y lo devuelve al salir del bloque, así varias páginas se visitan a la vez
+    en vez de turnarse un único navegador bajo un lock. Al prestar uno se
+    revisa que siga vivo (si no, se reemplaza); al devolverlo se recicla si
+    ya visitó `max_paginas` páginas o si el pool supera `memoria_mb`, y no se
+    abren navegadores nuevos mientras el pool esté sobre ese presupuesto.
+    Los libres se cierran tras `ocioso` segundos sin uso.
     """
-    global _driver_idle_timer
-    with _driver_lock:
-        if _driver_idle_timer:
-            _driver_idle_timer.cancel()
-            _driver_idle_timer = None
 
-        if delay_seconds and delay_seconds > 0:
-            def _close_if_idle():
-                _close_shared_driver()
+    def __init__(self, tamano=NAVEGADORES_POOL, max_paginas=NAVEGADORES_MAX_PAGINAS, memoria_mb=NAVEGADORES_MEMORIA_MB, ocioso=NAVEGADORES_OCIOSO, fabrica=None):
+        self.tamano = tamano
+        self.max_paginas = max_paginas
+        self.memoria_mb = memoria_mb
+        self.ocioso = ocioso
+        self.fabrica = fabrica or (lambda: Driver(headless=True, block_images=True))
+        self._condicion = threading.Condition()
+        self._libres = []
+        self._prestados = set()
+        # Navegadores abiertos o abriéndose (libres + prestados + en creación)
+        self._abiertos = 0
+        self._creados = 0
+        self._temporizador = None
+        self._metricas = {"created": 0, "recycled": 0, "unhealthy": 0, "checkouts": 0, "waited_seconds": 0.0}
+
+    def metricas(self):
+        with self._condicion:
+            datos = dict(self._metricas)
+            datos.update(size=self.tamano, open=self._abiertos, in_use=len(self._prestados))
+        datos["waited_seconds"] = round(datos["waited_seconds"], 2)
+        return datos
+
+    def _memoria_pool_mb(self):
+        """
+        RSS de todo el pool. Solo se copia la lista de navegadores bajo el lock:
+        recorrer los procesos de Chrome con psutil es lento y no debe frenar a
+        los que prestan o devuelven. Llamar sin tener tomado `_condicion`.
+        """
+        with self._condicion:
+            navegadores = list(self._libres) + list(self._prestados)
+        return sum(navegador.memoria_mb() for navegador in navegadores)
+
+    def _crear(self):
+        try:
+            driver = self.fabrica()
+        except Exception:
+            with self._condicion:
+                self._abiertos -= 1
+                self._condicion.notify()
+            raise
+        with self._condicion:
+            self._creados += 1
+            self._metricas["created"] += 1
+            numero = self._creados
+        print(f"[Botasaurus] Se abrió el navegador #{numero} del pool ({self._abiertos}/{self.tamano} abiertos).")
+        return NavegadorPool(driver, numero)
+
+    def prestar(self, timeout=NAVEGADORES_ESPERA):
+        """Un NavegadorPool sano, o None si no se liberó ninguno en `timeout` segundos."""
+        inicio = time.monotonic()
+        memoria = None
+        with self._condicion:
+            self._cancelar_cierre()
+            while True:
+                if self._libres:
+                    navegador = self._libres.pop()
+                    break
+                if self._abiertos < self.tamano:
+                    # Si no hay ninguno abierto se abre uno aunque el presupuesto esté pasado
+                    if self.memoria_mb and self._abiertos and memoria is None:
+                        # Se mide con el lock suelto y se vuelve a evaluar: el pool pudo cambiar
+                        self._condicion.release()
+                        try:
+                            memoria = self._memoria_pool_mb()
+                        finally:
+                            self._condicion.acquire()
+                        continue
+                    if not self.memoria_mb or not self._abiertos or memoria < self.memoria_mb:
+                        self._abiertos += 1
+                        navegador = None
+                        break
+                restante = timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._metricas["waited_seconds"] += time.monotonic() - inicio
+                    return None
+                self._condicion.wait(restante)
+                memoria = None
+            self._metricas["checkouts"] += 1
+            self._metricas["waited_seconds"] += time.monotonic() - inicio
+
+        if navegador is not None and not navegador.sano():
+            print(f"[Botasaurus] El navegador #{navegador.numero} no responde; se reemplaza.")
+            navegador.cerrar()
+            with self._condicion:
+                self._metricas["unhealthy"] += 1
+            navegador = None
+        if navegador is None:
+            navegador = self._crear()
+        with self._condicion:
+            self._prestados.add(navegador)
+        return navegador
+
+    def devolver(self, navegador):
+        motivo = None
+        if navegador.paginas >= self.max_paginas:
+            motivo = f"{navegador.paginas} páginas visitadas"
+        elif self.memoria_mb:
+            memoria = self._memoria_pool_mb()
+            if memoria > self.memoria_mb:
+                motivo = f"el pool usa {memoria:.0f} MB (máximo {self.memoria_mb} MB)"
+        if motivo:
+            print(f"[Botasaurus] Se recicla el navegador #{navegador.numero}: {motivo}.")
+            navegador.cerrar()
+        with self._condicion:
+            self._prestados.discard(navegador)
+            if motivo:
+                self._abiertos -= 1
+                self._metricas["recycled"] += 1
+            else:
+                self._libres.append(navegador)
+            self._condicion.notify()
+            if not self._prestados:
+                self._programar_cierre()
+
+    @contextmanager
+    def navegador(self, timeout=NAVEGADORES_ESPERA):
+        navegador = self.prestar(timeout)
+        try:
+            yield navegador
+        finally:
+            if navegador is not None:
+                self.devolver(navegador)
+
+    def _cancelar_cierre(self):
+        if self._temporizador:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def _programar_cierre(self):
+        self._cancelar_cierre()
+        if self.ocioso:
+            self._temporizador = threading.Timer(self.ocioso, self.cerrar_libres)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def cerrar_libres(self):
+        """Cierra los navegadores que no están prestados."""
+        with self._condicion:
+            libres, self._libres = self._libres, []
+            self._abiertos -= len(libres)
+            self._condicion.notify_all()
+        if libres:
+            print(f"[Botasaurus] Cerrando {len(libres)} navegadores sin uso.")
+        for navegador in libres:
+            navegador.cerrar()
+
+    def cerrar(self):
+        """Cierra todos los navegadores al terminar el proceso."""
+        with self._condicion:
+            self._cancelar_cierre()
+            prestados = list(self._prestados)
+        self.cerrar_libres()
+        for navegador in prestados:
+            navegador.cerrar()
+
+
+_pool_navegadores = PoolNavegadores()
+atexit.register(_pool_navegadores.cerrar)
 
-            _driver_idle_timer = threading.Timer(delay_seconds, _close_if_idle)
-            _driver_idle_timer.daemon = True
-            _driver_idle_timer.start()
 
 def _set_refresh_status(stage, **kwargs):
     stage = stage or "scraping"
-    data = REFRESH_STATUS.setdefault(stage, {})
-    data.update(kwargs)
-    data["updated_at"] = timezone.now().isoformat()
-    REFRESH_STATUS[stage] = data
+    with _refresh_status_lock:
+        data = REFRESH_STATUS.setdefault(stage, {})
+        data.update(kwargs)
+        data["updated_at"] = timezone.now().isoformat()
+        REFRESH_STATUS[stage] = data
+
+
+def _set_store_status(tienda, **kwargs):
+    """
+    Actualiza el progreso de una tienda dentro de REFRESH_STATUS["scraping"]["stores"],
+    así cada scraper concurrente tiene su propia categoría/página en vez de pisarse.
+    """
+    ahora = timezone.now().isoformat()
+    with _refresh_status_lock:
+        data = REFRESH_STATUS.setdefault("scraping", {})
+        stores = data.get("stores")
+        if not isinstance(stores, dict):
+            stores = {}
+            data["stores"] = stores
+        store = stores.setdefault(tienda, {})
+        store.update(kwargs)
+        store["updated_at"] = ahora
+        data["updated_at"] = ahora
+
+
+def _snapshot_refresh_status(stage=None):
+    with _refresh_status_lock:
+        if stage:
+            return deepcopy(REFRESH_STATUS.get(stage, {}))
+        return deepcopy(REFRESH_STATUS)
 
 
 def _reset_refresh_status(stage):
-    REFRESH_STATUS[stage] = {"state": "idle", "updated_at": timezone.now().isoformat()}
+    with _refresh_status_lock:
+        REFRESH_STATUS[stage] = {"state": "idle", "updated_at": timezone.now().isoformat()}
 
 def _set_refresh_cancel(stage, value):
     REFRESH_CANCEL[stage] = bool(value)
@@ -621,218 +1334,177 @@ def _compartir_detalles_perfume(perfume):
     return propagados
 
 def obtener_acordes(url):
-    driver = _get_shared_driver()
-    # Cancela cierre programado si se va a reutilizar el driver
-    _schedule_driver_close(delay_seconds=0)
-    print("[Botasaurus] Solicitando uso del navegador compartido...")
-    acquired = _driver_use_lock.acquire(timeout=120)
-    if not acquired:
-        print("[Botasaurus] No se pudo obtener el lock del navegador en 120s.")
-        return None
-    print("[Botasaurus] Navegador bloqueado para esta descarga.")
-    try:
-        print(f"[Fragrantica] Solicitando URL: {url}")
-        driver.get(url)
-        time.sleep(random.uniform(1,2))
-        # Asegura que el bloque principal de notas se haya cargado antes de parsear
+    if _fixtures_http and _fixtures_http.reproduciendo:
+        # Sin red: la ficha grabada desde el navegador con fixtures_http en modo "grabar"
+        return _parsear_ficha_fragrantica(_fixtures_http.html(url) or "", url)
+    print("[Botasaurus] Solicitando un navegador del pool...")
+    with _pool_navegadores.navegador() as navegador:
+        if navegador is None:
+            print(f"[Botasaurus] No se liberó ningún navegador en {NAVEGADORES_ESPERA}s.")
+            return None
+        return _leer_acordes_fragrantica(navegador, url)
+
+
+def _leer_acordes_fragrantica(navegador, url):
+    """
+    Visita la ficha de Fragrantica con un navegador del pool, espera a que carguen
+    las notas y los acordes y los extrae de una sola captura del HTML, sin ir y
+    volver al navegador por cada elemento.
+    """
+    driver = navegador.driver
+    print(f"[Fragrantica] Solicitando URL: {url}")
+    navegador.visitar(url)
+    # Asegura que el bloque principal de notas y los acordes se hayan cargado antes de capturar
+    for selector, espera in (("div.notes-box", Wait.LONG), ("div.accord-box", Wait.SHORT)):
         try:
-            driver.wait_for_element("div.notes-box", wait=Wait.MEDIUM)
+            driver.wait_for_element(selector, wait=espera)
         except Exception:
             pass
-        
-        # === ACORDES ===
-        acordes = []
-        try:
-            driver.wait_for_element("div.accord-box", wait=Wait.SHORT)
-            bars = driver.select_all("div.accord-bar")
-            for bar in bars:
-                texto = bar.text.strip()
-                if not texto:
-                    continue
-                style = bar.get_attribute("style") or ""
-                bg_match = re.search(r'background:\s*rgb\(([^\)]+)\)', style)
-                text_match = re.search(r'color:\s*rgb\(([^\)]+)\)', style)
-                bg_color = tuple(map(int, bg_match.group(1).split(','))) if bg_match else None
-                text_color = tuple(map(int, text_match.group(1).split(','))) if text_match else None
-
-                acordes.append({
-                    'acorde': texto,
-                    'background_rgb': bg_color,
-                    'text_rgb': text_color
-                })
-        except:
-            acordes = []
-
-        # === ESTACIONES ===
-        estaciones = []
-        try:
-            spans = driver.select_all("span.vote-button-legend") or []
-            if not spans:
-                # Algunos renders tardan; espera un poco más y reintenta
-                time.sleep(1.5)
-                spans = driver.select_all("span.vote-button-legend") or []
-            vistos = set()
-            for span in spans:
-                nombre = (span.text or "").strip()
-                if not nombre:
-                    continue
-                clave = _normalizar_texto(nombre)
-                if clave not in ESTACIONES_VALIDAS or clave in vistos:
-                    continue
-                vistos.add(clave)
-
-                contenedor = span.parent
-                if contenedor:
-                    contenedor = contenedor.parent
-
-                porcentaje = None
-                if contenedor:
-                    barra = contenedor.select("div.voting-small-chart-size div div")
-                    if barra:
-                        style = barra.get_attribute("style") or ""
-                        match = re.search(r'width:\s*([\d.,]+)%', style, re.IGNORECASE)
-                        if match:
-                            valor = match.group(1).replace(',', '.')
-                            try:
-                                porcentaje = float(valor)
-                            except ValueError:
-                                porcentaje = None
-
-                estaciones.append({
-                    'nombre': nombre,
-                    'porcentaje': porcentaje
-                })
-                print(f"[Estaciones] {nombre}: {porcentaje}")
-        except Exception as e:
-            print(f"[Estaciones] Error obteniendo estaciones en {url}: {e}")
+    html = driver.page_html or ""
+    if "vote-button-legend" not in html:
+        # Algunos renders tardan en mostrar las estaciones; espera un poco más y vuelve a capturar
+        time.sleep(1.5)
+        html = driver.page_html or html
+    if _fixtures_http and not _fixtures_http.reproduciendo:
+        # Se graba la captura que se parseó, no la del momento en que terminó la carga
+        _fixtures_http.guardar_html(url, html)
+    return _parsear_ficha_fragrantica(html, url)
 
-        # === NOTAS PIRÁMIDE (solo texto) ===
-        notas = {'salida': [], 'corazon': [], 'base': [], 'general': []}
-        try:
-            secciones = {
-                "Notas de Salida": "salida",
-                "Corazón": "corazon",
-                "Base": "base"
-            }
 
-            for titulo, clave in secciones.items():
-                print(f"[Notas] Buscando sección '{titulo}' en {url}")
-                encabezado = None
-                for candidato in driver.select_all("h4"):
-                    texto_candidato = (candidato.text or "").strip().lower()
-                    if not texto_candidato:
-                        continue
-                    if titulo.lower() in texto_candidato:
-                        encabezado = candidato
-                        break
+def _xpath_clase(clase):
+    """Condición XPath equivalente al selector CSS `.clase`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {clase} ')"
 
-                if not encabezado:
-                    print(f"[Notas] No se encontró encabezado '{titulo}'")
-                    continue
 
-                print(f"[Notas] Encabezado '{titulo}' encontrado")
-
-                contenedor = None
-                parent = encabezado.parent
-                if parent:
-                    hijos = parent.children
-                    indice_encabezado = None
-                    for i, hijo in enumerate(hijos):
-                        if getattr(hijo, "_elem", None) and getattr(encabezado, "_elem", None) and hijo._elem.node_id == encabezado._elem.node_id:
-                            indice_encabezado = i
-                            break
-
-                    if indice_encabezado is not None:
-                        for hermano in hijos[indice_encabezado + 1:]:
-                            if hermano.tag_name != "div":
-                                continue
-                            contenedor = hermano
-                            break
-
-                if not contenedor:
-                    print(f"[Notas] No se encontró contenedor principal para '{titulo}'. Probando búsqueda global.")
-                    candidatos = driver.select_all("div[style*='flex'][style*='wrap']")
-                    if candidatos:
-                        contenedor = candidatos[0]
-
-                if not contenedor:
-                    print(f"[Notas] No se encontró contenedor para '{titulo}'")
-                    continue
+def _texto_elemento(elemento):
+    return re.sub(r"\s+", " ", elemento.text_content() or "").strip()
+
+
+def _parsear_ficha_fragrantica(html, url=""):
+    """
+    Acordes (con sus colores), pirámide de notas, notas planas y votos por
+    estación de una ficha de Fragrantica, a partir de su HTML y con lxml.
+    Devuelve {'acordes': [...], 'notas': {...}, 'estaciones': [...]}.
+    """
+    acordes = []
+    estaciones = []
+    notas = {'salida': [], 'corazon': [], 'base': [], 'general': []}
+    try:
+        documento = lxml.html.fromstring(html)
+    except (lxml.etree.ParserError, ValueError) as e:
+        print(f"[Fragrantica] HTML vacío o ilegible en {url}: {e}")
+        return {'acordes': acordes, 'notas': notas, 'estaciones': estaciones}
+
+    # === ACORDES ===
+    for bar in documento.xpath(f"//div[{_xpath_clase('accord-bar')}]"):
+        texto = _texto_elemento(bar)
+        if not texto:
+            continue
+        style = bar.get("style") or ""
+        bg_match = re.search(r'background:\s*rgb\(([^\)]+)\)', style)
+        text_match = re.search(r'color:\s*rgb\(([^\)]+)\)', style)
+        try:
+            bg_color = tuple(map(int, bg_match.group(1).split(','))) if bg_match else None
+            text_color = tuple(map(int, text_match.group(1).split(','))) if text_match else None
+        except ValueError:
+            bg_color = text_color = None
+        acordes.append({
+            'acorde': texto,
+            'background_rgb': bg_color,
+            'text_rgb': text_color
+        })
 
-                tarjetas = contenedor.select_all("div[style*='flex-direction: column']")
-                if not tarjetas:
-                    tarjetas = contenedor.select_all("div")
+    # === ESTACIONES ===
+    vistos = set()
+    for span in documento.xpath(f"//span[{_xpath_clase('vote-button-legend')}]"):
+        nombre = _texto_elemento(span)
+        if not nombre:
+            continue
+        clave = _normalizar_texto(nombre)
+        if clave not in ESTACIONES_VALIDAS or clave in vistos:
+            continue
+        vistos.add(clave)
 
-                print(f"[Notas] Se encontraron {len(tarjetas)} tarjetas potenciales para '{titulo}'")
+        contenedor = span.getparent()
+        if contenedor is not None:
+            contenedor = contenedor.getparent()
 
-                for tarjeta in tarjetas:
+        porcentaje = None
+        if contenedor is not None:
+            barra = contenedor.xpath(f"(.//div[{_xpath_clase('voting-small-chart-size')}]//div//div)[1]")
+            if barra:
+                match = re.search(r'width:\s*([\d.,]+)%', barra[0].get("style") or "", re.IGNORECASE)
+                if match:
                     try:
-                        texto_div = tarjeta.select("div:nth-of-type(2)")
-                        if texto_div:
-                            txt = texto_div.text.strip()
-                        else:
-                            txt = tarjeta.text.strip()
-                    except Exception as e:
-                        print(f"[Notas] Error obteniendo texto de tarjeta: {e}")
-                        continue
+                        porcentaje = float(match.group(1).replace(',', '.'))
+                    except ValueError:
+                        porcentaje = None
 
-                    txt = re.sub(r'\s+', ' ', txt)
-                    if txt:
-                        notas[clave].append(txt)
-                        print(f"[Notas] Añadida nota '{txt}' a la sección '{clave}'")
-                    else:
-                        print(f"[Notas] Tarjeta vacía ignorada en sección '{clave}'")
-            # Fallback: notas sin pirámide (lista plana)
-            total_notas = len(notas["salida"]) + len(notas["corazon"]) + len(notas["base"])
-            if total_notas == 0:
-                try:
-                    print(f"[Notas] Intentando fallback notas planas en {url}")
-                    contenedores = driver.select_all("div.notes-box") or []
-                    vistos = set()
-                    notas_planas = []
-                    for box in contenedores:
-                        parent = box.parent
-                        if not parent:
-                            continue
-                        # Busca items en el contenedor siguiente (flex wrap)
-                        flex_wraps = parent.select_all("div[style*='flex'][style*='wrap']") or []
-                        for wrap in flex_wraps:
-                            tarjetas = wrap.select_all("div") or []
-                            for tarjeta in tarjetas:
-                                texto = (tarjeta.text or "").strip()
-                                if not texto:
-                                    # Si el texto está fuera del <a>, intenta con el padre inmediato
-                                    enlace = tarjeta.select("a")
-                                    if enlace and enlace.parent:
-                                        texto = (enlace.parent.text or "").strip()
-                                texto = re.sub(r'\s+', ' ', texto)
-                                if not texto:
-                                    continue
-                                clave_txt = texto.lower()
-                                if clave_txt in vistos:
-                                    continue
-                                vistos.add(clave_txt)
-                                notas_planas.append(texto)
-                    if notas_planas:
-                        notas["general"].extend(notas_planas)
-                        print(f"[Notas] Fallback plano: {len(notas_planas)} notas agregadas")
-                except Exception as e:
-                    print(f"[Notas] Error en fallback plano en {url}: {e}")
-        except Exception as e:
-            print(f"[Notas] Error general obteniendo pirámide en {url}: {e}")
-            import traceback
-            traceback.print_exc()
+        estaciones.append({
+            'nombre': nombre,
+            'porcentaje': porcentaje
+        })
 
-        return {
-            'acordes': acordes,
-            'notas': notas,
-            'estaciones': estaciones
-        }
-    finally:
-        _driver_use_lock.release()
-        print("[Botasaurus] Navegador liberado para otras descargas.")
-        # Programa cierre si no hay más usos en breve
-        _schedule_driver_close(delay_seconds=30)
+    # === NOTAS PIRÁMIDE (solo texto) ===
+    secciones = {
+        "Notas de Salida": "salida",
+        "Corazón": "corazon",
+        "Base": "base"
+    }
+    encabezados = [(h4, _texto_elemento(h4).lower()) for h4 in documento.xpath("//h4")]
+    flex_wrap = "//div[contains(@style, 'flex') and contains(@style, 'wrap')]"
+    for titulo, clave in secciones.items():
+        encabezado = next((h4 for h4, texto in encabezados if texto and titulo.lower() in texto), None)
+        if encabezado is None:
+            continue
+        # El primer div hermano después del encabezado; si no hay, el primer bloque flex-wrap de la página
+        contenedor = next((hermano for hermano in encabezado.itersiblings() if hermano.tag == "div"), None)
+        if contenedor is None:
+            candidatos = documento.xpath(flex_wrap)
+            contenedor = candidatos[0] if candidatos else None
+        if contenedor is None:
+            print(f"[Notas] No se encontró contenedor para '{titulo}'")
+            continue
+
+        tarjetas = contenedor.xpath(".//div[contains(@style, 'flex-direction: column')]") or contenedor.xpath(".//div")
+        for tarjeta in tarjetas:
+            # Igual que div:nth-of-type(2): la imagen va en el primer div y el nombre en el segundo
+            texto_div = tarjeta.xpath("(.//div[count(preceding-sibling::div) = 1])[1]")
+            txt = _texto_elemento(texto_div[0] if texto_div else tarjeta)
+            if txt:
+                notas[clave].append(txt)
+
+    # Fallback: notas sin pirámide (lista plana)
+    if not (notas["salida"] or notas["corazon"] or notas["base"]):
+        vistos = set()
+        for box in documento.xpath(f"//div[{_xpath_clase('notes-box')}]"):
+            parent = box.getparent()
+            if parent is None:
+                continue
+            for wrap in parent.xpath(".//div[contains(@style, 'flex') and contains(@style, 'wrap')]"):
+                for tarjeta in wrap.xpath(".//div"):
+                    texto = _texto_elemento(tarjeta)
+                    if not texto:
+                        # Si el texto está fuera del <a>, intenta con el padre inmediato
+                        enlace = tarjeta.xpath(".//a")
+                        if enlace and enlace[0].getparent() is not None:
+                            texto = _texto_elemento(enlace[0].getparent())
+                    if not texto or texto.lower() in vistos:
+                        continue
+                    vistos.add(texto.lower())
+                    notas["general"].append(texto)
+        if notas["general"]:
+            print(f"[Notas] Fallback plano: {len(notas['general'])} notas agregadas")
+
+    print(
+        f"[Fragrantica] {len(acordes)} acordes | Salida: {len(notas['salida'])} | Corazón: {len(notas['corazon'])} | "
+        f"Base: {len(notas['base'])} | General: {len(notas['general'])} | Estaciones: {len(estaciones)}"
+    )
+    return {
+        'acordes': acordes,
+        'notas': notas,
+        'estaciones': estaciones
+    }
 
 def _guardar_estaciones_perfume(perfume, estaciones_data):
     estaciones_data = estaciones_data or []
@@ -871,79 +1543,109 @@ def _guardar_estaciones_perfume(perfume, estaciones_data):
 
     return bool(nuevos)
 
+def _actualizar_acordes_perfume(perfume):
+    """Descarga y guarda acordes, notas y estaciones de un perfume con URL de Fragrantica."""
+    print(f"→ {perfume.nombre}")
+    url_normalizada = convertir_a_fragrantica_es(perfume.fragrantica_url)
+    if url_normalizada != perfume.fragrantica_url:
+        perfume.fragrantica_url = url_normalizada
+        perfume.save(update_fields=["fragrantica_url"])
+
+    # Una sola llamada: trae acordes, notas y estaciones
+    data = obtener_acordes(url_normalizada) or {}
+    acordes_data = data.get('acordes', [])
+    notas = data.get('notas', {})
+    estaciones_data = data.get('estaciones', [])
+
+    # === GUARDAR ACORDES ===
+    if acordes_data:
+        acorde_objs = []
+        for item in acordes_data:
+            acorde_obj, _ = Acorde.objects.get_or_create(nombre=item['acorde'])
+
+            if item['background_rgb']:
+                r, g, b = item['background_rgb']
+                nuevo_color = f"{r},{g},{b}"
+                if acorde_obj.background_rgb != nuevo_color:
+                    acorde_obj.background_rgb = nuevo_color
+                    acorde_obj.save(update_fields=["background_rgb"])
+
+            acorde_objs.append(acorde_obj)
+
+        perfume.acordes.set(acorde_objs)
+
+    # === GUARDAR NOTAS (salida, corazón, base, general) ===
+    for seccion, nombres in notas.items():
+        if not nombres:
+            continue
+
+        nota_objs = []
+        for nombre in nombres:
+            nota_obj, _ = Nota.objects.get_or_create(nombre=nombre.strip())
+            nota_objs.append(nota_obj)
+
+        if seccion == "salida":
+            perfume.notas_salida.set(nota_objs)
+        elif seccion == "corazon":
+            perfume.notas_corazon.set(nota_objs)
+        elif seccion == "base":
+            perfume.notas_base.set(nota_objs)
+        elif seccion == "general":
+            perfume.notas_general.set(nota_objs)
+
+    # === GUARDAR ESTACIONES ===
+    _guardar_estaciones_perfume(perfume, estaciones_data)
+
+    perfume.save()
+    print(f"   ✓ {len(acordes_data)} acordes | "
+          f"Salida: {len(notas['salida'])} | "
+          f"Corazón: {len(notas['corazon'])} | "
+          f"Base: {len(notas['base'])} | "
+          f"Estaciones: {len(estaciones_data)}")
+    _compartir_detalles_perfume(perfume)
+    return True
+
 # En actualizar_acordes_todos(), cambia a:
 def actualizar_acordes_todos():
-    perfumes = Perfume.objects.filter(fragrantica_url__isnull=False).exclude(fragrantica_url="").order_by('id')
-    print(f"[Acordes + Notas] Perfumes con URL: {perfumes.count()}")
+    """
+    Recorre los perfumes con URL de Fragrantica con tantos hilos como navegadores
+    tiene el pool, así cada navegador procesa un perfume a la vez.
+    """
+    # Los agotados ya tienen sus acordes; se refrescan cuando vuelvan a stock
+    perfumes = Perfume.objects.filter(disponible=True, fragrantica_url__isnull=False).exclude(fragrantica_url="").order_by('id')
+    cantidad = perfumes.count()
+    print(f"[Acordes + Notas] Perfumes con URL: {cantidad} | Navegadores: {_pool_navegadores.tamano}")
     total = 0
-
-    for perfume in perfumes:
+    procesados = 0
+    lock = threading.Lock()
+    circuito_abierto = threading.Event()
+
+    def procesar(perfume):
+        nonlocal total, procesados
+        if circuito_abierto.is_set() or _is_refresh_cancelled("acordes"):
+            return
+        with lock:
+            procesados += 1
+            _set_refresh_status("acordes", state="running", total=cantidad, current=procesados, perfume=perfume.nombre)
         try:
-            print(f"→ {perfume.nombre}")
-            url_normalizada = convertir_a_fragrantica_es(perfume.fragrantica_url)
-            if url_normalizada != perfume.fragrantica_url:
-                perfume.fragrantica_url = url_normalizada
-                perfume.save(update_fields=["fragrantica_url"])
-
-            # Una sola llamada: trae acordes, notas y estaciones
-            data = obtener_acordes(url_normalizada) or {}
-            acordes_data = data.get('acordes', [])
-            notas = data.get('notas', {})
-            estaciones_data = data.get('estaciones', [])
-
-            time.sleep(random.uniform(1.5, 3.5))
-
-            # === GUARDAR ACORDES ===
-            if acordes_data:
-                acorde_objs = []
-                for item in acordes_data:
-                    acorde_obj, _ = Acorde.objects.get_or_create(nombre=item['acorde'])
-
-                    if item['background_rgb']:
-                        r, g, b = item['background_rgb']
-                        nuevo_color = f"{r},{g},{b}"
-                        if acorde_obj.background_rgb != nuevo_color:
-                            acorde_obj.background_rgb = nuevo_color
-                            acorde_obj.save(update_fields=["background_rgb"])
-
-                    acorde_objs.append(acorde_obj)
-
-                perfume.acordes.set(acorde_objs)
-
-            # === GUARDAR NOTAS (salida, corazón, base, general) ===
-            for seccion, nombres in notas.items():
-                if not nombres:
-                    continue
-
-                nota_objs = []
-                for nombre in nombres:
-                    nota_obj, _ = Nota.objects.get_or_create(nombre=nombre.strip())
-                    nota_objs.append(nota_obj)
-
-                if seccion == "salida":
-                    perfume.notas_salida.set(nota_objs)
-                elif seccion == "corazon":
-                    perfume.notas_corazon.set(nota_objs)
-                elif seccion == "base":
-                    perfume.notas_base.set(nota_objs)
-                elif seccion == "general":
-                    perfume.notas_general.set(nota_objs)
-
-            # === GUARDAR ESTACIONES ===
-            _guardar_estaciones_perfume(perfume, estaciones_data)
-
-            perfume.save()
-            total += 1
-            print(f"   ✓ {len(acordes_data)} acordes | "
-                  f"Salida: {len(notas['salida'])} | "
-                  f"Corazón: {len(notas['corazon'])} | "
-                  f"Base: {len(notas['base'])} | "
-                  f"Estaciones: {len(estaciones_data)}")
-            _compartir_detalles_perfume(perfume)
-
+            if _actualizar_acordes_perfume(perfume):
+                with lock:
+                    total += 1
+        except CircuitoAbierto as e:
+            if not circuito_abierto.is_set():
+                circuito_abierto.set()
+                print(f"[Acordes + Notas] {e}: se omiten los perfumes restantes.")
         except Exception as e:
             print(f"   Error con {perfume.nombre}: {e}")
+        finally:
+            connection.close()
 
+    with ThreadPoolExecutor(max_workers=_pool_navegadores.tamano, thread_name_prefix="acordes") as executor:
+        list(executor.map(procesar, perfumes))
+    if _is_refresh_cancelled("acordes"):
+        print("[Acordes + Notas] Cancelado.")
+
+    _set_refresh_status("acordes", browsers=_pool_navegadores.metricas())
     print(f"¡Terminado! {total} perfumes actualizados con acordes y notas olfativas.")
     return total
 
@@ -984,305 +1686,2123 @@ def descargar_acordes_individual(request, perfume_id):
     return redirect('home')  # o a la pagina del perfume si tienes detalle
 
 
-# FUNCIONES SCRAPPING
-def scrapping_silk_perfumes():
+# CAPA HTTP COMPARTIDA PARA SCRAPERS
+HTTP_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+PAGINAS_EN_VUELO = max(1, int(getattr(settings, "SCRAPE_PAGES_IN_FLIGHT", 3)))
 
-    categorias = [
-        ("perfumes-de-hombre", "https://silkperfumes.cl/collections/perfumes-de-hombre?page={page}"),
-        ("perfumes-arabes-hombre", "https://silkperfumes.cl/collections/perfumes-arabes-hombre?page={page}"),
-        ("perfumes-unisex", "https://silkperfumes.cl/collections/perfumes-unisex?page={page}"),
-        ("perfumes-arabes-unisex", "https://silkperfumes.cl/collections/perfumes-arabes-unisex?page={page}"),
-    ]
+_sesiones_http = {}
+_sesiones_http_lock = threading.Lock()
 
-    categoria_labels = {
-        "perfumes-de-hombre": "Perfumes de hombre",
-        "perfumes-arabes-hombre": "Perfumes árabes hombre",
-        "perfumes-unisex": "Perfumes unisex",
-        "perfumes-arabes-unisex": "Perfumes árabes unisex",
-    }
 
-    generos_por_categoria = {
-        "perfumes-de-hombre": {"Hombre"},
-        "perfumes-arabes-hombre": {"Hombre"},
-        "perfumes-unisex": {"Unisex"},
-        "perfumes-arabes-unisex": {"Unisex"},
-    }
+def _obtener_sesion_http(host):
+    """
+    Devuelve una sesión keep-alive por host, con un pool de conexiones del tamaño
+    suficiente para las páginas en vuelo de todas las categorías de la tienda.
+    """
+    clave = (host or "").lower()
+    with _sesiones_http_lock:
+        sesion = _sesiones_http.get(clave)
+        if sesion is None:
+            sesion = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(4, PAGINAS_EN_VUELO * 2))
+            sesion.mount("https://", adapter)
+            sesion.mount("http://", adapter)
+            sesion.headers.update({"User-Agent": HTTP_USER_AGENT})
+            _sesiones_http[clave] = sesion
+        return sesion
+
+
+# host: (peticiones por segundo al partir, máximo). El mínimo es común a todos.
+LIMITES_HOSTS = {
+    "silkperfumes.cl": (4.0, 16.0),
+    "yauras.cl": (4.0, 16.0),
+    "joyperfumes.cl": (4.0, 16.0),
+    "fragrantica.es": (0.4, 1.0),
+    "fragrantica.com": (0.4, 1.0),
+    "duckduckgo.com": (1.0, 2.0),
+    "google.com": (0.5, 1.0),
+    "google.es": (0.5, 1.0),
+    **getattr(settings, "SCRAPE_HOST_RATES", {}),
+}
+LIMITE_HOST_POR_DEFECTO = (8.0, 32.0)
 
-    genero_cache = {}
 
-    def obtener_genero(nombre_genero):
-        clave = (nombre_genero or "").strip().lower()
-        if not clave:
+class LimitadorHosts:
+    """
+    Token bucket por host, compartido por todos los hilos del proceso, con ajuste
+    AIMD: cada 200 rápido sube la tasa en un paso fijo y cada 202/429/503 o
+    timeout la divide por dos. Los subdominios comparten la cubeta de su host
+    configurado (html.duckduckgo.com -> duckduckgo.com).
+    """
+
+    def __init__(self, limites, por_defecto, tasa_minima=0.05, umbral_rapido=1.5):
+        self.limites = limites
+        self.por_defecto = por_defecto
+        self.tasa_minima = tasa_minima
+        self.umbral_rapido = umbral_rapido
+        self._lock = threading.Lock()
+        self._cubetas = {}
+
+    def clave(self, url_o_host):
+        host = urllib.parse.urlsplit(url_o_host).hostname if "//" in url_o_host else url_o_host
+        host = (host or "").lower()
+        for conocido in self.limites:
+            if host == conocido or host.endswith("." + conocido):
+                return conocido
+        return host
+
+    def _cubeta(self, clave):
+        cubeta = self._cubetas.get(clave)
+        if cubeta is None:
+            tasa, maxima = self.limites.get(clave, self.por_defecto)
+            cubeta = {
+                "tasa": tasa,
+                "maxima": maxima,
+                "tokens": 1.0,
+                "ultimo": time.monotonic(),
+                "peticiones": 0,
+                "frenadas": 0,
+                "espera_total": 0.0,
+                "ultima_espera": 0.0,
+            }
+            self._cubetas[clave] = cubeta
+        return cubeta
+
+    def adquirir(self, url_o_host):
+        """Bloquea hasta que el host tenga un token libre. Devuelve los segundos esperados."""
+        clave = self.clave(url_o_host)
+        with self._lock:
+            cubeta = self._cubeta(clave)
+            ahora = time.monotonic()
+            # Capacidad de ráfaga: un segundo de tasa (al menos una petición)
+            capacidad = max(1.0, cubeta["tasa"])
+            cubeta["tokens"] = min(capacidad, cubeta["tokens"] + (ahora - cubeta["ultimo"]) * cubeta["tasa"])
+            cubeta["ultimo"] = ahora
+            # Se reserva el token aunque quede en negativo: los hilos siguientes esperan su turno
+            cubeta["tokens"] -= 1.0
+            espera = -cubeta["tokens"] / cubeta["tasa"] if cubeta["tokens"] < 0 else 0.0
+            cubeta["peticiones"] += 1
+            cubeta["espera_total"] += espera
+            cubeta["ultima_espera"] = espera
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    def registrar(self, url_o_host, status=None, duracion=None, error=None):
+        """Ajusta la tasa del host según el resultado de la petición."""
+        clave = self.clave(url_o_host)
+        frenar = error is not None or status in (202, 429, 503)
+        with self._lock:
+            cubeta = self._cubeta(clave)
+            if frenar:
+                cubeta["tasa"] = max(self.tasa_minima, cubeta["tasa"] / 2)
+                cubeta["tokens"] = min(cubeta["tokens"], 0.0)
+                cubeta["frenadas"] += 1
+            elif status is not None and status < 400 and (duracion or 0) < self.umbral_rapido:
+                cubeta["tasa"] = min(cubeta["maxima"], cubeta["tasa"] + cubeta["maxima"] / 20)
+        if frenar:
+            print(f"[HTTP] {clave} respondió {status or error}: tasa reducida a {self.metricas(clave)[clave]['rate']}/s")
+
+    def metricas(self, solo=None):
+        with self._lock:
+            ahora = time.monotonic()
+            datos = {}
+            for clave, cubeta in self._cubetas.items():
+                if solo and clave != solo:
+                    continue
+                tokens = cubeta["tokens"] + (ahora - cubeta["ultimo"]) * cubeta["tasa"]
+                datos[clave] = {
+                    "rate": round(cubeta["tasa"], 3),
+                    "wait_seconds": round(max(0.0, -tokens / cubeta["tasa"]), 3),
+                    "last_wait": round(cubeta["ultima_espera"], 3),
+                    "total_wait": round(cubeta["espera_total"], 1),
+                    "requests": cubeta["peticiones"],
+                    "throttled": cubeta["frenadas"],
+                }
+            return datos
+
+
+_limitador_hosts = LimitadorHosts(LIMITES_HOSTS, LIMITE_HOST_POR_DEFECTO)
+
+
+class FixturesHttp:
+    """
+    Grabación y reproducción de respuestas HTTP para correr los scrapers sin red.
+    Cada respuesta se guarda en <directorio>/<host>/<sha1 de método + URL>.json
+    (status y headers) junto a un .body con el contenido. Al reproducir, una URL
+    sin grabación responde 404, y una grabación con ETag responde 304 al GET
+    condicional que lo repite. Las páginas del navegador se guardan como .html
+    (lo que el driver tenía renderizado al terminar la carga, o la captura que
+    se parseó, en las fichas de Fragrantica).
+    """
+
+    def __init__(self, directorio, modo):
+        if modo not in ("grabar", "reproducir"):
+            raise ValueError(f"Modo de fixtures desconocido: {modo}")
+        self.directorio = directorio
+        self.modo = modo
+        self._lock = threading.Lock()
+        self.metricas = {"grabadas": 0, "reproducidas": 0, "faltantes": 0}
+
+    @property
+    def reproduciendo(self):
+        return self.modo == "reproducir"
+
+    def _ruta(self, method, url, params=None):
+        url_completa = requests.Request(method, url, params=params).prepare().url
+        host = urllib.parse.urlsplit(url_completa).hostname or "sin-host"
+        clave = hashlib.sha1(f"{method.upper()} {url_completa}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directorio, host, clave), url_completa
+
+    def _contar(self, metrica):
+        with self._lock:
+            self.metricas[metrica] += 1
+
+    def guardar(self, method, url, response, params=None):
+        ruta, url_completa = self._ruta(method, url, params)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        meta = {
+            "method": method.upper(),
+            "url": url_completa,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+        }
+        # Las respuestas en stream se leen completas para poder guardarlas
+        for sufijo, contenido in ((".body", response.content), (".json", json.dumps(meta).encode("utf-8"))):
+            temporal = f"{ruta}{sufijo}.{threading.get_ident()}.tmp"
+            with open(temporal, "wb") as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, ruta + sufijo)
+        self._contar("grabadas")
+
+    def responder(self, method, url, params=None, headers=None, **kwargs):
+        ruta, url_completa = self._ruta(method, url, params)
+        response = requests.Response()
+        response.url = url_completa
+        try:
+            with open(ruta + ".json", encoding="utf-8") as archivo:
+                meta = json.load(archivo)
+            with open(ruta + ".body", "rb") as archivo:
+                contenido = archivo.read()
+        except (OSError, ValueError):
+            self._contar("faltantes")
+            response.status_code = 404
+            response._content = b""
+            response.raw = io.BytesIO(b"")
+            return response
+        self._contar("reproducidas")
+        response.status_code = meta["status"]
+        response.headers = requests.structures.CaseInsensitiveDict(meta["headers"])
+        etag = response.headers.get("ETag")
+        if etag and (headers or {}).get("If-None-Match") == etag:
+            response.status_code, contenido = 304, b""
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = contenido
+        response._content_consumed = True
+        response.raw = io.BytesIO(contenido)
+        return response
+
+    def guardar_html(self, url, html):
+        ruta, _ = self._ruta("GET", url)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta + ".html", "w", encoding="utf-8") as archivo:
+            archivo.write(html or "")
+        self._contar("grabadas")
+
+    def html(self, url):
+        """HTML grabado desde el navegador para `url`, o None."""
+        ruta, _ = self._ruta("GET", url)
+        try:
+            with open(ruta + ".html", encoding="utf-8") as archivo:
+                contenido = archivo.read()
+        except OSError:
+            self._contar("faltantes")
             return None
-        if clave not in genero_cache:
-            normalizado = nombre_genero.strip().title()
-            genero_cache[clave], _ = Genero.objects.get_or_create(nombre=normalizado)
-        return genero_cache[clave]
+        self._contar("reproducidas")
+        return contenido
 
-    creados, actualizados, errores = 0, 0, 0
 
-    _set_refresh_status(
-        "scraping",
-        state="running",
-        category=None,
-        category_label=None,
-        page=0,
-        url=None,
-    )
+_fixtures_http = None
+
+
+@contextmanager
+def fixtures_http(directorio, modo="reproducir"):
+    """
+    Dentro del bloque todas las peticiones HTTP se graban en `directorio`
+    (modo "grabar") o se sirven desde ahí sin salir a la red ("reproducir").
+    """
+    global _fixtures_http
+    anterior = _fixtures_http
+    _fixtures_http = FixturesHttp(directorio, modo)
+    try:
+        yield _fixtures_http
+    finally:
+        _fixtures_http = anterior
+
+
+def _http_request(method, url, timeout=12, **kwargs):
+    """Toda petición HTTP saliente pasa por acá: sesión keep-alive del host y su limitador."""
+    fixtures = _fixtures_http
+    if fixtures and fixtures.reproduciendo:
+        return fixtures.responder(method, url, **kwargs)
+    host = urllib.parse.urlsplit(url).hostname or ""
+    _limitador_hosts.adquirir(host)
+    inicio = time.monotonic()
+    try:
+        response = _obtener_sesion_http(host).request(method, url, timeout=timeout, **kwargs)
+    except requests.RequestException as e:
+        _limitador_hosts.registrar(host, error=type(e).__name__)
+        raise
+    _limitador_hosts.registrar(host, status=response.status_code, duracion=time.monotonic() - inicio)
+    if fixtures:
+        fixtures.guardar(method, url, response, params=kwargs.get("params"))
+    return response
+
+
+def _http_get(url, timeout=12, **kwargs):
+    return _http_request("GET", url, timeout=timeout, **kwargs)
+
+
+HTTP_REINTENTOS = max(0, int(getattr(settings, "SCRAPE_HTTP_RETRIES", 2)))
+HTTP_ESPERA_BASE = float(getattr(settings, "SCRAPE_HTTP_BACKOFF", 1.0))
+CIRCUITO_FALLOS = max(1, int(getattr(settings, "SCRAPE_CIRCUIT_FAILURES", 5)))
+CIRCUITO_ENFRIAMIENTO = int(getattr(settings, "SCRAPE_CIRCUIT_COOLDOWN", 300))
+
+# Clasificación del resultado de cada descarga
+FETCH_OK = "ok"
+FETCH_NO_MODIFICADO = "no_modificado"
+# 404 y demás 4xx: no se reintenta (fin del catálogo, slug inexistente...)
+FETCH_NO_ENCONTRADO = "no_encontrado"
+# Timeout, error de conexión, 429 o 5xx que siguieron fallando tras los reintentos
+FETCH_TRANSITORIO = "transitorio"
+# El host acumuló demasiados fallos seguidos: no se le hizo la petición
+FETCH_CIRCUITO_ABIERTO = "circuito_abierto"
+
+
+class CircuitoAbierto(Exception):
+    pass
+
+
+class CircuitosHosts:
+    """
+    Circuit breaker por host. Tras `umbral` fallos transitorios seguidos el
+    circuito se abre y las peticiones a ese host se cortan sin salir a la red
+    durante `enfriamiento` segundos; después se deja pasar una sola petición de
+    prueba, que lo cierra si responde bien o lo vuelve a abrir si falla.
+    Cada corrida de scraping parte con los circuitos cerrados (reiniciar()).
+    """
+
+    def __init__(self, clave, umbral=CIRCUITO_FALLOS, enfriamiento=CIRCUITO_ENFRIAMIENTO):
+        self.clave = clave
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _estado(self, clave):
+        estado = self._hosts.get(clave)
+        if estado is None:
+            estado = {"fallos": 0, "abierto_en": None, "probando": False, "resultados": defaultdict(int)}
+            self._hosts[clave] = estado
+        return estado
+
+    def abierto(self, url_o_host):
+        """True si el circuito está abierto y todavía en enfriamiento (no consume la prueba)."""
+        with self._lock:
+            estado = self._estado(self.clave(url_o_host))
+            return estado["abierto_en"] is not None and time.monotonic() - estado["abierto_en"] < self.enfriamiento
+
+    def permite(self, url_o_host):
+        """Indica si se puede hacer una petición al host ahora mismo."""
+        with self._lock:
+            estado = self._estado(self.clave(url_o_host))
+            if estado["abierto_en"] is None:
+                return True
+            if time.monotonic() - estado["abierto_en"] < self.enfriamiento or estado["probando"]:
+                return False
+            estado["probando"] = True
+            return True
+
+    def registrar(self, url_o_host, resultado):
+        clave = self.clave(url_o_host)
+        with self._lock:
+            estado = self._estado(clave)
+            estado["resultados"][resultado] += 1
+            if resultado == FETCH_CIRCUITO_ABIERTO:
+                return
+            if resultado != FETCH_TRANSITORIO:
+                if estado["abierto_en"] is not None:
+                    print(f"[HTTP] {clave} volvió a responder, se cierra el circuito.")
+                estado.update(fallos=0, abierto_en=None, probando=False)
+                return
+            estado["fallos"] += 1
+            if estado["probando"] or (estado["abierto_en"] is None and estado["fallos"] >= self.umbral):
+                estado.update(abierto_en=time.monotonic(), probando=False)
+                print(f"[HTTP] {clave} falló {estado['fallos']} veces seguidas, se abre el circuito por {self.enfriamiento}s.")
+
+    def reiniciar(self):
+        with self._lock:
+            self._hosts.clear()
+
+    def metricas(self):
+        with self._lock:
+            ahora = time.monotonic()
+            datos = {}
+            for clave, estado in self._hosts.items():
+                if estado["abierto_en"] is None:
+                    circuito = "closed"
+                elif ahora - estado["abierto_en"] < self.enfriamiento:
+                    circuito = "open"
+                else:
+                    circuito = "half_open"
+                datos[clave] = {"circuit": circuito, "failures": estado["fallos"], "outcomes": dict(estado["resultados"])}
+            return datos
+
+
+_circuitos_hosts = CircuitosHosts(_limitador_hosts.clave)
+
+
+def _metricas_hosts():
+    """Tasa del limitador y estado del circuito de cada host, para monitoreo."""
+    datos = _limitador_hosts.metricas()
+    for clave, circuito in _circuitos_hosts.metricas().items():
+        datos.setdefault(clave, {}).update(circuito)
+    return datos
+
+
+def _espera_reintento(intento, espera_base=HTTP_ESPERA_BASE, minimo=0.0):
+    """Backoff exponencial con jitter completo para el reintento número `intento` (desde 1)."""
+    return max(minimo, random.uniform(0, espera_base * (2 ** intento)))
+
+
+@dataclass
+class ResultadoFetch:
+    url: str
+    resultado: str
+    response: object = None
+    error: str = None
+    intentos: int = 0
+
+    @property
+    def ok(self):
+        return self.resultado == FETCH_OK
+
+
+def _fetch(url, method="GET", timeout=12, reintentos=None, espera_base=HTTP_ESPERA_BASE, **kwargs):
+    """
+    Petición con reintentos y circuit breaker. Reintenta timeouts, errores de
+    conexión, 429 y 5xx con backoff exponencial (respetando Retry-After); el resto
+    de las respuestas se devuelve de inmediato. Nunca lanza por errores de red:
+    el resultado queda clasificado en ResultadoFetch.resultado.
+    """
+    reintentos = HTTP_REINTENTOS if reintentos is None else reintentos
+    error, retry_after = None, 0.0
+    for intento in range(reintentos + 1):
+        if not _circuitos_hosts.permite(url):
+            _circuitos_hosts.registrar(url, FETCH_CIRCUITO_ABIERTO)
+            return ResultadoFetch(url, FETCH_CIRCUITO_ABIERTO, error=error or "circuito abierto", intentos=intento)
+        if intento:
+            time.sleep(_espera_reintento(intento, espera_base, minimo=retry_after))
+        try:
+            response = _http_request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            error, retry_after = str(e), 0.0
+            _circuitos_hosts.registrar(url, FETCH_TRANSITORIO)
+            continue
+        status = response.status_code
+        if status == 429 or status >= 500:
+            error = f"HTTP {status}"
+            try:
+                retry_after = min(60.0, float(response.headers.get("Retry-After") or 0))
+            except ValueError:
+                retry_after = 0.0
+            response.close()
+            _circuitos_hosts.registrar(url, FETCH_TRANSITORIO)
+            continue
+        if status == 304:
+            resultado = FETCH_NO_MODIFICADO
+        elif status >= 400:
+            resultado = FETCH_NO_ENCONTRADO
+        else:
+            resultado = FETCH_OK
+        _circuitos_hosts.registrar(url, resultado)
+        return ResultadoFetch(url, resultado, response=response, intentos=intento + 1)
+    print(f"[HTTP] {url} sigue fallando tras {reintentos + 1} intentos: {error}")
+    return ResultadoFetch(url, FETCH_TRANSITORIO, error=error, intentos=reintentos + 1)
+
+
+def _visitar_con_navegador(driver, url, reintentos=None, espera_base=HTTP_ESPERA_BASE):
+    """
+    driver.get(url) pasando por el limitador y el circuit breaker del host, con
+    reintentos y backoff. El navegador no expone el status HTTP, así que solo las
+    excepciones cuentan como fallo. Lanza CircuitoAbierto si el host está cortado
+    y la última excepción si se agotan los reintentos.
+    """
+    reintentos = HTTP_REINTENTOS if reintentos is None else reintentos
+    ultimo_error = None
+    for intento in range(reintentos + 1):
+        if not _circuitos_hosts.permite(url):
+            _circuitos_hosts.registrar(url, FETCH_CIRCUITO_ABIERTO)
+            raise CircuitoAbierto(f"{_circuitos_hosts.clave(url)} tiene el circuito abierto")
+        if intento:
+            time.sleep(_espera_reintento(intento, espera_base))
+        _limitador_hosts.adquirir(url)
+        inicio = time.monotonic()
+        try:
+            driver.get(url)
+        except Exception as e:
+            ultimo_error = e
+            _limitador_hosts.registrar(url, error=type(e).__name__)
+            _circuitos_hosts.registrar(url, FETCH_TRANSITORIO)
+            print(f"[Botasaurus] Falló la carga de {url} (intento {intento + 1}): {e}")
+            continue
+        _limitador_hosts.registrar(url, status=200, duracion=time.monotonic() - inicio)
+        _circuitos_hosts.registrar(url, FETCH_OK)
+        if _fixtures_http and not _fixtures_http.reproduciendo:
+            _fixtures_http.guardar_html(url, getattr(driver, "page_html", None))
+        return
+    raise ultimo_error
+
+
+class _CachePaginas:
+    """
+    Cache en disco de páginas de catálogo, por URL: guarda ETag, Last-Modified,
+    hash del cuerpo y hash de las cards. No guarda el HTML. Una entrada vence cuando
+    pasan `ttl` segundos desde que la página se procesó completa por última vez, y si
+    el directorio supera `max_bytes` se borran las menos usadas.
+    """
+
+    def __init__(self, directorio, ttl, max_bytes):
+        self.directorio = directorio
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes_totales = None
+
+    def _ruta(self, url):
+        return os.path.join(self.directorio, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def obtener(self, url):
+        if not self.directorio or self.ttl <= 0:
+            return None
+        ruta = self._ruta(url)
+        try:
+            with open(ruta, encoding="utf-8") as fh:
+                entrada = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entrada.get("url") != url or time.time() - entrada.get("procesado_en", 0) > self.ttl:
+            return None
+        try:
+            os.utime(ruta)  # marca de uso para el desalojo LRU
+        except OSError:
+            pass
+        return entrada
+
+    def guardar(self, url, **datos):
+        if not self.directorio or self.ttl <= 0:
+            return
+        entrada = {"url": url, "procesado_en": time.time(), **{k: v for k, v in datos.items() if v is not None}}
+        contenido = json.dumps(entrada).encode("utf-8")
+        ruta = self._ruta(url)
+        with self._lock:
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                previo = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+                tmp = f"{ruta}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as fh:
+                    fh.write(contenido)
+                os.replace(tmp, ruta)
+            except OSError as e:
+                print(f"[Cache] No se pudo guardar la entrada de {url}: {e}")
+                return
+            if self._bytes_totales is None:
+                self._bytes_totales = self._medir()
+            else:
+                self._bytes_totales += len(contenido) - previo
+            if self._bytes_totales > self.max_bytes:
+                self._desalojar()
+
+    def _medir(self):
+        total = 0
+        for entry in os.scandir(self.directorio):
+            if entry.is_file() and entry.name.endswith(".json"):
+                total += entry.stat().st_size
+        return total
+
+    def _desalojar(self):
+        entradas = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.directorio)
+            if entry.is_file() and entry.name.endswith(".json")
+        )
+        objetivo = int(self.max_bytes * 0.9)
+        total = sum(size for _, size, _ in entradas)
+        for _, size, path in entradas:
+            if total <= objetivo:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._bytes_totales = total
+
+
+_cache_paginas = _CachePaginas(
+    getattr(settings, "SCRAPE_PAGE_CACHE_DIR", None),
+    ttl=int(getattr(settings, "SCRAPE_PAGE_CACHE_TTL", 0)),
+    max_bytes=int(getattr(settings, "SCRAPE_PAGE_CACHE_MAX_BYTES", 0)),
+)
+
+
+def _procesos_parseo_por_defecto():
+    """Con "auto" se parsea en procesos solo si sobran núcleos para las tiendas y la BD."""
+    try:
+        nucleos = len(os.sched_getaffinity(0))
+    except AttributeError:
+        nucleos = os.cpu_count() or 1
+    return min(nucleos - 1, 4) if nucleos >= 3 else 0
+
+
+_parseo_procesos_config = str(getattr(settings, "SCRAPE_PARSE_PROCESSES", "auto") or "auto").strip().lower()
+PARSEO_PROCESOS = _procesos_parseo_por_defecto() if _parseo_procesos_config == "auto" else max(0, int(_parseo_procesos_config))
+
+
+def _parsear_contenido(parsear_cards, contenido, encoding=None):
+    """Decodifica el contenido crudo de una página y devuelve sus cards (TarjetaProducto)."""
+    return parsear_cards(contenido.decode(encoding or "utf-8", errors="replace")) or []
+
+
+class ParseoEnProcesos:
+    """
+    Parseo de páginas de catálogo en un pool de procesos. BeautifulSoup y las
+    regex de precios son CPU puro: en los hilos de descarga quedan limitados por
+    el GIL, así que más hilos no parsean más rápido. Entra el contenido crudo de
+    la página y salen TarjetaProducto; los procesos se crean al primer uso y se
+    reutilizan entre páginas, tiendas y corridas.
+
+    `parsear_cards` tiene que poder serializarse (función de módulo o partial).
+    Con 0 procesos, o si el pool se rompe, se parsea en el hilo que llama.
+    """
+
+    def __init__(self, procesos=PARSEO_PROCESOS):
+        self.procesos = procesos
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _obtener_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn y no fork: el proceso padre tiene hilos (tiendas, imágenes) y conexiones abiertas
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=django.setup,
+                )
+            return self._executor
+
+    def parsear(self, parsear_cards, contenido, encoding=None):
+        if self.procesos:
+            try:
+                return self._obtener_executor().submit(_parsear_contenido, parsear_cards, contenido, encoding).result()
+            except BrokenProcessPool as e:
+                print(f"[PARSEO] El pool de procesos dejó de responder ({e}), se parsea en el hilo.")
+                self.cerrar()
+                self.procesos = 0
+        return _parsear_contenido(parsear_cards, contenido, encoding)
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_parseo_paginas = ParseoEnProcesos()
+atexit.register(_parseo_paginas.cerrar)
+
+
+def _hash_cards(cards):
+    digest = hashlib.sha256()
+    for card in cards:
+        digest.update(str(card).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class PaginaCatalogo:
+    page: int
+    url: str
+    cards: list = field(default_factory=list)
+    error: str = None
+    # True si la página no cambió desde la última corrida (304 o mismo hash): no hay que procesarla
+    sin_cambios: bool = False
+    cache: dict = None
+    # Nombres de los productos disponibles en la página (también para páginas sin cambios)
+    vistos: list = field(default_factory=list)
+    # Clasificación de la descarga fallida (FETCH_TRANSITORIO, FETCH_CIRCUITO_ABIERTO o,
+    # para un status inesperado, la que dio _fetch)
+    resultado: str = None
+
+
+def _iterar_paginas_catalogo(url_template, parsear_cards, etiqueta, timeout=12, en_vuelo=None, primera_pagina=1):
+    """
+    Recorre las páginas de una categoría manteniendo hasta `en_vuelo` descargas
+    simultáneas y entrega PaginaCatalogo en orden. Se detiene en la primera página
+    sin cards o que responde 404; si una descarga falla o responde cualquier otro
+    status entrega la página con `error` y termina. `parsear_cards` recibe el HTML y devuelve las cards;
+    corre en _parseo_paginas (un proceso aparte si hay núcleos de sobra).
+
+    Usa GET condicional contra _cache_paginas: si la página responde 304 o su contenido
+    coincide con el de la corrida anterior se entrega con `sin_cambios=True` y sin parsear.
+    La entrada nueva de cache viaja en `pagina.cache` y no se guarda acá: la confirma
+    quien consume la página recién después de persistirla (ver scrapear_tienda), así
+    una página cancelada o fallida se vuelve a procesar en la corrida siguiente. El
+    cache guarda además los nombres disponibles de la página (`vistos`), que se
+    entregan aunque no haya cambios.
+    Las descargas pasan por _fetch: un 429, 5xx o timeout que persiste tras los
+    reintentos, o un host con el circuito abierto, se entrega como `error` (con su
+    `resultado`), para no confundirlo con el fin del catálogo.
+    """
+    en_vuelo = max(1, en_vuelo or PAGINAS_EN_VUELO)
+
+    def _descargar(page):
+        url = url_template.format(page=page)
+        previa = _cache_paginas.obtener(url)
+        if previa and (not previa.get("cards") or "vistos" not in previa):
+            previa = None
+        headers = {}
+        if previa:
+            if previa.get("etag"):
+                headers["If-None-Match"] = previa["etag"]
+            if previa.get("last_modified"):
+                headers["If-Modified-Since"] = previa["last_modified"]
+        resultado = _fetch(url, timeout=timeout, headers=headers)
+        if resultado.resultado in (FETCH_TRANSITORIO, FETCH_CIRCUITO_ABIERTO):
+            return PaginaCatalogo(page=page, url=url, error=resultado.error, resultado=resultado.resultado), None
+        response = resultado.response
+        if response.status_code == 304 and previa:
+            return PaginaCatalogo(page=page, url=url, sin_cambios=True, vistos=previa["vistos"]), 200
+        if response.status_code == 404:
+            return PaginaCatalogo(page=page, url=url), response.status_code
+        if response.status_code != 200:
+            # Un 403, 401 u otro status inesperado no prueba que el catálogo terminó
+            return PaginaCatalogo(
+                page=page, url=url, error=f"HTTP {response.status_code}", resultado=resultado.resultado
+            ), response.status_code
+
+        cache = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_hash": hashlib.sha256(response.content).hexdigest(),
+        }
+        if previa and previa.get("body_hash") == cache["body_hash"]:
+            return PaginaCatalogo(page=page, url=url, sin_cambios=True, vistos=previa["vistos"]), 200
+
+        cards = _parseo_paginas.parsear(parsear_cards, response.content, response.encoding or response.apparent_encoding)
+        vistos = [card.nombre for card in cards if not card.agotado]
+        cache["cards"] = len(cards)
+        cache["cards_hash"] = _hash_cards(cards)
+        cache["vistos"] = vistos
+        if cards and previa and previa.get("cards_hash") == cache["cards_hash"]:
+            # Cambió algo fuera de las cards (tokens, scripts): se actualizan los validadores
+            # pero se conserva la fecha del último procesamiento completo.
+            cache["procesado_en"] = previa.get("procesado_en")
+            return PaginaCatalogo(page=page, url=url, cards=cards, sin_cambios=True, cache=cache, vistos=vistos), 200
+        return PaginaCatalogo(page=page, url=url, cards=cards, cache=cache, vistos=vistos), 200
+
+    executor = ThreadPoolExecutor(max_workers=en_vuelo, thread_name_prefix="fetch")
+    pendientes = {}
+    siguiente = primera_pagina
+    try:
+        for _ in range(en_vuelo):
+            pendientes[siguiente] = executor.submit(_descargar, siguiente)
+            siguiente += 1
+
+        page = primera_pagina
+        while page in pendientes:
+            pagina, status = pendientes.pop(page).result()
+            if pagina.error:
+                print(f"[{etiqueta}] Error descargando {pagina.url}: {pagina.error}")
+                yield pagina
+                return
+            if status != 200:
+                print(f"[{etiqueta}] Status {status} en {pagina.url}, se detiene.")
+                return
+            if not pagina.cards and not pagina.sin_cambios:
+                print(f"[{etiqueta}] Sin cards en página {page}, se detiene.")
+                return
+            if not _is_refresh_cancelled("scraping"):
+                pendientes[siguiente] = executor.submit(_descargar, siguiente)
+                siguiente += 1
+            yield pagina
+            page += 1
+    finally:
+        for futuro in pendientes.values():
+            futuro.cancel()
+        executor.shutdown(wait=False)
+
+
+@dataclass
+class RegistroPerfume:
+    nombre: str
+    precio: int
+    precio_ant: int = None
+    marca: object = None
+    url_producto: str = None
+    img_url: str = None
+    generos: set = field(default_factory=set)
+
+
+class _ContadorConsultas:
+    """
+    Cuenta las consultas SQL ejecutadas por la conexión del hilo actual
+    mientras el bloque `with` está activo. Las etapas del pipeline creadas
+    dentro del bloque también suman sus consultas (ver en_hilo()).
+    """
+
+    _activo = threading.local()
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+        self._wrapper = None
+        self._anterior = None
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.total += 1
+        return execute(sql, params, many, context)
+
+    @classmethod
+    def actual(cls):
+        """Contador activo en el hilo actual, o None."""
+        return getattr(cls._activo, "contador", None)
+
+    def en_hilo(self):
+        """Context manager para contar también las consultas de otro hilo."""
+        return connection.execute_wrapper(self)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        self._anterior = _ContadorConsultas.actual()
+        _ContadorConsultas._activo.contador = self
+        return self
+
+    def __exit__(self, *exc):
+        _ContadorConsultas._activo.contador = self._anterior
+        return self._wrapper.__exit__(*exc)
+
+
+_generos_cache = {}
+_generos_cache_lock = threading.Lock()
+
+
+def _obtener_genero(nombre_genero):
+    clave = (nombre_genero or "").strip().lower()
+    if not clave:
+        return None
+    with _generos_cache_lock:
+        genero = _generos_cache.get(clave)
+    if genero is None:
+        genero, _ = Genero.objects.get_or_create(nombre=nombre_genero.strip().title())
+        with _generos_cache_lock:
+            _generos_cache[clave] = genero
+    return genero
+
+
+def _agregar_generos(generos_por_perfume):
+    """Asocia en un solo insert los géneros ({perfume_id: nombres}) que los perfumes aún no tengan."""
+    PerfumeGenero = Perfume.generos.through
+    filas = []
+    for perfume_id, nombres in generos_por_perfume.items():
+        for nombre_genero in nombres:
+            genero = _obtener_genero(nombre_genero)
+            if genero:
+                filas.append(PerfumeGenero(perfume_id=perfume_id, genero_id=genero.id))
+    if filas:
+        PerfumeGenero.objects.bulk_create(filas, ignore_conflicts=True)
+
+
+def _persistir_lote_perfumes(tienda, registros):
+    """
+    Guarda un lote de perfumes de una tienda en una sola transacción: una consulta
+    para los existentes, bulk_create de los nuevos, bulk_update solo de los campos
+    que cambiaron, un insert masivo en la tabla intermedia de géneros y otro en
+    HistorialPrecio para los perfumes nuevos o con cambio de precio. Un perfume
+    que estaba marcado como no disponible se reactiva.
+    Devuelve (creados, actualizados, perfumes_por_nombre).
+    """
+    por_nombre = {}
+    for registro in registros:
+        previo = por_nombre.get(registro.nombre)
+        if previo:
+            registro.generos |= previo.generos
+        por_nombre[registro.nombre] = registro
+    if not por_nombre:
+        return 0, 0, {}
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        existentes = {}
+        for perfume in Perfume.objects.filter(tienda=tienda, nombre__in=list(por_nombre)).order_by("id"):
+            existentes.setdefault(perfume.nombre, perfume)
+
+        nuevos = []
+        cambiados_por_campos = defaultdict(list)
+        cambio_precio = []
+        for nombre, registro in por_nombre.items():
+            perfume = existentes.get(nombre)
+            if perfume is None:
+                nuevos.append(
+                    Perfume(
+                        nombre=nombre,
+                        tienda=tienda,
+                        marca=registro.marca,
+                        precio=registro.precio,
+                        precio_ant=registro.precio_ant,
+                        url_producto=registro.url_producto,
+                        ultima_vez_visto=ahora,
+                    )
+                )
+                continue
+
+            campos = []
+            if not perfume.disponible:
+                # Vuelve a stock: se reactiva con su imagen y datos de Fragrantica intactos
+                perfume.disponible = True
+                perfume.ultima_vez_visto = ahora
+                campos += ["disponible", "ultima_vez_visto"]
+            if perfume.precio != registro.precio:
+                perfume.precio = registro.precio
+                campos.append("precio")
+            if perfume.precio_ant != registro.precio_ant:
+                perfume.precio_ant = registro.precio_ant
+                campos.append("precio_ant")
+            marca_id = registro.marca.id if registro.marca else None
+            if perfume.marca_id != marca_id:
+                perfume.marca = registro.marca
+                campos.append("marca")
+            if registro.url_producto and perfume.url_producto != registro.url_producto:
+                perfume.url_producto = registro.url_producto
+                campos.append("url_producto")
+            if campos:
+                cambiados_por_campos[tuple(campos)].append(perfume)
+            if "precio" in campos:
+                cambio_precio.append(perfume)
+
+        if nuevos:
+            Perfume.objects.bulk_create(nuevos)
+        for campos, perfumes in cambiados_por_campos.items():
+            Perfume.objects.bulk_update(perfumes, list(campos))
+
+        perfumes_por_nombre = {nombre: existentes[nombre] for nombre in por_nombre if nombre in existentes}
+        perfumes_por_nombre.update({perfume.nombre: perfume for perfume in nuevos})
+
+        _agregar_generos({perfumes_por_nombre[nombre].id: registro.generos for nombre, registro in por_nombre.items()})
+
+        HistorialPrecio.objects.bulk_create(
+            HistorialPrecio(
+                perfume_id=perfume.id,
+                tienda=tienda,
+                precio=perfume.precio,
+                precio_ant=perfume.precio_ant,
+                observado_en=ahora,
+            )
+            for perfume in nuevos + cambio_precio
+        )
+
+    actualizados = sum(len(perfumes) for perfumes in cambiados_por_campos.values())
+    return len(nuevos), actualizados, perfumes_por_nombre
+
+
+def compactar_historial_precios(dias=90, tam_lote=5000):
+    """
+    Reduce las observaciones de precio con más de `dias` días a un punto por
+    perfume y día (se conserva la última de cada día). Es idempotente.
+    Devuelve la cantidad de filas eliminadas.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    filas = (
+        HistorialPrecio.objects.filter(observado_en__lt=limite)
+        .order_by("perfume_id", "observado_en", "id")
+        .values_list("id", "perfume_id", "observado_en")
+    )
+    eliminadas = 0
+    por_borrar = []
+    anterior_id, anterior_clave = None, None
+    for fila_id, perfume_id, observado_en in filas.iterator(chunk_size=tam_lote):
+        clave = (perfume_id, timezone.localtime(observado_en).date())
+        if clave == anterior_clave:
+            por_borrar.append(anterior_id)
+            if len(por_borrar) >= tam_lote:
+                eliminadas += HistorialPrecio.objects.filter(id__in=por_borrar).delete()[0]
+                por_borrar = []
+        anterior_id, anterior_clave = fila_id, clave
+    if por_borrar:
+        eliminadas += HistorialPrecio.objects.filter(id__in=por_borrar).delete()[0]
+    return eliminadas
+
+
+def _barrer_no_vistos(tienda, vistos, etiqueta, retirar=True, tam_lote=500):
+    """
+    Fin de corrida: actualiza ultima_vez_visto (y reactiva) los perfumes de la tienda
+    que aparecieron como disponibles y, si `retirar`, marca como no disponibles los
+    que no aparecieron (agotados o retirados del catálogo). No se borra nada: un
+    perfume que vuelve a stock conserva imagen, URL de Fragrantica, acordes y notas.
+    Devuelve la cantidad marcada como no disponible.
+    """
+    vistos_ids, retirados_ids = [], []
+    for perfume_id, nombre, disponible in Perfume.objects.filter(tienda=tienda, es_custom=False).values_list(
+        "id", "nombre", "disponible"
+    ):
+        if nombre in vistos:
+            vistos_ids.append(perfume_id)
+        elif retirar and disponible:
+            retirados_ids.append(perfume_id)
+
+    ahora = timezone.now()
+    for inicio in range(0, len(vistos_ids), tam_lote):
+        Perfume.objects.filter(id__in=vistos_ids[inicio:inicio + tam_lote]).update(disponible=True, ultima_vez_visto=ahora)
+    for inicio in range(0, len(retirados_ids), tam_lote):
+        Perfume.objects.filter(id__in=retirados_ids[inicio:inicio + tam_lote]).update(disponible=False)
+    if retirados_ids:
+        print(f"[{etiqueta}] {len(retirados_ids)} productos no vistos en la corrida (agotados o retirados), se marcan como no disponibles.")
+    return len(retirados_ids)
+
+
+IMAGENES_WORKERS = max(1, int(getattr(settings, "SCRAPE_IMAGE_WORKERS", 4)))
+IMAGENES_MAX_EN_COLA = max(1, int(getattr(settings, "SCRAPE_IMAGE_QUEUE_SIZE", 1000)))
+IMAGENES_REINTENTOS = max(0, int(getattr(settings, "SCRAPE_IMAGE_RETRIES", 2)))
+
+
+class ColaImagenes:
+    """
+    Descarga de imágenes en segundo plano para los scrapers.
+
+    Los scrapers solo encolan (perfume, url) y siguen con la página siguiente;
+    un grupo acotado de hilos descarga cada URL una sola vez (con reintentos y
+    backoff) en streaming a un archivo temporal, la guarda por contenido con
+    _almacenar_imagen y la asigna a perfume.imagen de todos los perfumes que
+    la pidieron. Una URL ya conocida no se vuelve a descargar. Las métricas quedan en REFRESH_STATUS["scraping"]["images"].
+    """
+
+    def __init__(self, workers=IMAGENES_WORKERS, max_en_cola=IMAGENES_MAX_EN_COLA, reintentos=IMAGENES_REINTENTOS, espera_base=1.0):
+        self.workers = workers
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self._cola = queue.Queue(maxsize=max_en_cola)
+        self._lock = threading.Lock()
+        self._hilos = []
+        self.iniciar_corrida()
+
+    def iniciar_corrida(self):
+        """Limpia la deduplicación y las métricas al comenzar una corrida de scraping."""
+        with self._lock:
+            # url -> [(perfume_id, nombre, etiqueta)] a la espera de esa descarga
+            self._esperando = {}
+            # url -> archivo ya guardado en esta corrida, para no volver a bajarlo
+            self._guardadas = {}
+            self._fallidas = set()
+            self._metricas = {
+                "pending": 0,
+                "downloaded": 0,
+                "reused": 0,
+                "deduplicated": 0,
+                "bytes": 0,
+                "retries": 0,
+                "failed": 0,
+            }
+        self._publicar()
+
+    def metricas(self):
+        with self._lock:
+            return dict(self._metricas)
+
+    def _publicar(self):
+        _set_refresh_status("scraping", images=self.metricas())
+
+    def _arrancar_workers(self):
+        with self._lock:
+            self._hilos = [hilo for hilo in self._hilos if hilo.is_alive()]
+            for _ in range(self.workers - len(self._hilos)):
+                hilo = threading.Thread(target=self._trabajar, name="scrape-img", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+
+    def encolar(self, perfume_id, nombre, url, etiqueta):
+        if not url:
+            return
+        with self._lock:
+            if url in self._fallidas:
+                return
+            if url in self._esperando:
+                self._esperando[url].append((perfume_id, nombre, etiqueta))
+                self._metricas["deduplicated"] += 1
+                return
+            if url in self._guardadas:
+                self._metricas["deduplicated"] += 1
+            self._esperando[url] = [(perfume_id, nombre, etiqueta)]
+            self._metricas["pending"] += 1
+        self._arrancar_workers()
+        # Si la cola está llena, el scraper espera: es la contrapresión del grupo de descargas
+        self._cola.put(url)
+        self._publicar()
+
+    def esperar(self, intervalo=0.5):
+        """
+        Espera a que se vacíe la cola. Si se cancela el scraping, descarta
+        las descargas que aún no empezaron.
+        """
+        while self.metricas()["pending"] > 0:
+            if _is_refresh_cancelled("scraping"):
+                self.descartar_pendientes()
+            time.sleep(intervalo)
+
+    def descartar_pendientes(self):
+        descartadas = 0
+        while True:
+            try:
+                url = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._esperando.pop(url, None)
+                self._metricas["pending"] -= 1
+            self._cola.task_done()
+            descartadas += 1
+        if descartadas:
+            print(f"[IMG] Se descartan {descartadas} descargas pendientes.")
+            self._publicar()
+
+    def _trabajar(self):
+        while True:
+            url = self._cola.get()
+            try:
+                self._procesar(url)
+            except Exception as e:
+                print(f"[IMG] Error procesando {url}: {e}")
+            finally:
+                with self._lock:
+                    self._metricas["pending"] -= 1
+                self._cola.task_done()
+                self._publicar()
+                if self._cola.empty():
+                    connection.close()
+
+    def _procesar(self, url):
+        with self._lock:
+            archivo = self._guardadas.get(url)
+        if archivo is None:
+            archivo = _imagen_por_url(url)
+        if archivo is not None:
+            with self._lock:
+                self._metricas["reused"] += 1
+        else:
+            imagen = self._descargar(url)
+            if imagen:
+                with imagen:
+                    archivo = _almacenar_imagen(imagen, url_origen=url)
+                with self._lock:
+                    self._metricas["downloaded"] += 1
+                    self._metricas["bytes"] += imagen.tamano
+
+        while True:
+            with self._lock:
+                destinos = self._esperando.get(url) or []
+                if not destinos:
+                    # Quien encole la misma URL desde ahora reutiliza el archivo guardado
+                    self._esperando.pop(url, None)
+                    if archivo:
+                        self._guardadas[url] = archivo
+                    else:
+                        self._fallidas.add(url)
+                    break
+                self._esperando[url] = []
+                if not archivo:
+                    self._metricas["failed"] += len(destinos)
+            if not archivo:
+                continue
+            for perfume_id, nombre, etiqueta in destinos:
+                try:
+                    self._asignar(perfume_id, archivo)
+                except Exception as e:
+                    print(f"[{etiqueta} IMG] Error al guardar imagen de '{nombre}' ({url}): {e}")
+                    with self._lock:
+                        self._metricas["failed"] += 1
+
+    def _descargar(self, url):
+        for intento in range(self.reintentos + 1):
+            if _circuitos_hosts.abierto(url):
+                print(f"[IMG] {_circuitos_hosts.clave(url)} tiene el circuito abierto, se omite {url}")
+                return None
+            if intento:
+                with self._lock:
+                    self._metricas["retries"] += 1
+                time.sleep(_espera_reintento(intento, self.espera_base))
+            imagen = _descargar_imagen(url)
+            if imagen:
+                return imagen
+        return None
+
+    @staticmethod
+    def _asignar(perfume_id, archivo):
+        perfume = Perfume.objects.filter(pk=perfume_id).only("id", "imagen").first()
+        if not perfume or perfume.imagen:
+            return
+        perfume.imagen = archivo
+        perfume.save(update_fields=["imagen"])
+
+
+_cola_imagenes = None
+_cola_imagenes_lock = threading.Lock()
+
+
+def _obtener_cola_imagenes():
+    global _cola_imagenes
+    with _cola_imagenes_lock:
+        if _cola_imagenes is None:
+            _cola_imagenes = ColaImagenes()
+        return _cola_imagenes
+
+
+def _persistir_pagina(tienda, registros, etiqueta):
+    """
+    Persiste los registros de una página y encola la descarga de sus imágenes faltantes.
+    Devuelve (creados, actualizados, perfumes_por_nombre).
+    """
+    creados, actualizados, perfumes_por_nombre = _persistir_lote_perfumes(tienda, registros)
+    cola_imagenes = _obtener_cola_imagenes()
+    for registro in registros:
+        perfume = perfumes_por_nombre.get(registro.nombre)
+        if perfume and registro.img_url and not perfume.imagen:
+            cola_imagenes.encolar(perfume.id, registro.nombre, registro.img_url, etiqueta)
+    if creados or actualizados:
+        print(f"[{etiqueta}] Lote guardado: {creados} creados, {actualizados} actualizados")
+    return creados, actualizados, perfumes_por_nombre
+
+
+@dataclass
+class TarjetaProducto:
+    """Datos de una card de catálogo, ya extraídos del HTML o del JSON de la tienda."""
+    nombre: str
+    marca: str = None
+    precio: int = 0
+    precio_ant: int = None
+    agotado: bool = False
+    url_producto: str = None
+    imagenes: list = field(default_factory=list)
+
+    @property
+    def img_url(self):
+        return self.imagenes[0] if self.imagenes else None
+
+
+def _normalizar_url_imagen(raw, base_url):
+    """
+    Limpia un candidato de imagen (src, data-src, srcset o plantilla con {size})
+    y lo devuelve como URL absoluta, o None si no sirve.
+    """
+    if not raw:
+        return None
+    raw = raw.strip()
+    if raw.lower() == "noscript":
+        return None
+    if not raw or raw.startswith("data:"):
+        return None
+    if " " in raw:
+        # srcset: "url 1x, url 2x" -> primer candidato válido
+        for parte in raw.split(","):
+            partes = (parte or "").strip().split()
+            url_limpia = _normalizar_url_imagen(partes[0], base_url) if partes else None
+            if url_limpia:
+                return url_limpia
+        return None
+    if "{size}" in raw:
+        raw = raw.replace("{size}", "800x800")
+    if raw.startswith("//"):
+        raw = "https:" + raw
+    elif raw.startswith("/"):
+        raw = urllib.parse.urljoin(base_url, raw)
+    return raw
+
+
+def _sopa_cards(html, tag, clase):
+    """
+    Parsea con lxml solo los contenedores de cards (tag + clase) y sus hijos;
+    el resto de la página (menús, scripts, footer) ni siquiera se construye.
+    """
+    return BeautifulSoup(html, "lxml", parse_only=SoupStrainer(tag, class_=clase))
+
+
+def _parsear_cards_silk(html):
+    base_url = "https://silkperfumes.cl"
+    tarjetas = []
+    for card in _sopa_cards(html, "li", "js-pagination-result").select("li.js-pagination-result"):
+        title_el = card.select_one(".card__title")
+        if not title_el:
+            print("[SILK] Card sin título, se omite")
+            continue
+        nombre = title_el.get_text(strip=True)
+
+        # Detección real de agotado (Shopify): etiqueta, botón deshabilitado o precio "Agotado" visible
+        agotado_label = card.select_one(".product-label--sold-out")
+
+        add_btn = card.select_one("button[name='add']")
+        agotado_por_boton = add_btn is not None and add_btn.has_attr("disabled")
+
+        agotado_por_precio = False
+        price_no_variant = card.select_one(".price__no-variant strong")
+        if price_no_variant and "agotad" in price_no_variant.get_text(strip=True).lower():
+            current = price_no_variant
+            hidden_found = False
+            while current:
+                if current.has_attr("hidden") or "display:none" in (current.get("style", "") or "").lower():
+                    hidden_found = True
+                    break
+                current = current.find_parent()
+            if not hidden_found:
+                agotado_por_precio = True
+
+        marca_el = card.select_one(".card__vendor")
+
+        price_el = card.select_one(".price__current")
+        precio = _parsear_clp(price_el.get_text(strip=True)) if price_el else 0
+        price_bef = card.select_one(".price__was")
+        precio_ant = _parsear_clp(price_bef.get_text(strip=True)) if price_bef else precio
+
+        url_prod = None
+        a = card.select_one("a.js-prod-link")
+        if a and a.get("href"):
+            href = a["href"]
+            url_prod = href if href.startswith("http") else base_url + href
+
+        imagenes = []
+        img = card.select_one("img.card__main-image") or card.select_one("img")
+        if img:
+            for raw in (img.get("data-src"), img.get("data-srcset"), img.get("src")):
+                url_limpia = _normalizar_url_imagen(raw, base_url)
+                if url_limpia:
+                    imagenes.append(url_limpia)
+
+        tarjetas.append(
+            TarjetaProducto(
+                nombre=nombre,
+                marca=marca_el.get_text(strip=True) if marca_el else None,
+                precio=precio,
+                precio_ant=precio_ant,
+                agotado=bool(agotado_label or agotado_por_boton or agotado_por_precio),
+                url_producto=url_prod,
+                imagenes=imagenes,
+            )
+        )
+    return tarjetas
+
+
+def _parsear_cards_yauras(html):
+    base_url = "https://yauras.cl"
+    tarjetas = []
+    for card in _sopa_cards(html, "div", "productitem__container").select("div.productitem__container"):
+        link_el = card.select_one("h2.productitem--title a") or card.select_one("a.productitem--image-link")
+        if not link_el:
+            continue
+        nombre = link_el.get_text(strip=True)
+        if not nombre:
+            continue
+
+        soldout_badge = card.select_one(".productitem__badge--soldout")
+        stock_el = card.select_one(".product-stock-level__badge-text")
+        atc_button = card.select_one(".productitem--action-atc")
+        agotado = False
+        if soldout_badge and "agot" in soldout_badge.get_text(strip=True).lower():
+            agotado = True
+        elif stock_el and "agot" in stock_el.get_text(strip=True).lower():
+            agotado = True
+        elif atc_button and "agot" in (atc_button.text or "").strip().lower():
+            agotado = True
+
+        marca_el = card.select_one(".productitem--vendor a")
+
+        price_el = card.select_one(".price__current .money") or card.select_one(".price__current--min")
+        precio = _parsear_clp(price_el.get_text(strip=True)) if price_el else 0
+        compare_el = (
+            card.select_one(".price__compare-at .money")
+            or card.select_one(".price__compare-at--single")
+            or card.select_one("[data-price-compare]")
+        )
+        precio_ant = _parsear_clp(compare_el.get_text(strip=True)) if compare_el else precio
+
+        href = link_el.get("href")
+        url_prod = urllib.parse.urljoin(base_url, href) if href else None
+
+        # Preferimos la imagen principal si está disponible
+        imagenes = []
+        primary_img = card.select_one("img.productitem--image-primary")
+        imgs = [primary_img] if primary_img else []
+        imgs.extend(img for img in card.select("img") if img is not primary_img)
+        for img in imgs:
+            for atributo in ("data-src", "data-rimg", "data-srcset", "data-rimg-template", "src"):
+                url_limpia = _normalizar_url_imagen(img.get(atributo), base_url)
+                if url_limpia:
+                    imagenes.append(url_limpia)
+                    break
+
+        tarjetas.append(
+            TarjetaProducto(
+                nombre=nombre,
+                marca=marca_el.get_text(strip=True) if marca_el else None,
+                precio=precio,
+                precio_ant=precio_ant,
+                agotado=agotado,
+                url_producto=url_prod,
+                imagenes=imagenes,
+            )
+        )
+    return tarjetas
+
+
+def _parsear_cards_joy(html):
+    base_url = "https://joyperfumes.cl"
+    tarjetas = []
+    for card in _sopa_cards(html, "article", "product-block").select("article.product-block"):
+        title_el = card.select_one(".product-block__name")
+        if not title_el:
+            continue
+        nombre = title_el.get_text(strip=True)
+        if not nombre:
+            continue
+
+        status_label = card.select_one(".product-block__label--status")
+        agotado = bool(status_label and "no disponible" in status_label.get_text(strip=True).lower())
+
+        href = title_el.get("href")
+        marca_el = card.select_one(".product-block__brand")
+
+        price_el = card.select_one(".product-block__price")
+        precio = _parsear_clp(price_el.get_text(strip=True)) if price_el else 0
+
+        candidatos = []
+        img_el = card.select_one("img.product-block__image")
+        if img_el:
+            candidatos.append(img_el.get("src"))
+        candidatos.extend(src_el.get("srcset") for src_el in card.select("picture source"))
+        imagenes = []
+        for raw in candidatos:
+            url_limpia = _normalizar_url_imagen(raw, base_url)
+            if url_limpia:
+                imagenes.append(url_limpia)
+
+        tarjetas.append(
+            TarjetaProducto(
+                nombre=nombre,
+                marca=marca_el.get_text(strip=True) if marca_el else None,
+                precio=precio,
+                precio_ant=precio,
+                agotado=agotado,
+                url_producto=urllib.parse.urljoin(base_url, href) if href else None,
+                imagenes=imagenes,
+            )
+        )
+    return tarjetas
+
+
+def _parsear_precio_shopify(valor):
+    """Los precios de products.json vienen como texto decimal ("34990.00")."""
+    if valor in (None, ""):
+        return 0
+    try:
+        return int(Decimal(str(valor)))
+    except (InvalidOperation, ValueError):
+        return _parsear_clp(str(valor))
+
+
+def _parsear_productos_shopify(texto, base_url):
+    """
+    Convierte una página de /collections/<handle>/products.json en TarjetaProducto.
+    Devuelve una lista vacía si la respuesta no es el JSON esperado.
+    """
+    try:
+        data = json.loads(texto)
+    except ValueError:
+        return []
+    if not isinstance(data, dict):
+        return []
+
+    tarjetas = []
+    for producto in data.get("products") or []:
+        nombre = (producto.get("title") or "").strip()
+        if not nombre:
+            continue
+        variantes = producto.get("variants") or []
+        disponibles = [v for v in variantes if v.get("available", True)]
+        variante = min(
+            disponibles or variantes,
+            key=lambda v: _parsear_precio_shopify(v.get("price")),
+            default=None,
+        )
+        precio = _parsear_precio_shopify(variante.get("price")) if variante else 0
+        compare = _parsear_precio_shopify(variante.get("compare_at_price")) if variante else 0
+
+        imagenes = []
+        for imagen in producto.get("images") or []:
+            url_limpia = _normalizar_url_imagen(imagen.get("src"), base_url)
+            if url_limpia:
+                imagenes.append(url_limpia)
+
+        handle = producto.get("handle")
+        tarjetas.append(
+            TarjetaProducto(
+                nombre=nombre,
+                marca=(producto.get("vendor") or "").strip() or None,
+                precio=precio,
+                precio_ant=compare if compare > precio else precio,
+                agotado=bool(variantes) and not disponibles,
+                url_producto=f"{base_url}/products/{handle}" if handle else None,
+                imagenes=imagenes,
+            )
+        )
+    return tarjetas
+
+
+def _parsear_producto_shopify(texto, base_url):
+    """
+    Convierte la respuesta de /products/<handle>.js (Ajax API de Shopify) en una
+    lista con su TarjetaProducto. A diferencia de products.json trae `available`
+    en cada variante y los precios vienen en centavos.
+    """
+    try:
+        producto = json.loads(texto)
+    except ValueError:
+        return []
+    if not isinstance(producto, dict):
+        return []
+    nombre = (producto.get("title") or "").strip()
+    if not nombre:
+        return []
+
+    variantes = producto.get("variants") or []
+    disponibles = [v for v in variantes if v.get("available", True)]
+    variante = min(disponibles or variantes, key=lambda v: v.get("price") or 0, default=None)
+    precio = int(variante.get("price") or 0) // 100 if variante else 0
+    compare = int(variante.get("compare_at_price") or 0) // 100 if variante else 0
+    imagenes = []
+    for src in producto.get("images") or []:
+        url_limpia = _normalizar_url_imagen(src, base_url)
+        if url_limpia:
+            imagenes.append(url_limpia)
+
+    handle = producto.get("handle")
+    return [
+        TarjetaProducto(
+            nombre=nombre,
+            marca=(producto.get("vendor") or "").strip() or None,
+            precio=precio,
+            precio_ant=compare if compare > precio else precio,
+            agotado=bool(variantes) and not disponibles,
+            url_producto=f"{base_url}/products/{handle}" if handle else None,
+            imagenes=imagenes,
+        )
+    ]
+
+
+SHOPIFY_JSON_ACTIVO = bool(getattr(settings, "SCRAPE_SHOPIFY_JSON", True))
+
+
+def _iterar_paginas_shopify(base_url, coleccion, url_template_html, parsear_html, etiqueta, timeout=12, reanudar=None):
+    """
+    Recorre una colección de Shopify usando products.json (hasta 250 productos por
+    página) y, si el JSON no está disponible, cae a las páginas HTML.
+    Las cards entregadas son siempre TarjetaProducto.
+    `reanudar` es el checkpoint de la categoría ({"pagina": n, "url": ...}): se sigue
+    desde la página n + 1 en el mismo formato (JSON o HTML) en que se había quedado.
+    """
+    reanudar = reanudar or {}
+    desde = reanudar.get("pagina", 0) + 1
+    usar_json = SHOPIFY_JSON_ACTIVO
+    if reanudar.get("url") and "products.json" not in reanudar["url"]:
+        usar_json = False
+
+    if usar_json:
+        url_template_json = f"{base_url}/collections/{coleccion}/products.json?limit=250&page={{page}}"
+        paginas = _iterar_paginas_catalogo(
+            url_template_json,
+            partial(_parsear_productos_shopify, base_url=base_url),
+            etiqueta=f"{etiqueta} json",
+            timeout=timeout,
+            primera_pagina=desde,
+        )
+        entregadas = 0
+        try:
+            for pagina in paginas:
+                if pagina.error and not entregadas and desde == 1:
+                    break
+                entregadas += 1
+                yield pagina
+        finally:
+            paginas.close()
+        # Al reanudar, una página vacía significa que la colección ya estaba completa
+        if entregadas or desde > 1:
+            return
+        print(f"[{etiqueta}] products.json no disponible, se usa el HTML de la colección.")
+        desde = 1
+
+    paginas = _iterar_paginas_catalogo(url_template_html, parsear_html, etiqueta=etiqueta, timeout=timeout, primera_pagina=desde)
+    try:
+        yield from paginas
+    finally:
+        paginas.close()
+
+
+# RECARGA INCREMENTAL POR SITEMAP (tiendas Shopify)
+SITEMAP_COMPLETO_HORAS = float(getattr(settings, "SCRAPE_FULL_CRAWL_HOURS", 24))
+
+
+class EstadoSitemaps:
+    """
+    Estado local de los sitemaps de cada tienda, un JSON por tienda: cuándo fue el
+    último recorrido completo de las colecciones y, por cada sitemap de productos,
+    sus validadores (ETag / Last-Modified) y el lastmod ya procesado de cada URL.
+    Con eso la recarga incremental solo pide los productos modificados, y un
+    sitemap que no cambió responde 304.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def cargar(self, clave):
+        if not self.directorio:
+            return {}
+        try:
+            with open(self._ruta(clave), encoding="utf-8") as fh:
+                estado = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        return estado if isinstance(estado, dict) else {}
+
+    def guardar(self, clave, estado):
+        if not self.directorio:
+            return
+        ruta = self._ruta(clave)
+        with self._lock:
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                tmp = f"{ruta}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as fh:
+                    json.dump(estado, fh)
+                os.replace(tmp, ruta)
+            except OSError as e:
+                print(f"[SITEMAP] No se pudo guardar el estado de {clave}: {e}")
+
+    def olvidar(self, clave=None):
+        """Borra el estado de una tienda (o de todas): su próxima corrida recorre las colecciones completas."""
+        if not self.directorio or not os.path.isdir(self.directorio):
+            return
+        nombres = [f"{clave}.json"] if clave else [n for n in os.listdir(self.directorio) if n.endswith(".json")]
+        for nombre in nombres:
+            try:
+                os.remove(os.path.join(self.directorio, nombre))
+            except OSError:
+                pass
+
+
+_estado_sitemaps = EstadoSitemaps(getattr(settings, "SCRAPE_SITEMAP_STATE_DIR", None))
+
+
+def _parsear_sitemap(contenido):
+    """[(loc, lastmod)] de un sitemap (<url>) o de un índice de sitemaps (<sitemap>)."""
+    entradas = []
+    for nodo in BeautifulSoup(contenido, "xml").find_all(["url", "sitemap"]):
+        # recursive=False: los <url> de Shopify traen también <image:loc>
+        loc = nodo.find("loc", recursive=False)
+        if loc is None or not loc.get_text(strip=True):
+            continue
+        lastmod = nodo.find("lastmod", recursive=False)
+        entradas.append((loc.get_text(strip=True), lastmod.get_text(strip=True) if lastmod else None))
+    return entradas
+
+
+@dataclass
+class SitemapProductos:
+    # loc del sitemap de productos -> {"etag", "last_modified", "urls": {url del producto: lastmod}}
+    sitemaps: dict
+
+    @property
+    def urls(self):
+        return {url: lastmod for datos in self.sitemaps.values() for url, lastmod in datos["urls"].items()}
+
+
+def _leer_sitemap_productos(base_url, estado, timeout=12):
+    """
+    Lee /sitemap.xml de una tienda Shopify y sus sitemap_products_*.xml. Los sitemaps
+    de productos se piden con GET condicional contra `estado`: uno que responde 304
+    conserva las URLs ya procesadas. Devuelve SitemapProductos, o None si la tienda
+    no publica sitemap o no respondió.
+    """
+    resultado = _fetch(f"{base_url}/sitemap.xml", timeout=timeout)
+    if not resultado.ok or resultado.response.status_code != 200:
+        return None
+    locs = [loc for loc, _ in _parsear_sitemap(resultado.response.content) if "sitemap_products" in loc]
+    if not locs:
+        return None
+
+    previos = estado.get("sitemaps") or {}
+    sitemaps = {}
+    for loc in locs:
+        previo = previos.get(loc) or {}
+        headers = {}
+        if previo.get("etag"):
+            headers["If-None-Match"] = previo["etag"]
+        if previo.get("last_modified"):
+            headers["If-Modified-Since"] = previo["last_modified"]
+        resultado = _fetch(loc, timeout=timeout, headers=headers)
+        if resultado.resultado == FETCH_NO_MODIFICADO and "urls" in previo:
+            sitemaps[loc] = previo
+            continue
+        if not resultado.ok:
+            print(f"[SITEMAP] No se pudo leer {loc}: {resultado.error or resultado.response.status_code}")
+            return None
+        response = resultado.response
+        sitemaps[loc] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "urls": {url: lastmod for url, lastmod in _parsear_sitemap(response.content) if "/products/" in url},
+        }
+    return SitemapProductos(sitemaps)
 
-    for nombre_categoria, url_template in categorias:
-        if _is_refresh_cancelled("scraping"):
-            print(f"[SILK] Cancelado antes de categoría {nombre_categoria}")
-            break
-        categoria_es_unisex = "unisex" in url_template.lower()
-        page = 1
 
-        while True:
-            if _is_refresh_cancelled("scraping"):
-                print(f"[SILK] Cancelado en categoría {nombre_categoria} página {page}")
-                return {
-                    "creados": creados,
-                    "actualizados": actualizados,
-                    "errores": errores,
-                }
-            url = url_template.format(page=page)
-            _set_refresh_status(
-                "scraping",
-                state="running",
-                category=nombre_categoria,
-                category_label=categoria_labels.get(
-                    nombre_categoria,
-                    nombre_categoria.replace("-", " ").title(),
-                ),
-                page=page,
-                url=url,
+# FUNCIONES SCRAPPING
+@dataclass
+class CategoriaTienda:
+    # Clave estable de la categoría: identifica su checkpoint al reanudar
+    clave: str
+    etiqueta: str
+    # URL del listado HTML con {page}
+    url_template: str
+    generos: set = field(default_factory=set)
+    # Handle de la colección Shopify: si está, se lee primero products.json
+    coleccion: str = None
+
+
+@dataclass
+class AdaptadorTienda:
+    """
+    Definición declarativa de una tienda para scrapear_tienda(): de dónde sacar las
+    páginas, cómo parsear sus cards y las reglas propias de la tienda. Agregar una
+    tienda nueva es agregar un AdaptadorTienda a TIENDAS.
+    """
+
+    # Clave en REFRESH_STATUS y en los checkpoints ("silk")
+    clave: str
+    # Valor de Perfume.tienda y prefijo de los logs ("SILK")
+    tienda: str
+    nombre: str
+    base_url: str
+    categorias: list
+    parsear_cards: object
+    timeout: int = 12
+    # Palabra en el nombre del producto -> género que se agrega
+    generos_por_nombre: dict = field(default_factory=dict)
+    # Marcas de la card que en realidad son el nombre de la tienda (normalizadas)
+    marcas_ignoradas: set = field(default_factory=set)
+    # Si la card no trae una marca útil, inferirla desde el nombre del producto
+    inferir_marca: bool = False
+    omitir_sin_precio: bool = False
+    # El listado ordena los agotados al final: una página sin stock cierra la categoría
+    cortar_en_pagina_agotada: bool = False
+    # Tienda Shopify con sitemap.xml y lastmod por producto: admite la recarga incremental
+    sitemap: bool = False
+
+    def paginas(self, categoria, checkpoint):
+        etiqueta = f"{self.tienda} {categoria.etiqueta}"
+        if categoria.coleccion:
+            return _iterar_paginas_shopify(
+                self.base_url,
+                categoria.coleccion,
+                categoria.url_template,
+                self.parsear_cards,
+                etiqueta=etiqueta,
+                timeout=self.timeout,
+                reanudar=checkpoint,
             )
+        return _iterar_paginas_catalogo(
+            categoria.url_template,
+            self.parsear_cards,
+            etiqueta=etiqueta,
+            timeout=self.timeout,
+            primera_pagina=checkpoint.get("pagina", 0) + 1,
+        )
 
-            print(f"Scrapeando {nombre_categoria} página {page}: {url}")
+    def generos(self, categoria, tarjeta):
+        # Sin categoría (recarga por sitemap) solo aplican las reglas por nombre
+        generos = set(categoria.generos) if categoria else set()
+        nombre = tarjeta.nombre.lower()
+        for palabra, genero in self.generos_por_nombre.items():
+            if palabra in nombre:
+                generos.add(genero)
+        return generos
+
+    def marca(self, tarjeta, resolutor_marcas):
+        marca_raw = tarjeta.marca or ""
+        marca_obj = None
+        if marca_raw and _normalizar_texto(marca_raw) not in self.marcas_ignoradas:
+            marca_obj = resolutor_marcas.resolver(marca_raw)
+        if not marca_obj and self.inferir_marca:
+            marca_obj = resolutor_marcas.inferir(tarjeta.nombre)
+        return marca_obj or resolutor_marcas.resolver(marca_raw or "Desconocida")
+
+
+def _categorias_shopify(base_url, colecciones, sufijo=""):
+    return [
+        CategoriaTienda(
+            clave=coleccion,
+            etiqueta=etiqueta,
+            url_template=f"{base_url}/collections/{coleccion}?page={{page}}{sufijo}",
+            generos=generos,
+            coleccion=coleccion,
+        )
+        for coleccion, etiqueta, generos in colecciones
+    ]
 
-            response = requests.get(url, timeout=15)
-            if response.status_code != 200:
-                print(f"[SILK] Status {response.status_code} en {url}, deteniendo categoría {nombre_categoria}")
-                break
 
-            soup = BeautifulSoup(response.text, "html.parser")
-            cards = soup.select("li.js-pagination-result")
+TIENDAS = [
+    AdaptadorTienda(
+        clave="silk",
+        tienda="SILK",
+        nombre="Silk Perfumes",
+        base_url="https://silkperfumes.cl",
+        categorias=_categorias_shopify(
+            "https://silkperfumes.cl",
+            [
+                ("perfumes-de-hombre", "Perfumes de hombre", {"Hombre"}),
+                ("perfumes-arabes-hombre", "Perfumes árabes hombre", {"Hombre"}),
+                ("perfumes-unisex", "Perfumes unisex", {"Unisex"}),
+                ("perfumes-arabes-unisex", "Perfumes árabes unisex", {"Unisex"}),
+            ],
+        ),
+        parsear_cards=_parsear_cards_silk,
+        timeout=15,
+        omitir_sin_precio=True,
+        sitemap=True,
+    ),
+    AdaptadorTienda(
+        clave="yauras",
+        tienda="YAURAS",
+        nombre="Yauras Perfumes",
+        base_url="https://yauras.cl",
+        categorias=_categorias_shopify(
+            "https://yauras.cl",
+            [
+                ("perfumes-hombre", "Perfumes hombre", {"Hombre"}),
+                ("unisex", "Perfumes unisex", {"Unisex"}),
+                ("perfumes-arabes", "Perfumes árabes", {"Hombre"}),
+            ],
+            sufijo="&grid_list=grid-view",
+        ),
+        parsear_cards=_parsear_cards_yauras,
+        generos_por_nombre={"unisex": "Unisex"},
+        cortar_en_pagina_agotada=True,
+        sitemap=True,
+    ),
+    AdaptadorTienda(
+        clave="joy",
+        tienda="JOY",
+        nombre="Joy Perfumes",
+        base_url="https://joyperfumes.cl",
+        categorias=[
+            CategoriaTienda(
+                clave=f"/{ruta}",
+                etiqueta=etiqueta,
+                url_template=f"https://joyperfumes.cl/{ruta}?page={{page}}",
+                generos=generos,
+            )
+            for ruta, etiqueta, generos in [
+                ("arabehombre-arabe", "Hombre árabe", {"Hombre", "Arabe"}),
+                ("arabeunisex-arabe", "Unisex árabe", {"Unisex", "Arabe"}),
+                ("hombre", "Hombre", {"Hombre"}),
+                ("unisex", "Unisex", {"Unisex"}),
+            ]
+        ],
+        parsear_cards=_parsear_cards_joy,
+        generos_por_nombre={"hombre": "Hombre", "mujer": "Mujer", "unisex": "Unisex"},
+        marcas_ignoradas={"joyperfumes"},
+        inferir_marca=True,
+    ),
+]
+TIENDAS_POR_CLAVE = {adaptador.clave: adaptador for adaptador in TIENDAS}
 
-            if not cards:
-                print(f"[SILK] Sin cards en página {page} para {nombre_categoria}, se detiene.")
-                break
 
-            for card in cards:
-                title_el = card.select_one(".card__title")
-                if not title_el:
-                    print("[SILK] Card sin título, se omite")
-                    continue
+def _clave_url_producto(url):
+    """
+    (host, ruta) con que se compara la URL de un producto entre cards, sitemaps y BD.
+    Shopify también enlaza el producto dentro de la colección (/collections/x/products/y).
+    """
+    partes = urllib.parse.urlsplit(url)
+    host = (partes.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    ruta = partes.path.rstrip("/").lower()
+    if "/products/" in ruta:
+        ruta = ruta[ruta.index("/products/"):]
+    return host, ruta
 
-                nombre = title_el.get_text(strip=True)
-                _set_refresh_status("scraping", item=nombre)
-
-                # ===============================
-                # DETECCIÓN REAL DE AGOTADO (SHOPIFY)
-                # ===============================
-                agotado_label = card.select_one(".product-label--sold-out")
-
-                add_btn = card.select_one("button[name='add']")
-                agotado_por_boton = add_btn is not None and add_btn.has_attr("disabled")
-
-                agotado_por_precio = False
-                price_no_variant = card.select_one(".price__no-variant strong")
-                if price_no_variant and "agotad" in price_no_variant.get_text(strip=True).lower():
-                    current = price_no_variant
-                    hidden_found = False
-                    while current:
-                        if current.has_attr("hidden") or "display:none" in (current.get("style", "") or "").lower():
-                            hidden_found = True
-                            break
-                        current = current.find_parent()
-                    if not hidden_found:
-                        agotado_por_precio = True
-
-                if agotado_label or agotado_por_boton or agotado_por_precio:
-                    print(f"[SILK] Agotado detectado, se elimina: {nombre}")
-                    perfumes_agotados = Perfume.objects.filter(
-                        nombre=nombre,
-                        tienda="SILK"
-                    )
-                    for perfume in perfumes_agotados:
-                        if perfume.imagen and default_storage.exists(perfume.imagen.name):
-                            default_storage.delete(perfume.imagen.name)
-                        perfume.delete()
-                    continue
 
-                # ===============================
-                # GÉNEROS
-                # ===============================
-                generos_a_asignar = set(generos_por_categoria.get(nombre_categoria, set()))
-
-                if "hombre" in nombre_categoria.lower():
-                    generos_a_asignar.add("Hombre")
-
-                if categoria_es_unisex:
-                    generos_a_asignar.add("Unisex")
-
-                # ===============================
-                # MARCA
-                # ===============================
-                marca_el = card.select_one(".card__vendor")
-                marca_nombre = marca_el.get_text(strip=True) if marca_el else "Desconocida"
-                marca_obj = _obtener_marca_normalizada(marca_nombre)
-
-                # ===============================
-                # PRECIOS
-                # ===============================
-                price_el = card.select_one(".price__current")
-                precio = _parsear_clp(price_el.get_text(strip=True)) if price_el else 0
-
-                price_bef = card.select_one(".price__was")
-                precio_ant = (
-                    _parsear_clp(price_bef.get_text(strip=True))
-                    if price_bef else precio
-                )
+class IdentidadesCorrida:
+    """
+    Productos ya vistos en la corrida de una tienda, por URL del producto (o por
+    nombre si la card no trae URL). El mismo producto suele aparecer en varias
+    colecciones (Yauras perfumes-hombre y perfumes-arabes, Joy /hombre y
+    /arabehombre-arabe): solo la primera aparición pasa por marca, upsert e
+    imagen; las siguientes únicamente le suman los géneros de su categoría.
+    """
 
-                if precio <= 0:
-                    print(f"[SILK] Precio inválido o faltante para {nombre}, se omite.")
+    def __init__(self):
+        self._lock = threading.Lock()
+        # clave -> nombre con que se guardó la primera aparición
+        self._nombres = {}
+        # nombre -> (perfume_id, géneros ya asociados en la corrida)
+        self._guardados = {}
+        self.duplicados = 0
+
+    @staticmethod
+    def clave(tarjeta):
+        if not tarjeta.url_producto:
+            return ("nombre", tarjeta.nombre)
+        return ("url",) + _clave_url_producto(tarjeta.url_producto)
+
+    def reservar(self, tarjeta):
+        """None si es la primera aparición del producto; si no, el nombre con que se guarda."""
+        clave = self.clave(tarjeta)
+        with self._lock:
+            nombre = self._nombres.get(clave)
+            if nombre is None:
+                self._nombres[clave] = tarjeta.nombre
+                return None
+            self.duplicados += 1
+            return nombre
+
+    def guardado(self, nombre, perfume_id, generos):
+        with self._lock:
+            self._guardados[nombre] = (perfume_id, set(generos))
+
+    def fusionar_generos(self, fusiones):
+        """
+        Recibe [(nombre, géneros)] de apariciones repetidas y devuelve
+        {perfume_id: géneros que faltan asociar}.
+        """
+        faltantes = defaultdict(set)
+        with self._lock:
+            for nombre, generos in fusiones:
+                guardado = self._guardados.get(nombre)
+                if guardado is None:
                     continue
+                perfume_id, asociados = guardado
+                nuevos = set(generos) - asociados
+                if nuevos:
+                    asociados |= nuevos
+                    faltantes[perfume_id] |= nuevos
+        return dict(faltantes)
 
-                # ===============================
-                # URL PRODUCTO
-                # ===============================
-                url_prod = None
-                a = card.select_one("a.js-prod-link")
-                if a and a.get("href"):
-                    href = a["href"]
-                    url_prod = href if href.startswith("http") else "https://silkperfumes.cl" + href
-
-                # ===============================
-                # IMAGEN
-                # ===============================
-                img_url = None
-                img = card.select_one("img.card__main-image") or card.select_one("img")
-
-                if img:
-                    candidates = [
-                        img.get("data-src"),
-                        img.get("data-srcset", "").split(",")[0].split()[0]
-                        if img.get("data-srcset") else None,
-                        img.get("src"),
-                    ]
-
-                    for u in candidates:
-                        if not u or u.startswith("data:"):
-                            continue
-                        if u.startswith("//"):
-                            u = "https:" + u
-                        elif u.startswith("/"):
-                            u = "https://silkperfumes.cl" + u
-                        img_url = u
-                        break
 
-                # ===============================
-                # GUARDAR / ACTUALIZAR
-                # ===============================
-                perfume, creado = Perfume.objects.get_or_create(
-                    nombre=nombre,
-                    tienda="SILK",
-                    defaults={
-                        "marca": marca_obj,
-                        "precio": precio,
-                        "precio_ant": precio_ant,
-                        "url_producto": url_prod,
-                    },
-                )
+PIPELINE_TAM_COLA = max(1, int(getattr(settings, "SCRAPE_PIPELINE_QUEUE_SIZE", 4)))
+_FIN_PIPELINE = object()
 
-                if creado:
-                    creados += 1
-                    print(f"[SILK] Creado: {nombre}")
-                else:
-                    if (
-                        perfume.precio != precio
-                        or perfume.marca != marca_obj
-                        or perfume.precio_ant != precio_ant
-                    ):
-                        perfume.precio = precio
-                        perfume.marca = marca_obj
-                        perfume.precio_ant = precio_ant
-                        perfume.save()
-                        actualizados += 1
-                        print(f"[SILK] Actualizado: {nombre}")
-
-                # ===============================
-                # IMAGEN
-                # ===============================
-                if img_url and not perfume.imagen:
-                    try:
-                        img_bytes = _descargar_imagen(img_url)
-                        if img_bytes:
-                            perfume.imagen.save(f"{nombre}.jpg", ContentFile(img_bytes), save=False)
-                        else:
-                            errores += 1
-                    except Exception:
-                        errores += 1
 
-                if url_prod and not perfume.url_producto:
-                    perfume.url_producto = url_prod
+class EtapaPipeline:
+    """
+    Etapa del pipeline de scraping de una tienda: un hilo que toma elementos de
+    una cola acotada, los procesa con `funcion` y pasa el resultado (si no es
+    None) a la etapa siguiente. Con la cola llena, quien alimenta la etapa se
+    bloquea (contrapresión), así una etapa lenta frena a las anteriores en vez de
+    acumular páginas en memoria.
+
+    Si la corrida se cancela o la función falla, la etapa sigue consumiendo su
+    cola sin procesar hasta recibir el fin, para que nadie quede bloqueado; el
+    error se vuelve a lanzar en esperar().
+    """
 
-                perfume.save()
+    def __init__(self, nombre, funcion, siguiente=None, tam_cola=PIPELINE_TAM_COLA, cancelado=None):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.siguiente = siguiente
+        self.cancelado = cancelado or (lambda: False)
+        self.error = None
+        self._cola = queue.Queue(maxsize=tam_cola)
+        self._procesados = 0
+        self._segundos = 0.0
+        self._bloqueado = 0.0
+        self._cola_max = 0
+        # Las consultas de la etapa cuentan para la tienda que la creó
+        self._contador = _ContadorConsultas.actual()
+        self._hilo = threading.Thread(target=self._trabajar, name=f"pipeline-{nombre}", daemon=True)
+        self._hilo.start()
+
+    def poner(self, elemento):
+        inicio = time.perf_counter()
+        self._cola.put(elemento)
+        self._bloqueado += time.perf_counter() - inicio
+        self._cola_max = max(self._cola_max, self._cola.qsize())
+
+    def terminar(self):
+        """Avisa que no vienen más elementos; la etapa se lo pasa a la siguiente al vaciarse."""
+        self.poner(_FIN_PIPELINE)
+
+    def esperar(self):
+        self._hilo.join()
+        if self.error is not None:
+            raise self.error
+
+    def metricas(self):
+        segundos = round(self._segundos, 2)
+        return {
+            "items": self._procesados,
+            "seconds": segundos,
+            "per_second": round(self._procesados / segundos, 1) if segundos else None,
+            "queue": self._cola.qsize(),
+            "queue_max": self._cola_max,
+            "blocked_seconds": round(self._bloqueado, 2),
+        }
 
-                # ===============================
-                # GÉNEROS M2M
-                # ===============================
-                genero_objs = [
-                    obtener_genero(g) for g in generos_a_asignar
-                ]
-                genero_objs = [g for g in genero_objs if g]
-                if genero_objs:
-                    perfume.generos.add(*genero_objs)
+    def _trabajar(self):
+        try:
+            with self._contador.en_hilo() if self._contador else nullcontext():
+                while True:
+                    elemento = self._cola.get()
+                    if elemento is _FIN_PIPELINE:
+                        break
+                    if self.error is not None or self.cancelado():
+                        continue
+                    inicio = time.perf_counter()
+                    try:
+                        resultado = self.funcion(elemento)
+                    except Exception as e:
+                        print(f"[PIPELINE] Error en etapa {self.nombre}: {e}")
+                        self.error = e
+                        continue
+                    finally:
+                        self._segundos += time.perf_counter() - inicio
+                    self._procesados += 1
+                    if resultado is not None and self.siguiente is not None:
+                        self.siguiente.poner(resultado)
+        finally:
+            if self.siguiente is not None:
+                self.siguiente.terminar()
+            connection.close()
+
+
+def scrapear_tienda(adaptador, resolutor_marcas=None):
+    """
+    Motor común de scraping, organizado como un pipeline por tienda:
+
+      descarga + parseo  ->  normalización  ->  persistencia
+      (hilo actual, con     (marca, géneros,    (lote por página
+       páginas en vuelo)     precio)             y checkpoint)
+
+    Las etapas corren en paralelo unidas por colas acotadas, así mientras se
+    guarda una página ya se está normalizando la siguiente y descargando las
+    posteriores. Los checkpoints y el cache de páginas se registran recién cuando
+    la página quedó guardada, y si la corrida fue completa se barren los productos que ya no
+    aparecen. Un producto que está en varias categorías se guarda una sola vez
+    (IdentidadesCorrida). Las métricas por etapa quedan en el estado de la tienda ("pipeline").
+    """
+    clave, tienda = adaptador.clave, adaptador.tienda
+    cancelado = lambda: _is_refresh_cancelled("scraping")
+    creados, actualizados, errores, productos = 0, 0, 0, 0
+    paginas_procesadas, paginas_omitidas, retirados = 0, 0, 0
+    # Mark-and-sweep: nombres vistos como disponibles; el resto se marca como no disponible al final
+    vistos, completo = set(), True
+    resolutor_marcas = resolutor_marcas or ResolutorMarcas()
+    # Cada producto se guarda una sola vez por corrida aunque esté en varias categorías
+    identidades = IdentidadesCorrida()
+    espera_descarga = 0.0
+
+    def normalizar(elemento):
+        tipo, categoria, pagina = elemento
+        if tipo != "pagina" or pagina.sin_cambios:
+            return elemento + (None,)
+        registros, fusiones = [], []
+        for tarjeta in pagina.cards:
+            # Los agotados no se marcan como vistos: quedan como no disponibles en el barrido final
+            if tarjeta.agotado:
+                continue
+            nombre = tarjeta.nombre
+            _set_store_status(clave, item=nombre)
 
-            page += 1
+            if adaptador.omitir_sin_precio and tarjeta.precio <= 0:
+                print(f"[{tienda}] Precio inválido o faltante para {nombre}, se omite.")
+                continue
+            nombre_guardado = identidades.reservar(tarjeta)
+            if nombre_guardado is not None:
+                # Ya pasó por otra categoría en esta corrida: solo aporta sus géneros
+                fusiones.append((nombre_guardado, adaptador.generos(categoria, tarjeta)))
+                continue
+            if not tarjeta.img_url:
+                print(f"[{tienda} IMG] No se encontró imagen para '{nombre}' (cat {categoria.clave}, url {pagina.url})")
 
-    _set_refresh_status(
-        "scraping",
-        state="done",
-        category=None,
-        category_label=None,
-        page=0,
-        url=None,
-    )
+            registros.append(
+                RegistroPerfume(
+                    nombre=nombre,
+                    precio=tarjeta.precio,
+                    precio_ant=tarjeta.precio_ant,
+                    marca=adaptador.marca(tarjeta, resolutor_marcas),
+                    url_producto=tarjeta.url_producto,
+                    img_url=tarjeta.img_url,
+                    generos=adaptador.generos(categoria, tarjeta),
+                )
+            )
+        return tipo, categoria, pagina, (registros, fusiones)
 
-    return {
-        "creados": creados,
-        "actualizados": actualizados,
-        "errores": errores,
-    }
+    def persistir(elemento):
+        nonlocal creados, actualizados, productos
+        tipo, categoria, pagina, normalizados = elemento
+        if tipo == "fin_categoria":
+            _registrar_checkpoint(clave, categoria.clave, completa=True)
+            return None
+        if normalizados is not None:
+            registros, fusiones = normalizados
+            if registros:
+                lote_creados, lote_actualizados, perfumes_por_nombre = _persistir_pagina(tienda, registros, tienda)
+                creados += lote_creados
+                actualizados += lote_actualizados
+                productos += len(registros)
+                for registro in registros:
+                    perfume = perfumes_por_nombre.get(registro.nombre)
+                    if perfume is not None:
+                        identidades.guardado(registro.nombre, perfume.id, registro.generos)
+            generos_faltantes = identidades.fusionar_generos(fusiones)
+            if generos_faltantes:
+                _agregar_generos(generos_faltantes)
+            if fusiones:
+                _set_store_status(clave, duplicates=identidades.duplicados)
+        # La página queda como procesada en el cache recién ahora que está guardada
+        if pagina.cache:
+            _cache_paginas.guardar(pagina.url, **pagina.cache)
+        _registrar_checkpoint(clave, categoria.clave, pagina=pagina.page, url=pagina.url)
+        return None
 
+    etapa_persistir = EtapaPipeline(f"{clave}-persistir", persistir, cancelado=cancelado)
+    etapa_normalizar = EtapaPipeline(f"{clave}-normalizar", normalizar, siguiente=etapa_persistir, cancelado=cancelado)
+    etapas = {"normalize": etapa_normalizar, "persist": etapa_persistir}
 
-def scrapping_yauras_perfumes():
-    base_url = "https://yauras.cl"
-    categorias = [
-        ("perfumes-hombre", f"{base_url}/collections/perfumes-hombre?page={{page}}&grid_list=grid-view", {"Hombre"}),
-        ("unisex", f"{base_url}/collections/unisex?page={{page}}&grid_list=grid-view", {"Unisex"}),
-        ("perfumes-arabes", f"{base_url}/collections/perfumes-arabes?page={{page}}&grid_list=grid-view", {"Hombre"}),
-    ]
-    categoria_labels = {
-        "perfumes-hombre": "Perfumes hombre",
-        "unisex": "Perfumes unisex",
-        "perfumes-arabes": "Perfumes árabes",
-    }
-    genero_cache = {}
+    def metricas_pipeline():
+        paginas, segundos = paginas_procesadas + paginas_omitidas, round(espera_descarga, 2)
+        metricas = {
+            # Para la descarga, "seconds" es lo que el pipeline esperó por la página siguiente
+            "fetch": {"items": paginas, "seconds": segundos, "per_second": round(paginas / segundos, 1) if segundos else None}
+        }
+        metricas.update({nombre: etapa.metricas() for nombre, etapa in etapas.items()})
+        return metricas
 
-    def obtener_genero(nombre_genero):
-        clave = (nombre_genero or "").strip().lower()
-        if not clave:
-            return None
-        if clave not in genero_cache:
-            normalizado = nombre_genero.strip().title()
-            genero_cache[clave], _ = Genero.objects.get_or_create(nombre=normalizado)
-        return genero_cache[clave]
+    def fallo_etapa():
+        return any(etapa.error is not None for etapa in etapas.values())
 
-    creados, actualizados, errores = 0, 0, 0
-    _set_refresh_status(
-        "scraping",
+    _set_store_status(
+        clave,
         state="running",
         category=None,
         category_label=None,
@@ -1290,461 +3810,398 @@ def scrapping_yauras_perfumes():
         url=None,
     )
 
-    for nombre_categoria, url_template, generos_categoria in categorias:
-        if _is_refresh_cancelled("scraping"):
-            print(f"[YAURAS] Cancelado antes de categoría {nombre_categoria}")
-            break
-        page = 1
-        while True:
-            if _is_refresh_cancelled("scraping"):
-                print(f"[YAURAS] Cancelado en categoría {nombre_categoria} página {page}")
-                return {
-                    "creados": creados,
-                    "actualizados": actualizados,
-                    "errores": errores,
-                }
-            url = url_template.format(page=page)
-            _set_refresh_status(
-                "scraping",
-                state="running",
-                category=nombre_categoria,
-                category_label=categoria_labels.get(
-                    nombre_categoria, nombre_categoria.replace("-", " ").title()
-                ),
-                page=page,
-                url=url,
-            )
+    # Al reanudar una corrida interrumpida se sigue desde la última página completada
+    reanudar = _checkpoints_tienda(clave)
+    if reanudar:
+        print(f"[{tienda}] Reanudando desde checkpoints: {reanudar}")
+        # Las páginas ya hechas no se vuelven a ver, así que no se puede barrer
+        completo = False
 
-            try:
-                response = requests.get(url, timeout=12)
-            except Exception:
-                errores += 1
+    try:
+        for categoria in adaptador.categorias:
+            if cancelado():
+                print(f"[{tienda}] Cancelado antes de categoría {categoria.etiqueta}")
                 break
-
-            if response.status_code != 200:
+            if fallo_etapa():
                 break
-
-            soup = BeautifulSoup(response.text, "html.parser")
-            cards = soup.select("div.productitem__container")
-
-            # Fin de páginas
-            if not cards:
+            checkpoint = reanudar.get(categoria.clave, {})
+            if checkpoint.get("completa"):
+                continue
+            if _circuitos_hosts.abierto(adaptador.base_url):
+                print(f"[{tienda}] {_circuitos_hosts.clave(adaptador.base_url)} no responde, se omiten las categorías restantes.")
+                errores += 1
+                completo = False
                 break
-
-            page_con_stock = False
-            for card in cards:
-                link_el = card.select_one("h2.productitem--title a") or card.select_one(
-                    "a.productitem--image-link"
-                )
-                if not link_el:
-                    continue
-
-                nombre = link_el.get_text(strip=True)
-                if not nombre:
-                    continue
-                _set_refresh_status("scraping", item=nombre)
-
-                generos_a_asignar = set(generos_categoria)
-                if "hombre" in url.lower() or "hombre" in nombre_categoria.lower():
-                    generos_a_asignar.add("Hombre")
-                if "unisex" in url.lower() or "unisex" in nombre_categoria.lower() or "unisex" in nombre.lower():
-                    generos_a_asignar.add("Unisex")
-
-                soldout_badge = card.select_one(".productitem__badge--soldout")
-                stock_el = card.select_one(".product-stock-level__badge-text")
-                atc_button = card.select_one(".productitem--action-atc")
-                agotado = False
-                if soldout_badge and "agot" in soldout_badge.get_text(strip=True).lower():
-                    agotado = True
-                elif stock_el and "agot" in stock_el.get_text(strip=True).lower():
-                    agotado = True
-                elif atc_button and "agot" in (atc_button.text or "").strip().lower():
-                    agotado = True
-
-                if agotado:
-                    perfumes_agotados = Perfume.objects.filter(nombre=nombre, tienda="YAURAS")
-                    for perfume_agotado in perfumes_agotados:
-                        if perfume_agotado.imagen and default_storage.exists(perfume_agotado.imagen.name):
-                            default_storage.delete(perfume_agotado.imagen.name)
-                        perfume_agotado.delete()
-                    continue
-                else:
-                    page_con_stock = True
-
-                marca_el = card.select_one(".productitem--vendor a")
-                marca_nombre = marca_el.get_text(strip=True) if marca_el else "Desconocida"
-                marca_obj = _obtener_marca_normalizada(marca_nombre)
-
-                price_el = card.select_one(".price__current .money") or card.select_one(
-                    ".price__current--min"
-                )
-                precio = _parsear_clp(price_el.get_text(strip=True)) if price_el else 0
-
-                compare_el = (
-                    card.select_one(".price__compare-at .money")
-                    or card.select_one(".price__compare-at--single")
-                    or card.select_one("[data-price-compare]")
-                )
-                precio_ant = _parsear_clp(compare_el.get_text(strip=True)) if compare_el else precio
-
-                href = link_el.get("href")
-                url_prod = urllib.parse.urljoin(base_url, href) if href else None
-
-                img_url = None
-                # Preferimos la imagen principal si está disponible
-                imagenes = []
-                primary_img = card.select_one("img.productitem--image-primary")
-                if primary_img:
-                    imagenes.append(primary_img)
-                imagenes.extend([img for img in card.select("img") if img is not primary_img])
-
-                for img in imagenes:
-                    raw_candidates = [
-                        img.get("data-src"),
-                        img.get("data-rimg"),
-                        img.get("data-srcset"),
-                        img.get("data-rimg-template"),
-                        img.get("src"),
-                    ]
-
-                    def _normalizar_imagen(raw):
-                        if not raw:
-                            return None
-                        raw = raw.strip()
-                        if raw.lower() == "noscript":
-                            return None
-                        if not raw or raw.startswith("data:"):
-                            return None
-                        if "," in raw and " " in raw:
-                            partes = raw.split(",")
-                            for parte in partes:
-                                url_posible = (parte or "").strip().split()[0]
-                                url_limpia = _normalizar_imagen(url_posible)
-                                if url_limpia:
-                                    return url_limpia
-                            return None
-                        if "{size}" in raw:
-                            raw = raw.replace("{size}", "800x800")
-                        if raw.startswith("//"):
-                            raw = "https:" + raw
-                        elif raw.startswith("/"):
-                            raw = urllib.parse.urljoin(base_url, raw)
-                        return raw
-
-                    for candidato in raw_candidates:
-                        url_limpia = _normalizar_imagen(candidato)
-                        if url_limpia:
-                            img_url = url_limpia
-                            break
-                    if img_url:
-                        break
-
-                if not img_url:
-                    print(f"[Yauras IMG] No se encontró imagen para '{nombre}' (cat {nombre_categoria}, url {url})")
-
-                perfume, creado = Perfume.objects.get_or_create(
-                    nombre=nombre,
-                    tienda="YAURAS",
-                    defaults={
-                        "marca": marca_obj,
-                        "precio": precio,
-                        "precio_ant": precio_ant,
-                        "tienda": "YAURAS",
-                        "url_producto": url_prod,
-                    },
+            paginas = adaptador.paginas(categoria, checkpoint)
+
+            categoria_leida, categoria_con_error = False, False
+            while True:
+                inicio = time.perf_counter()
+                pagina = next(paginas, None)
+                espera_descarga += time.perf_counter() - inicio
+                if pagina is None:
+                    break
+                page, url = pagina.page, pagina.url
+                if cancelado() or fallo_etapa():
+                    if cancelado():
+                        print(f"[{tienda}] Cancelado en categoría {categoria.etiqueta} página {page}")
+                    paginas.close()
+                    completo = False
+                    categoria_con_error = True
+                    break
+                _set_store_status(
+                    clave,
+                    state="running",
+                    category=categoria.clave,
+                    category_label=categoria.etiqueta,
+                    page=page,
+                    url=url,
                 )
 
-                if creado:
-                    creados += 1
+                if pagina.error:
+                    errores += 1
+                    completo = False
+                    categoria_con_error = True
+                    break
+                categoria_leida = True
+                vistos.update(pagina.vistos)
+                if pagina.sin_cambios:
+                    paginas_omitidas += 1
+                    _set_store_status(clave, pages_skipped=paginas_omitidas)
+                    print(f"[{tienda}] Página {page} sin cambios desde la última corrida, se omite.")
                 else:
-                    cambios = False
-                    if perfume.precio != precio:
-                        perfume.precio = precio
-                        cambios = True
-                    if perfume.precio_ant != precio_ant:
-                        perfume.precio_ant = precio_ant
-                        cambios = True
-                    if perfume.marca != marca_obj:
-                        perfume.marca = marca_obj
-                        cambios = True
-                    if url_prod and perfume.url_producto != url_prod:
-                        perfume.url_producto = url_prod
-                        cambios = True
-                    if perfume.tienda != "YAURAS":
-                        perfume.tienda = "YAURAS"
-                        cambios = True
-                    if cambios:
-                        perfume.save()
-                        actualizados += 1
-
-                if img_url and not perfume.imagen:
-                    try:
-                        print(f"[Yauras IMG] Descargando imagen de '{nombre}': {img_url}")
-                        img_bytes = _descargar_imagen(img_url)
-                        if img_bytes:
-                            perfume.imagen.save(f"{nombre}.jpg", ContentFile(img_bytes), save=False)
-                        else:
-                            errores += 1
-                    except Exception as e:
-                        print(f"[Yauras IMG] Error al descargar imagen de '{nombre}' ({img_url}): {e}")
-                        errores += 1
-
-                if url_prod and not perfume.url_producto:
-                    perfume.url_producto = url_prod
-
-                perfume.save()
-
-                if generos_a_asignar:
-                    genero_objs = [obtener_genero(nombre_genero) for nombre_genero in generos_a_asignar]
-                    genero_objs = [genero for genero in genero_objs if genero]
-                    if genero_objs:
-                        perfume.generos.add(*genero_objs)
-
-            if not page_con_stock:
-                # Página completa agotada; pasar a siguiente categoría
-                break
-            page += 1
+                    paginas_procesadas += 1
+                    _set_store_status(clave, pages_processed=paginas_procesadas)
+                etapa_normalizar.poner(("pagina", categoria, pagina))
+                _set_store_status(clave, pipeline=metricas_pipeline())
+
+                if adaptador.cortar_en_pagina_agotada and not pagina.vistos:
+                    # Página completa agotada; pasar a siguiente categoría
+                    paginas.close()
+                    break
 
-    _set_refresh_status(
-        "scraping",
-        state="done",
+            # Si una categoría no entregó ninguna página no se sabe qué productos siguen disponibles
+            if not categoria_leida:
+                completo = False
+            elif not categoria_con_error:
+                etapa_normalizar.poner(("fin_categoria", categoria, None))
+    finally:
+        # Vacía el pipeline: lo ya descargado se guarda salvo que se haya cancelado
+        etapa_normalizar.terminar()
+        etapa_normalizar.esperar()
+        etapa_persistir.esperar()
+        _set_store_status(clave, pipeline=metricas_pipeline())
+
+    # Solo una corrida completa puede decidir qué productos ya no están disponibles
+    if not cancelado():
+        retirados = _barrer_no_vistos(tienda, vistos, tienda, retirar=completo)
+        _set_store_status(clave, unavailable=retirados)
+    if not completo or cancelado():
+        print(f"[{tienda}] Corrida incompleta o cancelada, no se retiran productos no vistos.")
+
+    _set_store_status(
+        clave,
+        state="cancelled" if cancelado() else "done",
         category=None,
         category_label=None,
         page=0,
         url=None,
+        item=None,
     )
-    return {"creados": creados, "actualizados": actualizados, "errores": errores}
-
-def scrapping_joy_perfumes():
-    base_url = "https://joyperfumes.cl"
+    return {
+        "creados": creados,
+        "actualizados": actualizados,
+        "errores": errores,
+        "productos": productos,
+        "paginas_procesadas": paginas_procesadas,
+        "paginas_omitidas": paginas_omitidas,
+        "retirados": retirados,
+        "duplicados": identidades.duplicados,
+        "completo": completo and not cancelado(),
+        "pipeline": metricas_pipeline(),
+    }
 
-    categorias = [
-        {
-            "label": "Hombre árabe",
-            "path": "/arabehombre-arabe",
-            "generos_forzados": {"Hombre"},
-        },
-        {
-            "label": "Unisex árabe",
-            "path": "/arabeunisex-arabe",
-            "generos_forzados": {"Unisex"},
-        },
-        {
-            "label": "Hombre",
-            "path": "/hombre",
-            "generos_forzados": {"Hombre"},
-        },
-        {
-            "label": "Unisex",
-            "path": "/unisex",
-            "generos_forzados": {"Unisex"},
-        },
-    ]
 
-    creados, actualizados, errores = 0, 0, 0
-    _set_refresh_status(
-        "scraping",
+def scrapear_tienda_sitemap(adaptador, sitemap, estado, resolutor_marcas=None, tam_lote=50):
+    """
+    Recarga incremental de una tienda Shopify a partir de su sitemap de productos:
+    compara el lastmod de cada URL con el ya procesado (`estado`) y solo descarga
+    (/products/<handle>.js) los productos modificados que la tienda ya tiene en la
+    BD. Los que salieron del sitemap o quedaron sin stock se marcan como no
+    disponibles. Los productos nuevos no pasan por acá: hace falta recorrer sus
+    colecciones para saber si corresponden y con qué géneros (ver
+    _scrapear_tienda_programada). Guarda el nuevo estado del sitemap al terminar.
+    """
+    clave, tienda = adaptador.clave, adaptador.tienda
+    cancelado = lambda: _is_refresh_cancelled("scraping")
+    resolutor_marcas = resolutor_marcas or ResolutorMarcas()
+    creados, actualizados, errores, productos, retirados = 0, 0, 0, 0, 0
+
+    anteriores = {}
+    for datos in (estado.get("sitemaps") or {}).values():
+        anteriores.update(datos.get("urls") or {})
+    actuales = sitemap.urls
+    cambiados = [url for url, lastmod in actuales.items() if anteriores.get(url) != lastmod]
+    removidos = set(anteriores) - set(actuales)
+
+    # Solo interesan los productos que la tienda ya tiene guardados (el sitemap trae todo el catálogo)
+    ids_por_clave = {}
+    for perfume_id, url_producto in Perfume.objects.filter(tienda=tienda, es_custom=False).exclude(
+        url_producto__isnull=True
+    ).values_list("id", "url_producto"):
+        ids_por_clave.setdefault(_clave_url_producto(url_producto), perfume_id)
+    por_descargar = [url for url in cambiados if _clave_url_producto(url) in ids_por_clave]
+    generos_por_id = defaultdict(set)
+    for perfume_id, nombre_genero in Perfume.generos.through.objects.filter(
+        perfume_id__in=[ids_por_clave[_clave_url_producto(url)] for url in por_descargar]
+    ).values_list("perfume_id", "genero__nombre"):
+        generos_por_id[perfume_id].add(nombre_genero)
+    print(f"[{tienda}] Sitemap: {len(cambiados)} productos modificados ({len(por_descargar)} de las categorías), {len(removidos)} retirados.")
+    _set_store_status(
+        clave,
         state="running",
-        category="joy",
-        category_label="Joy Perfumes",
+        mode="sitemap",
+        category=None,
+        category_label=f"Sitemap: {len(por_descargar)} productos modificados",
         page=0,
         url=None,
     )
 
-    for categoria in categorias:
-        if _is_refresh_cancelled("scraping"):
-            print(f"[JOY] Cancelado antes de categoría {categoria['label']}")
-            break
-        page = 1
-        while True:
-            if _is_refresh_cancelled("scraping"):
-                print(f"[JOY] Cancelado en categoría {categoria['label']} página {page}")
-                return {"creados": creados, "actualizados": actualizados, "errores": errores}
-            url = f"{base_url}{categoria['path']}?page={page}"
-            _set_refresh_status(
-                "scraping",
-                state="running",
-                category="joy",
-                category_label=f"Joy Perfumes - {categoria['label']}",
-                page=page,
-                url=url,
-            )
-            try:
-                response = requests.get(url, timeout=12)
-            except Exception:
-                errores += 1
-                break
-
-            if response.status_code != 200:
-                break
-
-            soup = BeautifulSoup(response.text, "html.parser")
-            cards = soup.select("article.product-block")
-            if not cards:
+    def descargar(url):
+        resultado = _fetch(f"{url.split('?')[0].rstrip('/')}.js", timeout=adaptador.timeout)
+        if resultado.ok:
+            return url, resultado.resultado, _parsear_producto_shopify(resultado.response.text, adaptador.base_url)
+        return url, resultado.resultado, None
+
+    fallidas = set()
+    registros, agotados_ids, vistos_ids = [], [], []
+
+    def guardar_lote():
+        nonlocal creados, actualizados, productos, registros
+        if registros:
+            lote_creados, lote_actualizados, _ = _persistir_pagina(tienda, registros, tienda)
+            creados += lote_creados
+            actualizados += lote_actualizados
+            productos += len(registros)
+            registros = []
+
+    executor = ThreadPoolExecutor(max_workers=PAGINAS_EN_VUELO, thread_name_prefix="sitemap")
+    try:
+        for numero, (url, resultado, tarjetas) in enumerate(executor.map(descargar, por_descargar), start=1):
+            if cancelado():
+                print(f"[{tienda}] Cancelado durante la recarga por sitemap.")
+                fallidas.update(por_descargar[numero - 1:])
                 break
-
-            for card in cards:
-                status_label = card.select_one(".product-block__label--status")
-                if status_label and "no disponible" in status_label.get_text(strip=True).lower():
-                    continue
-
-                title_el = card.select_one(".product-block__name")
-                if not title_el:
-                    continue
-                nombre = title_el.get_text(strip=True)
-                if not nombre:
-                    continue
-                _set_refresh_status("scraping", item=nombre)
-
-                generos_a_asignar = set(categoria.get("generos_forzados", set()))
-                if "arabe" in categoria.get("path", ""):
-                    generos_a_asignar.add("Arabe")
-                lower_name = nombre.lower()
-                if "hombre" in lower_name:
-                    generos_a_asignar.add("Hombre")
-                if "mujer" in lower_name:
-                    generos_a_asignar.add("Mujer")
-                if "unisex" in lower_name:
-                    generos_a_asignar.add("Unisex")
-
-                href = title_el.get("href")
-                url_prod = urllib.parse.urljoin(base_url, href) if href else None
-
-                marca_el = card.select_one(".product-block__brand")
-                marca_nombre_raw = marca_el.get_text(strip=True) if marca_el else ""
-                marca_obj = None
-                if marca_nombre_raw and _normalizar_texto(marca_nombre_raw) not in {"joyperfumes"}:
-                    marca_obj = _obtener_marca_normalizada(marca_nombre_raw)
-                if not marca_obj:
-                    marca_obj = _inferir_marca_por_nombre(nombre) or _obtener_marca_normalizada(marca_nombre_raw or "Desconocida")
-
-                price_el = card.select_one(".product-block__price")
-                precio = _parsear_clp(price_el.get_text(strip=True)) if price_el else 0
-                precio_ant = precio
-
-                img_url = None
-                img_el = card.select_one("img.product-block__image")
-                sources = card.select("picture source")
-                candidates = []
-                if sources:
-                    for src_el in sources:
-                        val = src_el.get("srcset")
-                        if val:
-                            val = val.split(",")[0].split()[0]
-                            candidates.append(val)
-                if img_el and img_el.get("src"):
-                    candidates.insert(0, img_el.get("src"))
-
-                for u in candidates:
-                    if not u:
-                        continue
-                    u = u.strip()
-                    if u.startswith("//"):
-                        u = "https:" + u
-                    elif u.startswith("/"):
-                        u = urllib.parse.urljoin(base_url, u)
-                    img_url = u
-                    break
-
-                perfume, creado = Perfume.objects.get_or_create(
-                    nombre=nombre,
-                    tienda="JOY",
-                    defaults={
-                        "marca": marca_obj,
-                        "precio": precio,
-                        "precio_ant": precio_ant,
-                        "tienda": "JOY",
-                        "url_producto": url_prod,
-                    },
+            _set_store_status(clave, page=numero, url=url)
+            perfume_id = ids_por_clave[_clave_url_producto(url)]
+            if resultado == FETCH_NO_ENCONTRADO:
+                removidos.add(url)
+                continue
+            if tarjetas is None:
+                errores += 1
+                fallidas.add(url)
+                continue
+            tarjeta = tarjetas[0] if tarjetas else None
+            if tarjeta is None or tarjeta.agotado or (adaptador.omitir_sin_precio and tarjeta.precio <= 0):
+                agotados_ids.append(perfume_id)
+                continue
+            _set_store_status(clave, item=tarjeta.nombre)
+            vistos_ids.append(perfume_id)
+            generos = generos_por_id[perfume_id] | adaptador.generos(None, tarjeta)
+            registros.append(
+                RegistroPerfume(
+                    nombre=tarjeta.nombre,
+                    precio=tarjeta.precio,
+                    precio_ant=tarjeta.precio_ant,
+                    marca=adaptador.marca(tarjeta, resolutor_marcas),
+                    url_producto=tarjeta.url_producto,
+                    img_url=tarjeta.img_url,
+                    generos=generos,
                 )
+            )
+            if len(registros) >= tam_lote:
+                guardar_lote()
+        guardar_lote()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-                if creado:
-                    creados += 1
-                else:
-                    cambios = False
-                    if perfume.precio != precio:
-                        perfume.precio = precio
-                        cambios = True
-                    if perfume.precio_ant != precio_ant:
-                        perfume.precio_ant = precio_ant
-                        cambios = True
-                    if perfume.marca != marca_obj:
-                        perfume.marca = marca_obj
-                        cambios = True
-                    if url_prod and perfume.url_producto != url_prod:
-                        perfume.url_producto = url_prod
-                        cambios = True
-                    if perfume.tienda != "JOY":
-                        perfume.tienda = "JOY"
-                        cambios = True
-                    if cambios:
-                        perfume.save()
-                        actualizados += 1
-
-                if img_url and not perfume.imagen:
-                    try:
-                        img_bytes = _descargar_imagen(img_url)
-                        if img_bytes:
-                            perfume.imagen.save(f"{nombre}.jpg", ContentFile(img_bytes), save=False)
-                        else:
-                            errores += 1
-                    except Exception:
-                        errores += 1
+    retirar_ids = agotados_ids + [
+        ids_por_clave[_clave_url_producto(url)] for url in removidos if _clave_url_producto(url) in ids_por_clave
+    ]
+    if retirar_ids:
+        retirados = Perfume.objects.filter(id__in=retirar_ids, disponible=True).update(disponible=False)
+    if vistos_ids:
+        Perfume.objects.filter(id__in=vistos_ids).update(ultima_vez_visto=timezone.now())
+
+    # Nuevo estado: lo procesado toma el lastmod actual; lo que falló conserva el anterior
+    # y su sitemap pierde los validadores, para volver a pedirlo completo la próxima vez.
+    sitemaps = {}
+    for loc, datos in sitemap.sitemaps.items():
+        urls, completo = {}, True
+        for url, lastmod in datos["urls"].items():
+            if url in fallidas:
+                completo = False
+                if url in anteriores:
+                    urls[url] = anteriores[url]
+            else:
+                urls[url] = lastmod
+        sitemaps[loc] = {**datos, "urls": urls} if completo else {"urls": urls}
+    _estado_sitemaps.guardar(clave, {**estado, "sitemaps": sitemaps, "incremental_en": time.time()})
+
+    _set_store_status(
+        clave,
+        state="cancelled" if cancelado() else "done",
+        category=None,
+        category_label=None,
+        page=0,
+        url=None,
+        item=None,
+        unavailable=retirados,
+    )
+    return {
+        "creados": creados,
+        "actualizados": actualizados,
+        "errores": errores,
+        "productos": productos,
+        "paginas_procesadas": len(por_descargar) - len(fallidas),
+        "paginas_omitidas": 0,
+        "retirados": retirados,
+        "duplicados": 0,
+        "modo": "sitemap",
+        "cambiados": len(cambiados),
+    }
 
-                if url_prod and not perfume.url_producto:
-                    perfume.url_producto = url_prod
 
-                perfume.save()
+def _scrapear_tienda_programada(adaptador, resolutor_marcas=None):
+    """
+    Elige cómo recargar una tienda. Las tiendas con sitemap se recargan de forma
+    incremental (scrapear_tienda_sitemap) y solo recorren sus colecciones completas
+    cada SCRAPE_FULL_CRAWL_HOURS, cuando el sitemap trae productos nuevos (hay que
+    ver en qué colección están), cuando hay una corrida completa a medio reanudar
+    o si el sitemap no está disponible. Un recorrido completo deja como base el
+    sitemap leído antes de empezar.
+    """
+    if not (adaptador.sitemap and SHOPIFY_JSON_ACTIVO and SITEMAP_COMPLETO_HORAS > 0):
+        return scrapear_tienda(adaptador, resolutor_marcas=resolutor_marcas)
+
+    clave = adaptador.clave
+    estado = _estado_sitemaps.cargar(clave)
+    sitemap = _leer_sitemap_productos(adaptador.base_url, estado, timeout=adaptador.timeout)
+    motivo = None
+    if sitemap is None:
+        motivo = "sin sitemap"
+    elif time.time() - estado.get("completo_en", 0) > SITEMAP_COMPLETO_HORAS * 3600:
+        motivo = "toca recorrido completo"
+    elif _checkpoints_tienda(clave):
+        motivo = "reanudando recorrido completo"
+    else:
+        conocidas = set()
+        for datos in (estado.get("sitemaps") or {}).values():
+            conocidas.update(datos.get("urls") or {})
+        nuevas = len(set(sitemap.urls) - conocidas)
+        if nuevas:
+            motivo = f"{nuevas} productos nuevos en el sitemap"
+    if motivo is None:
+        return scrapear_tienda_sitemap(adaptador, sitemap, estado, resolutor_marcas=resolutor_marcas)
+
+    print(f"[{adaptador.tienda}] Recorrido completo de colecciones ({motivo}).")
+    _set_store_status(clave, mode="full")
+    resultados = scrapear_tienda(adaptador, resolutor_marcas=resolutor_marcas)
+    if sitemap is not None and resultados.get("completo") and not resultados.get("errores"):
+        _estado_sitemaps.guardar(clave, {"completo_en": time.time(), "sitemaps": sitemap.sitemaps})
+    resultados["modo"] = "completo"
+    return resultados
+
+def _ejecutar_scraper_tienda(tienda, adaptador, resolutor_marcas=None):
+    """
+    Corre el scraper de una tienda dentro de su hilo y deja su estado final
+    en REFRESH_STATUS. Cierra la conexión a BD propia del hilo al terminar.
+    """
+    try:
+        if _is_refresh_cancelled("scraping"):
+            _set_store_status(tienda, state="cancelled")
+            return {"creados": 0, "actualizados": 0, "errores": 0}
+        print(f"[SCRAPE] Iniciando {tienda}")
+        inicio = time.monotonic()
+        with _ContadorConsultas() as contador:
+            resultados = _scrapear_tienda_programada(adaptador, resolutor_marcas=resolutor_marcas) or {}
+        duracion = round(time.monotonic() - inicio, 1)
+        productos = resultados.get("productos", 0)
+        resultados["consultas_bd"] = contador.total
+        resultados["consultas_por_producto"] = round(contador.total / productos, 2) if productos else None
+        _set_store_status(
+            tienda,
+            seconds=duracion,
+            db_queries=contador.total,
+            db_queries_per_product=resultados["consultas_por_producto"],
+        )
+        if _is_refresh_cancelled("scraping"):
+            _set_store_status(tienda, state="cancelled", item=None)
+        print(f"[SCRAPE] {tienda} terminado en {duracion}s: {resultados}")
+        return resultados
+    except Exception as e:
+        print(f"[SCRAPE] Error en {tienda}: {e}")
+        _set_store_status(tienda, state="error", error=str(e), item=None)
+        return {"creados": 0, "actualizados": 0, "errores": 1, "error": str(e)}
+    finally:
+        connection.close()
 
-                if generos_a_asignar:
-                    genero_objs = [Genero.objects.get_or_create(nombre=gen.strip().title())[0] for gen in generos_a_asignar]
-                    genero_objs = [g for g in genero_objs if g]
-                    if genero_objs:
-                        perfume.generos.add(*genero_objs)
 
-            page += 1
+def scrapping_tiendas_perfumes():
+    """
+    Ejecuta los scrapers de todas las tiendas en paralelo (un hilo por tienda,
+    cada una contra su propio host) y suma sus resultados.
+    """
+    if _is_refresh_cancelled("scraping"):
+        return {"creados": 0, "actualizados": 0, "errores": 0, "detalle": {}}
 
+    tiendas = [(adaptador.clave, adaptador.nombre, adaptador) for adaptador in TIENDAS]
     _set_refresh_status(
         "scraping",
-        state="done",
+        state="running",
         category=None,
         category_label=None,
         page=0,
         url=None,
+        item=None,
+        stores={clave: {"label": label, "state": "pending"} for clave, label, _ in tiendas},
     )
-    return {"creados": creados, "actualizados": actualizados, "errores": errores}
-
-def scrapping_tiendas_perfumes():
-    if _is_refresh_cancelled("scraping"):
-        return {"creados": 0, "actualizados": 0, "errores": 0, "detalle": {}}
 
-    print("[SCRAPE] Iniciando Silk")
-    resultados_silk = scrapping_silk_perfumes()
-    if _is_refresh_cancelled("scraping"):
-        return {
-            "creados": resultados_silk.get("creados", 0),
-            "actualizados": resultados_silk.get("actualizados", 0),
-            "errores": resultados_silk.get("errores", 0),
-            "detalle": {"silk": resultados_silk},
+    # Una sola fusión de marcas duplicadas y un cache de marcas compartido por toda la corrida
+    resolutor_marcas = ResolutorMarcas()
+    cola_imagenes = _obtener_cola_imagenes()
+    cola_imagenes.iniciar_corrida()
+    # Un host que se cayó en la corrida anterior se vuelve a intentar
+    _circuitos_hosts.reiniciar()
+
+    detalle = {}
+    with ThreadPoolExecutor(max_workers=len(tiendas), thread_name_prefix="scrape") as executor:
+        futuros = {
+            executor.submit(_ejecutar_scraper_tienda, clave, adaptador, resolutor_marcas): clave
+            for clave, _, adaptador in tiendas
         }
+        for futuro in as_completed(futuros):
+            detalle[futuros[futuro]] = futuro.result()
 
-    print("[SCRAPE] Iniciando Yauras")
-    resultados_yauras = scrapping_yauras_perfumes()
-    if _is_refresh_cancelled("scraping"):
-        return {
-            "creados": resultados_silk.get("creados", 0) + resultados_yauras.get("creados", 0),
-            "actualizados": resultados_silk.get("actualizados", 0) + resultados_yauras.get("actualizados", 0),
-            "errores": resultados_silk.get("errores", 0) + resultados_yauras.get("errores", 0),
-            "detalle": {"silk": resultados_silk, "yauras": resultados_yauras},
-        }
+    # Los productos ya están guardados; solo faltan las imágenes que siguen en cola
+    _set_refresh_status("scraping", category_label="Descargando imágenes", page=0, item=None)
+    cola_imagenes.esperar()
+    _set_refresh_status("scraping", category_label=None)
 
-    print("[SCRAPE] Iniciando Joy")
-    resultados_joy = scrapping_joy_perfumes()
+    # Mantiene el orden de las tiendas en el detalle
+    detalle = {clave: detalle[clave] for clave, _, _ in tiendas if clave in detalle}
     return {
-        "creados": resultados_silk.get("creados", 0) + resultados_yauras.get("creados", 0) + resultados_joy.get("creados", 0),
-        "actualizados": resultados_silk.get("actualizados", 0) + resultados_yauras.get("actualizados", 0) + resultados_joy.get("actualizados", 0),
-        "errores": resultados_silk.get("errores", 0) + resultados_yauras.get("errores", 0) + resultados_joy.get("errores", 0),
-        "detalle": {"silk": resultados_silk, "yauras": resultados_yauras, "joy": resultados_joy},
+        "creados": sum(r.get("creados", 0) for r in detalle.values()),
+        "actualizados": sum(r.get("actualizados", 0) for r in detalle.values()),
+        "errores": sum(r.get("errores", 0) for r in detalle.values()),
+        "productos": sum(r.get("productos", 0) for r in detalle.values()),
+        "paginas_procesadas": sum(r.get("paginas_procesadas", 0) for r in detalle.values()),
+        "paginas_omitidas": sum(r.get("paginas_omitidas", 0) for r in detalle.values()),
+        "retirados": sum(r.get("retirados", 0) for r in detalle.values()),
+        "duplicados": sum(r.get("duplicados", 0) for r in detalle.values()),
+        "imagenes": cola_imagenes.metricas(),
+        "hosts": _metricas_hosts(),
+        "detalle": detalle,
     }
 
 def buscar_google_lucky(nombre_perfume):
@@ -1781,15 +4238,17 @@ def buscar_google_lucky(nombre_perfume):
                         "User-Agent": random.choice(UA_LIST),
                         "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
                     }
-                    r = requests.get(endpoint, params=params, headers=headers, timeout=10)
+                    # El limitador de duckduckgo.com baja la tasa con cada 202/429
+                    resultado = _fetch(endpoint, params=params, headers=headers, timeout=10)
+                    if resultado.response is None:
+                        print(f"[DEBUG] DuckDuckGo {modo}: {resultado.resultado} ({resultado.error})")
+                        break
+                    r = resultado.response
                     print(f"[DEBUG] DuckDuckGo {modo} status: {r.status_code} (intento {intento+1})")
                     if r.status_code == 202:
-                        time.sleep(random.uniform(1, 2))
                         continue
                     if r.status_code != 200:
                         break
-                    # Suaviza la tasa de consultas
-                    time.sleep(random.uniform(0.4, 0.8))
 
                     from bs4 import BeautifulSoup
                     soup = BeautifulSoup(r.text, "html.parser")
@@ -1860,7 +4319,7 @@ def buscar_google_lucky(nombre_perfume):
 
 def _buscar_fragrantica_con_driver(nombre_perfume):
     """
-    Usa el driver compartido para buscar en Google "<nombre> fragrantica"
+    Usa un navegador del pool para buscar en Google "<nombre> fragrantica"
     y devuelve el primer enlace de fragrantica encontrado.
     """
     slug_url = _probar_slug_fragrantica(nombre_perfume)
@@ -1871,12 +4330,16 @@ def _buscar_fragrantica_con_driver(nombre_perfume):
     def _buscar_ddg_requests(query):
         url = "https://html.duckduckgo.com/html/"
         try:
-            r = requests.get(
+            resultado = _fetch(
                 url,
                 params={"q": query},
                 headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Safari/537.36"},
                 timeout=8,
             )
+            if resultado.response is None:
+                print(f"[Fragrantica] DDG HTML {resultado.resultado}: {resultado.error}")
+                return None
+            r = resultado.response
             if r.status_code != 200:
                 print(f"[Fragrantica] DDG HTML status {r.status_code}")
                 return None
@@ -1906,63 +4369,74 @@ def _buscar_fragrantica_con_driver(nombre_perfume):
         f"https://www.google.com/search?q={urllib.parse.quote_plus(query)}&hl=es",
         f"https://www.google.es/search?q={urllib.parse.quote_plus(query)}&hl=es",
     ]
-    driver = _get_shared_driver()
-    _schedule_driver_close(delay_seconds=0)
-    acquired = _driver_use_lock.acquire(timeout=120)
-    if not acquired:
-        print("[Botasaurus] No se pudo obtener el lock del navegador para buscar URL.")
-        return None
-    try:
+    if _fixtures_http and _fixtures_http.reproduciendo:
+        # Sin red ni navegador: los resultados grabados con fixtures_http en modo "grabar"
         for url in urls_busqueda:
-            print(f"[Botasaurus] Buscando en navegador: '{query}' -> {url}")
-            driver.get(url)
-            time.sleep(random.uniform(1.2, 2.2))
+            enlace = _enlace_fragrantica_en_resultados(_fixtures_http.html(url) or "")
+            if enlace:
+                return enlace
+        return None
+    with _pool_navegadores.navegador() as navegador:
+        if navegador is None:
+            print("[Botasaurus] No se liberó ningún navegador para buscar la URL.")
+            return None
+        driver = navegador.driver
+        try:
+            for url in urls_busqueda:
+                print(f"[Botasaurus] Buscando en navegador: '{query}' -> {url}")
+                navegador.visitar(url)
+
+                # Obtener HTML de la página
+                html = getattr(driver, "page_source", None)
+                if callable(html):
+                    html = html()
+                if not html and hasattr(driver, "get_page_source"):
+                    try:
+                        html = driver.get_page_source()
+                    except Exception:
+                        html = None
+                if not html:
+                    print("[Botasaurus] page_source vacío")
+                    continue
 
-            # Obtener HTML de la página
-            html = getattr(driver, "page_source", None)
-            if callable(html):
-                html = html()
-            if not html and hasattr(driver, "get_page_source"):
-                try:
-                    html = driver.get_page_source()
-                except Exception:
-                    html = None
-            if not html:
-                print("[Botasaurus] page_source vacío")
-                continue
+                enlace = _enlace_fragrantica_en_resultados(html)
+                if enlace:
+                    return enlace
 
-            soup = BeautifulSoup(html, "html.parser")
-            candidatos = []
-            hrefs_debug = []
-            for a in soup.find_all("a", href=True):
-                href = a["href"]
-                # Google usa /url?q=<destino>
-                if href.startswith("/url?"):
-                    qs = urllib.parse.parse_qs(urllib.parse.urlparse(href).query)
-                    href = qs.get("q", [href])[0]
-                if "fragrantica" not in href.lower():
-                    hrefs_debug.append(href)
-                    continue
-                texto = a.get_text(strip=True)
-                candidatos.append((href, texto))
+            print("[Botasaurus] Sin enlaces de fragrantica en resultados tras intentar todas las variantes.")
+        except Exception as e:
+            print(f"[Botasaurus] Error buscando URL en navegador: {e}")
+    return None
 
-            print(f"[Botasaurus] Enlaces totales en página: {len(hrefs_debug) + len(candidatos)} | Enlaces fragrantica: {len(candidatos)}")
-            if hrefs_debug:
-                print("[Botasaurus] Primeros href no-fragrantica:", hrefs_debug[:5])
 
-            if candidatos:
-                href, texto = candidatos[0]
-                href = convertir_a_fragrantica_es(href)
-                print(f"[Botasaurus] Match navegador: {href} (texto='{texto}')")
-                return href
+def _enlace_fragrantica_en_resultados(html):
+    """Primer enlace a Fragrantica (ya en fragrantica.es) de una página de resultados de Google, o None."""
+    soup = BeautifulSoup(html, "html.parser")
+    candidatos = []
+    hrefs_debug = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        # Google usa /url?q=<destino>
+        if href.startswith("/url?"):
+            qs = urllib.parse.parse_qs(urllib.parse.urlparse(href).query)
+            href = qs.get("q", [href])[0]
+        # Por el host: los enlaces propios de Google llevan "fragrantica" en la query
+        if "fragrantica" not in urllib.parse.urlparse(href).netloc.lower():
+            hrefs_debug.append(href)
+            continue
+        texto = a.get_text(strip=True)
+        candidatos.append((href, texto))
 
-        print("[Botasaurus] Sin enlaces de fragrantica en resultados tras intentar todas las variantes.")
-    except Exception as e:
-        print(f"[Botasaurus] Error buscando URL en navegador: {e}")
-    finally:
-        _driver_use_lock.release()
-        _schedule_driver_close(delay_seconds=30)
-    return None
+    print(f"[Botasaurus] Enlaces totales en página: {len(hrefs_debug) + len(candidatos)} | Enlaces fragrantica: {len(candidatos)}")
+    if hrefs_debug:
+        print("[Botasaurus] Primeros href no-fragrantica:", hrefs_debug[:5])
+
+    if not candidatos:
+        return None
+    href, texto = candidatos[0]
+    href = convertir_a_fragrantica_es(href)
+    print(f"[Botasaurus] Match navegador: {href} (texto='{texto}')")
+    return href
 
 
 def convertir_a_fragrantica_es(url):
@@ -2006,10 +4480,9 @@ def normalizar_urls_fragrantica_existentes():
     return actualizados
 
 
-@transaction.atomic
 def actualizar_urls_fragrantica():
     normalizar_urls_fragrantica_existentes()
-    perfumes = Perfume.objects.filter(Q(fragrantica_url__isnull=True) | Q(fragrantica_url="")).order_by("id")
+    perfumes = Perfume.objects.filter(Q(fragrantica_url__isnull=True) | Q(fragrantica_url=""), disponible=True).order_by("id")
     encontrados = 0
     total = perfumes.count()
     _set_refresh_status(
@@ -2024,6 +4497,9 @@ def actualizar_urls_fragrantica():
     print(f"[Fragrantica] Buscando y guardando solo fragrantica.es para {total} perfumes...")
 
     for indice, perfume in enumerate(perfumes, start=1):
+        if _is_refresh_cancelled("urls"):
+            print("[Fragrantica] Búsqueda de URLs cancelada.")
+            break
         print(f"→ {perfume.nombre}", end="")
         _set_refresh_status(
             "urls",
@@ -2033,6 +4509,10 @@ def actualizar_urls_fragrantica():
             perfume=perfume.nombre,
         )
 
+        if _circuitos_hosts.abierto("duckduckgo.com"):
+            print(" → DuckDuckGo no responde, se omiten los perfumes restantes.")
+            break
+
         url_raw = buscar_google_lucky(perfume.nombre)
 
         if url_raw and "fragrantica." in url_raw:
@@ -2061,27 +4541,28 @@ def refrescar_perfumes(request):
     etapa = (request.POST.get("stage") or "").strip().lower()
     if es_ajax:
         try:
+            # La vista solo encola: el trabajo lo corre el worker (manage.py scraping_worker)
             if etapa == "scraping":
-                _set_refresh_cancel("scraping", False)
-                _set_refresh_status("scraping", state="running")
+                trabajo = _encolar_trabajo(TrabajoScraping.TIPO_TIENDAS)
                 return JsonResponse(
                     {
                         "ok": True,
                         "stage": "scraping",
-                        "started": _start_scrape_async(),
+                        "started": True,
+                        "job_id": trabajo.pk,
                     }
                 )
             elif etapa == "cancel":
-                _set_refresh_cancel("scraping", True)
-                _set_refresh_status("scraping", state="cancelled")
+                _cancelar_trabajo(TrabajoScraping.TIPO_TIENDAS)
                 return JsonResponse({"ok": True, "stage": "cancel"})
             elif etapa == "urls":
-                urls_actualizadas = actualizar_urls_fragrantica()
+                trabajo = _encolar_trabajo(TrabajoScraping.TIPO_URLS_FRAGRANTICA)
                 return JsonResponse(
                     {
                         "ok": True,
                         "stage": "urls",
-                        "urls_actualizadas": urls_actualizadas,
+                        "started": True,
+                        "job_id": trabajo.pk,
                     }
                 )
             else:
@@ -2092,12 +4573,11 @@ def refrescar_perfumes(request):
             return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
     try:
-        _set_refresh_status("scraping", state="running")
-        started = _start_scrape_async()
-        if started:
-            messages.success(request, "Recarga iniciada. Puedes seguir el progreso en pantalla.")
-        else:
+        trabajo = _encolar_trabajo(TrabajoScraping.TIPO_TIENDAS)
+        if trabajo.estado == TrabajoScraping.ESTADO_EN_CURSO:
             messages.info(request, "La recarga ya esta en curso.")
+        else:
+            messages.success(request, "Recarga en cola. Puedes seguir el progreso en pantalla.")
     except Exception as e:
         _set_refresh_status("scraping", state="error", error=str(e))
         messages.error(request, f"Ocurrió un problema al refrescar los perfumes: {e}")
@@ -2106,10 +4586,15 @@ def refrescar_perfumes(request):
 
 def estado_refresco(request):
     etapa = (request.GET.get("stage") or "").strip().lower()
-    if etapa:
-        data = REFRESH_STATUS.get(etapa, {})
+    # El progreso lo guarda el worker en la BD (incluye "hosts": tasa y circuito por host)
+    tipos_por_etapa = {nombre: tipo for tipo, nombre in ETAPA_POR_TIPO.items()}
+    if etapa in tipos_por_etapa:
+        data = _estado_trabajo(tipos_por_etapa[etapa])
     else:
-        data = REFRESH_STATUS
+        data = _snapshot_refresh_status(etapa or None)
+        if not etapa:
+            for nombre, tipo in tipos_por_etapa.items():
+                data[nombre] = _estado_trabajo(tipo)
     return JsonResponse({"ok": True, "status": data})
 
 @require_POST
@@ -2159,7 +4644,7 @@ def sugerir_perfumes(request):
         return JsonResponse({"results": []})
 
     palabras = [p.strip() for p in re.split(r'\s+', query) if p.strip()]
-    perfumes_qs = Perfume.objects.select_related("marca")
+    perfumes_qs = Perfume.objects.filter(disponible=True).select_related("marca")
     for palabra in palabras:
         perfumes_qs = perfumes_qs.filter(Q(nombre__icontains=palabra) | Q(marca__marca__icontains=palabra))
 
@@ -2195,12 +4680,12 @@ def _build_tienda_filtros_data():
             "label": tienda_labels.get(row["tienda"], row["tienda"]),
             "count": row["count"] or 0,
         }
-        for row in Perfume.objects.values("tienda").annotate(count=Count("id")).order_by("tienda")
+        for row in Perfume.objects.filter(disponible=True).values("tienda").annotate(count=Count("id")).order_by("tienda")
         if row.get("tienda")
     ]
     tiendas = [
         {"code": code, "label": tienda_labels.get(code, code)}
-        for code in Perfume.objects.order_by("tienda").values_list("tienda", flat=True).distinct()
+        for code in Perfume.objects.filter(disponible=True).order_by("tienda").values_list("tienda", flat=True).distinct()
         if code
     ]
     return tienda_counts, tiendas
@@ -2258,7 +4743,8 @@ def home(request):
     selected_estacion_slugs = [slug for slug in selected_estacion_slugs if slug in estaciones_slug_map]
 
     perfumes_list = (
-        Perfume.objects.order_by("nombre")
+        Perfume.objects.filter(disponible=True)
+        .order_by("nombre")
         .prefetch_related("estaciones", "generos")
         .select_related("marca")
     )
@@ -2352,8 +4838,8 @@ def home(request):
 
     total_perfumes = len(perfumes_list) if list_mode else perfumes_list.count()
     tienda_counts, tiendas = _build_tienda_filtros_data()
-    marcas = Marca.objects.filter(perfumes__isnull=False).order_by("marca").distinct()
-    generos = Genero.objects.filter(perfumes__isnull=False).order_by("nombre").distinct()
+    marcas = Marca.objects.filter(perfumes__disponible=True).order_by("marca").distinct()
+    generos = Genero.objects.filter(perfumes__disponible=True).order_by("nombre").distinct()
     estaciones_filtro = [
         {"slug": data["slug"], "label": data["label"]}
         for data in estaciones_slug_map.values()
@@ -2417,7 +4903,7 @@ def home(request):
     )
 
 def estadisticas(request):
-    perfumes = Perfume.objects.all().select_related("marca").prefetch_related("estaciones", "acordes")
+    perfumes = Perfume.objects.filter(disponible=True).select_related("marca").prefetch_related("estaciones", "acordes")
     stats = perfumes.aggregate(
         total_perfumes=Count("id"),
         promedio_precio=Avg("precio"),
@@ -2490,7 +4976,7 @@ def estadisticas(request):
     # Perfumes por género
     generos_raw = (
         Genero.objects.filter(nombre__in=["Hombre", "Unisex"])
-        .annotate(total=Count("perfumes"))
+        .annotate(total=Count("perfumes", filter=Q(perfumes__disponible=True)))
         .values("nombre", "total")
         .order_by("-total")
     )
@@ -2536,22 +5022,30 @@ def estadisticas(request):
 
     # Top acordes y notas (por cantidad de perfumes asociados)
     top_acordes = (
-        Acorde.objects.annotate(total=Count("perfumes"))
+        Acorde.objects.annotate(total=Count("perfumes", filter=Q(perfumes__disponible=True)))
         .order_by("-total", "nombre")
         .values("nombre", "total")[:10]
     )
     acordes_all = (
-        Acorde.objects.annotate(total=Count("perfumes"))
+        Acorde.objects.annotate(total=Count("perfumes", filter=Q(perfumes__disponible=True)))
         .order_by("-total", "nombre")
         .values("nombre", "total")
     )
     top_notas = (
-        Nota.objects.annotate(total=Count("perfumes_base") + Count("perfumes_corazon") + Count("perfumes_salida"))
+        Nota.objects.annotate(
+            total=Count("perfumes_base", filter=Q(perfumes_base__disponible=True))
+            + Count("perfumes_corazon", filter=Q(perfumes_corazon__disponible=True))
+            + Count("perfumes_salida", filter=Q(perfumes_salida__disponible=True))
+        )
         .order_by("-total", "nombre")
         .values("nombre", "total")[:10]
     )
     notas_all = (
-        Nota.objects.annotate(total=Count("perfumes_base") + Count("perfumes_corazon") + Count("perfumes_salida"))
+        Nota.objects.annotate(
+            total=Count("perfumes_base", filter=Q(perfumes_base__disponible=True))
+            + Count("perfumes_corazon", filter=Q(perfumes_corazon__disponible=True))
+            + Count("perfumes_salida", filter=Q(perfumes_salida__disponible=True))
+        )
         .order_by("-total", "nombre")
         .values("nombre", "total")
     )
@@ -3005,6 +5499,8 @@ def eliminar_perfume_custom(request, perfume_id):
         perfume = Perfume.objects.get(pk=perfume_id, es_custom=True)
     except Perfume.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Perfume no encontrado o no es personalizado."}, status=404)
+    imagen_nombre = perfume.imagen.name if perfume.imagen else None
     perfume.delete()
+    _liberar_imagenes([imagen_nombre])
     tienda_counts, tiendas = _build_tienda_filtros_data()
     return JsonResponse({"ok": True, "tienda_counts": tienda_counts, "tiendas": tiendas})